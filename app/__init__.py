@@ -1,6 +1,6 @@
 from flask import Flask
 from flask_cors import CORS
-from app.extensions import init_extensions
+from app.extensions import init_extensions, get_job_manager
 from app.config import config_by_name
 
 def create_app(config_name="development"):
@@ -20,4 +20,10 @@ def create_app(config_name="development"):
     from app.api.v1.routes import api_v1
     app.register_blueprint(api_v1)
     
+    # Start the background workers for long-running document jobs
+    from app.services.document_service import register_job_handlers
+    job_manager = get_job_manager()
+    register_job_handlers(job_manager)
+    job_manager.start()
+    
     return app 
\ No newline at end of file
@@ -1,16 +1,108 @@
-from flask import Blueprint, request, jsonify
-import os
-from app.services.pdf_service import extract_text_from_pdf, save_temp_file, remove_temp_file
-from app.services.summarization_service import recursive_summarize
-from app.services.question_service import recursive_generate_questions
-from app.services.image_to_text_service import extract_text_from_file
-from app.services.academic_assistant_service import generate_answers_for_all_questions
-from app.services.preprocess import preprocess_question_paper
+from functools import partial, wraps
+from flask import Blueprint, Response, current_app, request, jsonify, url_for
+from werkzeug.exceptions import RequestEntityTooLarge
+from app.services.document_service import (
+    summarize_document,
+    is_successful_summary,
+    generate_questions_for_document,
+    analyze_document,
+    parse_analyze_outputs,
+    is_complete_analysis,
+    answer_question_paper
+)
+from app.services.upload_service import UploadTooLargeError, check_page_limit, read_upload, reject_upload
+from app.services.streaming_service import stream_summarization
+from app.services.result_cache import document_cache_key, chunk_size_params, cache_policy, compute_once, get_cached_result, cache_result
+from app.extensions import get_llm_cache, get_result_cache, get_summary_memo, get_ocr_cache, get_job_manager, get_token_counter, get_upload_metrics, get_admission_controller, get_request_coalescer, get_stage_metrics
+from app.utils.admission import current_client, current_priority, parse_priorities
+from app.utils.jobs import SUCCEEDED, FINISHED_STATUSES
+from app.utils.responses import json_response, negotiate_encoding, parse_field_list, select_fields
 
 # Create blueprint for API v1
 api_v1 = Blueprint('api_v1', __name__, url_prefix='/api/v1')
 
+@api_v1.before_request
+def identify_client():
+    """Attribute the request's model calls to its client and endpoint priority for admission control"""
+    config = current_app.config
+    endpoint = (request.endpoint or "").rpartition(".")[2]
+    current_client.set(request.headers.get(config["ADMISSION_CLIENT_HEADER"]) or request.remote_addr)
+    current_priority.set(parse_priorities(config["ADMISSION_PRIORITIES"]).get(endpoint))
+
+@api_v1.errorhandler(UploadTooLargeError)
+def upload_too_large(error):
+    """Report an upload over an endpoint's size or page limit"""
+    return jsonify({"error": str(error)}), 413
+
+@api_v1.errorhandler(RequestEntityTooLarge)
+def request_too_large(error):
+    """Report a request body over MAX_CONTENT_LENGTH"""
+    reject_upload("Request body too large")
+    return jsonify({"error": f"Upload exceeds the limit of {current_app.config['MAX_CONTENT_LENGTH']} bytes"}), 413
+
+def limit_upload(limit_key):
+    """
+    Reject requests whose declared size exceeds an endpoint's upload limit
+    
+    The check uses the Content-Length header, so oversized uploads are refused
+    before any of the body is read. Bodies sent without a length are checked
+    while they are read (see read_upload).
+    
+    Args:
+        limit_key (str): Configuration key holding the limit in bytes
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            limit = current_app.config[limit_key]
+            if limit and request.content_length and request.content_length > limit:
+                raise reject_upload(f"Upload exceeds the limit of {limit} bytes")
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def payload_shaper():
+    """Build a function applying the `fields` and `exclude` query parameters to a payload"""
+    return partial(
+        select_fields,
+        fields=parse_field_list(request.args.get('fields')),
+        exclude=parse_field_list(request.args.get('exclude'))
+    )
+
+def result_response(payload, status=200):
+    """Build a shaped JSON response, compressed if the client accepts it"""
+    config = current_app.config
+    encoding = None
+    if config["RESPONSE_COMPRESSION_ENABLED"]:
+        encoding = negotiate_encoding(request.headers.get("Accept-Encoding"))
+    return json_response(
+        payload_shaper()(payload),
+        status=status,
+        encoding=encoding,
+        gzip_level=config["RESPONSE_GZIP_LEVEL"],
+        brotli_quality=config["RESPONSE_BROTLI_QUALITY"],
+        min_compress_bytes=config["RESPONSE_COMPRESSION_MIN_BYTES"],
+        stream_threshold=config["RESPONSE_STREAM_THRESHOLD"],
+        chunk_size=config["RESPONSE_STREAM_CHUNK_SIZE"]
+    )
+
+def cached_response(payload):
+    """Build a JSON response for a payload served from the result cache"""
+    response = result_response(payload)
+    response.headers["X-Cache"] = "HIT"
+    return response
+
+def fresh_response(payload, coalesced=False):
+    """Build a JSON response for a freshly computed payload"""
+    response = result_response(payload)
+    response.headers["X-Cache"] = "MISS"
+    if coalesced:
+        # Computed by a concurrent request for the same document
+        response.headers["X-Coalesced"] = "true"
+    return response
+
 @api_v1.route('/summarize', methods=['POST'])
+@limit_upload("SUMMARIZE_MAX_UPLOAD_BYTES")
 def summarize():
     """Endpoint to extract text from PDF and generate a summary"""
     print("summarize called")
@@ -21,38 +113,92 @@ def summarize():
     file = request.files['file']
     if file.filename == '':
         return jsonify({"error": "No file selected"}), 400
-
-    temp_path = "temp.pdf"
+    
+    # Get optional parameters with defaults
+    max_words = request.args.get('max_words', default=400, type=int)
+    
+    upload = read_upload(
+        file,
+        spool_threshold=current_app.config["UPLOAD_SPOOL_THRESHOLD"],
+        max_bytes=current_app.config["SUMMARIZE_MAX_UPLOAD_BYTES"]
+    )
+    check_page_limit(upload, current_app.config["MAX_PDF_PAGES"])
     
     try:
-        # Save uploaded file to temporary location
-        save_temp_file(file, temp_path)
-        
-        # Extract text from PDF
-        text_dict, all_text = extract_text_from_pdf(temp_path)
-        
-        # Generate summary
-        summary = recursive_summarize(all_text, max_words=400)
-        
-        # Clean up temporary file
-        remove_temp_file(temp_path)
+        # Serve repeat uploads of the same document from the result cache
+        cache_key = document_cache_key("summarize", upload.sha256, **chunk_size_params(max_words))
+        read_cache, write_cache = cache_policy(request.headers)
+        if read_cache:
+            cached = get_cached_result(cache_key)
+            if cached is not None:
+                return cached_response(cached)
         
-        # Ensure summary is a proper JSON object, not a string
-        if isinstance(summary, str):
-            from app.services.summarization_service import extract_json_from_text
-            summary = extract_json_from_text(summary)
+        def run_pipeline():
+            # Extract text and generate the summary
+            payload = summarize_document(upload.source, max_words=max_words)
+            
+            # Failed summaries are not cached so the next upload retries them
+            if write_cache and is_successful_summary(payload):
+                cache_result(cache_key, payload)
+            return payload
         
-        return jsonify({
-            "text": text_dict,
-            "summary": summary
-        })
+        # Concurrent uploads of the same document share one pipeline run
+        payload, shared = compute_once(cache_key, run_pipeline)
+        return fresh_response(payload, coalesced=shared)
 
     except Exception as e:
-        # Ensure temporary file is removed in case of error
-        remove_temp_file(temp_path)
         return jsonify({"error": str(e)}), 500
+    finally:
+        upload.cleanup()
+
+@api_v1.route('/summarize/stream', methods=['POST'])
+@limit_upload("SUMMARIZE_MAX_UPLOAD_BYTES")
+def summarize_stream():
+    """Endpoint to summarize a PDF while streaming progress as server-sent events"""
+    print("summarize_stream called")
+    
+    if 'file' not in request.files:
+        return jsonify({"error": "No file provided"}), 400
+
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({"error": "No file selected"}), 400
+    
+    # Get optional parameters with defaults
+    max_words = request.args.get('max_words', default=400, type=int)
+    
+    upload = read_upload(
+        file,
+        spool_threshold=current_app.config["UPLOAD_SPOOL_THRESHOLD"],
+        max_bytes=current_app.config["SUMMARIZE_MAX_UPLOAD_BYTES"]
+    )
+    check_page_limit(upload, current_app.config["MAX_PDF_PAGES"])
+    
+    try:
+        cache_key = document_cache_key("summarize", upload.sha256, **chunk_size_params(max_words))
+        read_cache, write_cache = cache_policy(request.headers)
+        # The pipeline thread starts here and cleans up the upload when it ends
+        events = stream_summarization(
+            upload,
+            max_words=max_words,
+            cache_key=cache_key,
+            read_cache=read_cache,
+            write_cache=write_cache,
+            # The stream outlives the request context, so the shaper is built here
+            shape=payload_shaper()
+        )
+    except Exception:
+        upload.cleanup()
+        raise
+    
+    response = Response(events, mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    # Stop nginx-style proxies from buffering the stream
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
 
 @api_v1.route('/generate-questions', methods=['POST'])
+@limit_upload("QUESTIONS_MAX_UPLOAD_BYTES")
 def generate_questions():
     """Endpoint to extract text from PDF and generate exam questions"""
     print("generate_questions called")
@@ -67,32 +213,106 @@ def generate_questions():
     # Get optional parameters with defaults
     max_questions = request.args.get('max_questions', default=5, type=int)
     max_words = request.args.get('max_words', default=400, type=int)
-
-    temp_path = "temp.pdf"
+    
+    upload = read_upload(
+        file,
+        spool_threshold=current_app.config["UPLOAD_SPOOL_THRESHOLD"],
+        max_bytes=current_app.config["QUESTIONS_MAX_UPLOAD_BYTES"]
+    )
+    check_page_limit(upload, current_app.config["MAX_PDF_PAGES"])
     
     try:
-        # Save uploaded file to temporary location
-        save_temp_file(file, temp_path)
+        # Serve repeat uploads of the same document from the result cache
+        cache_key = document_cache_key(
+            "generate-questions", upload.sha256, max_words=max_words, max_questions=max_questions
+        )
+        read_cache, write_cache = cache_policy(request.headers)
+        if read_cache:
+            cached = get_cached_result(cache_key)
+            if cached is not None:
+                return cached_response(cached)
         
-        # Extract text from PDF
-        _, all_text = extract_text_from_pdf(temp_path)
+        def run_pipeline():
+            # Extract text and generate questions
+            payload = generate_questions_for_document(
+                upload.source, max_words=max_words, max_questions=max_questions
+            )
+            
+            # Empty question sets are not cached so the next upload retries them
+            if write_cache and payload["questions"]:
+                cache_result(cache_key, payload)
+            return payload
         
-        # Generate questions
-        questions = recursive_generate_questions(all_text, max_words=max_words, max_questions=max_questions)
+        # Concurrent uploads of the same document share one pipeline run
+        payload, shared = compute_once(cache_key, run_pipeline)
+        return fresh_response(payload, coalesced=shared)
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        upload.cleanup()
+
+@api_v1.route('/analyze', methods=['POST'])
+@limit_upload("ANALYZE_MAX_UPLOAD_BYTES")
+def analyze():
+    """Endpoint to summarize a PDF and generate exam questions from a single upload"""
+    print("analyze called")
+    
+    if 'file' not in request.files:
+        return jsonify({"error": "No file provided"}), 400
+
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({"error": "No file selected"}), 400
+    
+    # Get optional parameters with defaults
+    try:
+        outputs = parse_analyze_outputs(request.args.get('outputs'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    max_questions = request.args.get('max_questions', default=5, type=int)
+    max_words = request.args.get('max_words', default=400, type=int)
+    
+    upload = read_upload(
+        file,
+        spool_threshold=current_app.config["UPLOAD_SPOOL_THRESHOLD"],
+        max_bytes=current_app.config["ANALYZE_MAX_UPLOAD_BYTES"]
+    )
+    check_page_limit(upload, current_app.config["MAX_PDF_PAGES"])
+    
+    try:
+        # Serve repeat uploads of the same document from the result cache
+        cache_key = document_cache_key(
+            "analyze", upload.sha256, outputs=outputs, max_questions=max_questions, **chunk_size_params(max_words)
+        )
+        read_cache, write_cache = cache_policy(request.headers)
+        if read_cache:
+            cached = get_cached_result(cache_key)
+            if cached is not None:
+                return cached_response(cached)
         
-        # Clean up temporary file
-        remove_temp_file(temp_path)
+        def run_pipeline():
+            # Extract and chunk once, then summarize and generate questions together
+            payload = analyze_document(
+                upload.source, outputs=outputs, max_words=max_words, max_questions=max_questions
+            )
+            
+            # Incomplete analyses are not cached so the next upload retries them
+            if write_cache and is_complete_analysis(payload, outputs):
+                cache_result(cache_key, payload)
+            return payload
         
-        return jsonify({
-            "questions": questions
-        })
+        # Concurrent uploads of the same document share one pipeline run
+        payload, shared = compute_once(cache_key, run_pipeline)
+        return fresh_response(payload, coalesced=shared)
 
     except Exception as e:
-        # Ensure temporary file is removed in case of error
-        remove_temp_file(temp_path)
         return jsonify({"error": str(e)}), 500
+    finally:
+        upload.cleanup()
 
 @api_v1.route('/academic-assistant', methods=['POST'])
+@limit_upload("ASSISTANT_MAX_UPLOAD_BYTES")
 def academic_assistant():
     """Endpoint to extract text from an image or PDF and generate academic answers"""
     print("academic_assistant called")
@@ -104,28 +324,164 @@ def academic_assistant():
     if file.filename == '':
         return jsonify({"error": "No file selected"}), 400
     
+    upload = read_upload(
+        file,
+        spool_threshold=current_app.config["UPLOAD_SPOOL_THRESHOLD"],
+        max_bytes=current_app.config["ASSISTANT_MAX_UPLOAD_BYTES"]
+    )
+    check_page_limit(upload, current_app.config["ASSISTANT_MAX_PDF_PAGES"])
+    
     try:
-        # Extract text from the uploaded file (image or PDF)
-        extracted_text = extract_text_from_file(file)
-
-        # Preprocess the extracted text
-        preprocessed_text = preprocess_question_paper(extracted_text)
-        
-        # Generate academic answer using Llama
-        model_response = generate_answers_for_all_questions(preprocessed_text)
-        
-        # Ensure model_response is a dictionary
-        if not isinstance(model_response, dict):
-            model_response = {"error": "Failed to generate a structured response", "raw_response": str(model_response)}
-        
-        return jsonify({
-            "extracted_text": extracted_text,
-            "preprocessed_text": preprocessed_text,
-            "answer": model_response
-        })
+        # Extract the question paper straight from the upload and answer it
+        return result_response(answer_question_paper(upload.read_bytes(), file.filename))
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        upload.cleanup()
+
+def job_status_payload(job):
+    """Build the public status view of a background job"""
+    return {
+        "job_id": job["id"],
+        "type": job["type"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "stage": job["stage"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "error": job["error"],
+        "status_url": url_for("api_v1.get_job", job_id=job["id"]),
+        "result_url": url_for("api_v1.get_job_result", job_id=job["id"])
+    }
+
+@api_v1.route('/jobs', methods=['POST'])
+@limit_upload("JOBS_MAX_UPLOAD_BYTES")
+def submit_job():
+    """Endpoint to queue a long-running document job and return immediately"""
+    print("submit_job called")
+    
+    job_manager = get_job_manager()
+    job_type = request.form.get('type') or request.args.get('type')
+    if job_type not in job_manager.job_types:
+        return jsonify({"error": f"Unknown job type. Expected one of: {', '.join(job_manager.job_types)}"}), 400
+    
+    if 'file' not in request.files:
+        return jsonify({"error": "No file provided"}), 400
+
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({"error": "No file selected"}), 400
+    
+    # Jobs run on behalf of the submitting client, at the "jobs" priority
+    params = {"client": current_client.get()}
+    if job_type in ("summarize", "generate-questions", "analyze"):
+        params["max_words"] = request.args.get('max_words', default=400, type=int)
+    if job_type in ("generate-questions", "analyze"):
+        params["max_questions"] = request.args.get('max_questions', default=5, type=int)
+    if job_type == "analyze":
+        try:
+            params["outputs"] = list(parse_analyze_outputs(request.args.get('outputs')))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    
+    upload = read_upload(
+        file,
+        spool_threshold=current_app.config["UPLOAD_SPOOL_THRESHOLD"],
+        max_bytes=current_app.config["JOBS_MAX_UPLOAD_BYTES"]
+    )
+    check_page_limit(
+        upload,
+        current_app.config["ASSISTANT_MAX_PDF_PAGES" if job_type == "academic-assistant" else "MAX_PDF_PAGES"]
+    )
+    
+    try:
+        job = job_manager.submit(job_type, upload.read_bytes(), filename=file.filename, params=params)
+    finally:
+        upload.cleanup()
+    
+    response = jsonify(job_status_payload(job))
+    response.status_code = 202
+    response.headers["Location"] = url_for("api_v1.get_job", job_id=job["id"])
+    return response
+
+@api_v1.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Endpoint to poll the status and progress of a background job"""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    
+    return jsonify(job_status_payload(job))
+
+@api_v1.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """Endpoint to fetch the result of a finished background job"""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    
+    if job["status"] == SUCCEEDED:
+        return result_response(job["result"])
+    if job["status"] in FINISHED_STATUSES:
+        return jsonify(job_status_payload(job)), 409
+    
+    # Still queued or running
+    return jsonify(job_status_payload(job)), 202
+
+@api_v1.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Endpoint to cancel a queued or running background job"""
+    job = get_job_manager().cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    
+    return jsonify(job_status_payload(job)), 202
+
+@api_v1.route('/stats', methods=['GET'])
+def stats():
+    """Endpoint reporting cache, token counting, upload memory, admission, coalescing and model stage statistics"""
+    caches = {}
+    
+    llm_cache = get_llm_cache()
+    if llm_cache is not None:
+        caches["llm_responses"] = llm_cache.stats()
+    
+    result_cache = get_result_cache()
+    if result_cache is not None:
+        caches["document_results"] = result_cache.stats()
+    
+    summary_memo = get_summary_memo()
+    if summary_memo is not None:
+        caches["summary_nodes"] = summary_memo.stats()
+    
+    ocr_cache = get_ocr_cache()
+    if ocr_cache is not None:
+        caches["ocr_results"] = ocr_cache.stats()
+    
+    payload = {"caches": caches}
+    token_counter = get_token_counter()
+    if token_counter is not None:
+        payload["tokens"] = token_counter.stats()
+    
+    upload_metrics = get_upload_metrics()
+    if upload_metrics is not None:
+        payload["uploads"] = upload_metrics.stats()
+    
+    admission_controller = get_admission_controller()
+    if admission_controller is not None:
+        payload["admission"] = admission_controller.stats()
+    
+    request_coalescer = get_request_coalescer()
+    if request_coalescer is not None:
+        payload["coalescing"] = request_coalescer.stats()
+    
+    stage_metrics = get_stage_metrics()
+    if stage_metrics is not None:
+        payload["stages"] = stage_metrics.stats()
+    
+    return jsonify(payload)
 
 @api_v1.route('/test', methods=['GET'])
 def test():
@@ -12,6 +12,212 @@ class Config:
     CORS_ORIGIN = os.getenv("CORS_ORIGIN", "https://api.linkuni.in")
     DEBUG = False
     TESTING = False
+    
+    # Uploads larger than this are spooled to a unique temporary file instead of memory
+    UPLOAD_SPOOL_THRESHOLD = int(os.getenv("UPLOAD_SPOOL_THRESHOLD", str(32 * 1024 * 1024)))
+    
+    # Upload limits in bytes (0 = no limit). MAX_CONTENT_LENGTH caps every request
+    # body; the per-endpoint limits are checked against Content-Length before the
+    # body is read, and again while it is read. PDFs with more pages than the
+    # page limits are rejected before any text is extracted.
+    MAX_CONTENT_LENGTH = int(os.getenv("MAX_CONTENT_LENGTH", str(100 * 1024 * 1024))) or None
+    SUMMARIZE_MAX_UPLOAD_BYTES = int(os.getenv("SUMMARIZE_MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+    QUESTIONS_MAX_UPLOAD_BYTES = int(os.getenv("QUESTIONS_MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+    ASSISTANT_MAX_UPLOAD_BYTES = int(os.getenv("ASSISTANT_MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+    ANALYZE_MAX_UPLOAD_BYTES = int(os.getenv("ANALYZE_MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+    JOBS_MAX_UPLOAD_BYTES = int(os.getenv("JOBS_MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+    MAX_PDF_PAGES = int(os.getenv("MAX_PDF_PAGES", "2000"))
+    ASSISTANT_MAX_PDF_PAGES = int(os.getenv("ASSISTANT_MAX_PDF_PAGES", "50"))
+    
+    # JSON responses of at least RESPONSE_COMPRESSION_MIN_BYTES are gzip- or
+    # brotli-compressed (brotli needs the optional brotli package); bodies over
+    # RESPONSE_STREAM_THRESHOLD are serialized and sent in RESPONSE_STREAM_CHUNK_SIZE pieces
+    RESPONSE_COMPRESSION_ENABLED = os.getenv("RESPONSE_COMPRESSION_ENABLED", "true").lower() == "true"
+    RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+    RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+    RESPONSE_BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "5"))
+    RESPONSE_STREAM_THRESHOLD = int(os.getenv("RESPONSE_STREAM_THRESHOLD", str(1024 * 1024)))
+    RESPONSE_STREAM_CHUNK_SIZE = int(os.getenv("RESPONSE_STREAM_CHUNK_SIZE", str(64 * 1024)))
+    
+    # Parallel PDF extraction: documents with at least PDF_PARALLEL_MIN_PAGES pages
+    # are split across PDF_EXTRACT_WORKERS processes (0 = one per CPU, 1 = disabled)
+    PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", "0"))
+    PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
+    
+    # Hybrid PDF text extraction for the academic assistant: pages whose text layer
+    # has fewer than OCR_MIN_PAGE_CHARS characters are rendered at OCR_RENDER_DPI
+    # and sent to OCR, up to OCR_MAX_WORKERS pages at a time and at most twice
+    # that many rendered pages waiting in memory
+    OCR_MIN_PAGE_CHARS = int(os.getenv("OCR_MIN_PAGE_CHARS", "32"))
+    OCR_RENDER_DPI = int(os.getenv("OCR_RENDER_DPI", "200"))
+    OCR_MAX_WORKERS = int(os.getenv("OCR_MAX_WORKERS", "4"))
+    
+    # Photos are made upright, grayscale and at most OCR_IMAGE_MAX_PIXELS before OCR
+    OCR_IMAGE_NORMALIZE = os.getenv("OCR_IMAGE_NORMALIZE", "true").lower() == "true"
+    OCR_IMAGE_MAX_PIXELS = int(os.getenv("OCR_IMAGE_MAX_PIXELS", "4000000"))
+    OCR_IMAGE_JPEG_QUALITY = int(os.getenv("OCR_IMAGE_JPEG_QUALITY", "85"))
+    
+    # Textract client connection pool, timeouts and (botocore) retries
+    TEXTRACT_MAX_POOL_CONNECTIONS = int(os.getenv("TEXTRACT_MAX_POOL_CONNECTIONS", "10"))
+    TEXTRACT_CONNECT_TIMEOUT = int(os.getenv("TEXTRACT_CONNECT_TIMEOUT", "10"))
+    TEXTRACT_READ_TIMEOUT = int(os.getenv("TEXTRACT_READ_TIMEOUT", "60"))
+    TEXTRACT_MAX_ATTEMPTS = int(os.getenv("TEXTRACT_MAX_ATTEMPTS", "3"))
+    
+    # Sentence segmenter used for chunking: "senter" (statistical, fast),
+    # "sentencizer" (rule-based, fastest) or "full" (entire en_core_web_sm pipeline)
+    CHUNKING_SEGMENTER = os.getenv("CHUNKING_SEGMENTER", "senter")
+    
+    # Chunking strategy for summaries and /analyze: "sections" packs whole sections
+    # (or subsections, when a section is too large) into chunks, using the PDF
+    # outline or, without one, lines set at least HEADING_MIN_SIZE_RATIO times the
+    # body font size (or in bold) as headings, up to SECTION_MAX_DEPTH levels;
+    # "sentences" packs sentences regardless of structure
+    CHUNKING_STRATEGY = os.getenv("CHUNKING_STRATEGY", "sections")
+    SECTION_MAX_DEPTH = int(os.getenv("SECTION_MAX_DEPTH", "3"))
+    HEADING_MIN_SIZE_RATIO = float(os.getenv("HEADING_MIN_SIZE_RATIO", "1.15"))
+    HEADING_MAX_WORDS = int(os.getenv("HEADING_MAX_WORDS", "12"))
+    
+    # Near-duplicate removal before LLM calls: headers/footers recurring on at least
+    # DEDUP_BOILERPLATE_MIN_FRACTION of the pages are stripped, and chunks whose
+    # estimated shingle similarity to an earlier chunk reaches the threshold are dropped
+    DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+    DEDUP_SIMILARITY_THRESHOLD = float(os.getenv("DEDUP_SIMILARITY_THRESHOLD", "0.85"))
+    DEDUP_BOILERPLATE_MIN_FRACTION = float(os.getenv("DEDUP_BOILERPLATE_MIN_FRACTION", "0.5"))
+    
+    # Chunk sizing: "tokens" packs chunks up to CONTEXT_BUDGET_FRACTION of the model
+    # window after the prompt template and max_gen_len; "words" uses max_words
+    CHUNK_SIZING = os.getenv("CHUNK_SIZING", "tokens")
+    LLM_CONTEXT_WINDOW = int(os.getenv("LLM_CONTEXT_WINDOW", "8192"))
+    CONTEXT_BUDGET_FRACTION = float(os.getenv("CONTEXT_BUDGET_FRACTION", "0.75"))
+    # Llama 3 tokenizer.json for exact counts (needs the tokenizers package);
+    # otherwise tokens are estimated and calibrated against Bedrock's counts
+    LLAMA_TOKENIZER_PATH = os.getenv("LLAMA_TOKENIZER_PATH")
+    TOKEN_ESTIMATE_CHARS_PER_TOKEN = float(os.getenv("TOKEN_ESTIMATE_CHARS_PER_TOKEN", "3.8"))
+    
+    # Summaries merged per reduce call; chunk summaries are reduced level by level
+    # until at most this many remain for the final synthesis
+    REDUCE_FAN_IN = int(os.getenv("REDUCE_FAN_IN", "8"))
+    
+    # Concurrency settings for LLM calls; the worker pool runs queued calls
+    # round-robin between clients, by the priorities below
+    LLM_MAX_WORKERS = int(os.getenv("LLM_MAX_WORKERS", "8"))
+    BEDROCK_MAX_CONCURRENCY = int(os.getenv("BEDROCK_MAX_CONCURRENCY", "8"))
+    
+    # Admission control for Bedrock calls. Calls wait in fair per-client queues
+    # (client from ADMISSION_CLIENT_HEADER, else the remote address), ordered by
+    # endpoint priority (lower first), until a concurrency slot and the
+    # requests/tokens-per-minute budgets allow them (0 = unlimited). With
+    # ADMISSION_BACKEND=sqlite the budgets are shared by all workers using
+    # ADMISSION_DB_PATH. Calls waiting longer than ADMISSION_MAX_WAIT_SECONDS, or
+    # beyond ADMISSION_MAX_QUEUE waiting calls, fail as throttled.
+    BEDROCK_MAX_RPM = int(os.getenv("BEDROCK_MAX_RPM", "0"))
+    BEDROCK_MAX_TPM = int(os.getenv("BEDROCK_MAX_TPM", "0"))
+    ADMISSION_BACKEND = os.getenv("ADMISSION_BACKEND", "memory")  # "memory" or "sqlite"
+    ADMISSION_DB_PATH = os.getenv("ADMISSION_DB_PATH", "cache/admission.db")
+    ADMISSION_MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "300"))
+    ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "512"))
+    ADMISSION_CLIENT_HEADER = os.getenv("ADMISSION_CLIENT_HEADER", "X-Client-Id")
+    ADMISSION_PRIORITIES = os.getenv(
+        "ADMISSION_PRIORITIES",
+        "academic_assistant=0,summarize=1,summarize_stream=1,generate_questions=1,analyze=1,jobs=2"
+    )
+    ADMISSION_DEFAULT_PRIORITY = int(os.getenv("ADMISSION_DEFAULT_PRIORITY", "1"))
+    
+    # Model routing per pipeline stage: the global context, map (chunk summaries),
+    # reduce and final-synthesis calls of summarization, question generation and
+    # answer generation each use their own Bedrock model, max_gen_len and
+    # temperature. Stages without MODEL_<STAGE>_ID use LLM_DEFAULT_MODEL_ID; e.g.
+    # MODEL_MAP_ID=meta.llama3-8b-instruct-v1:0 extracts chunk summaries with the
+    # faster 8B model while the reduce and final calls stay on 70B.
+    LLM_DEFAULT_MODEL_ID = os.getenv("LLM_DEFAULT_MODEL_ID", "meta.llama3-70b-instruct-v1:0")
+    MODEL_CONTEXT_ID = os.getenv("MODEL_CONTEXT_ID", LLM_DEFAULT_MODEL_ID)
+    MODEL_CONTEXT_MAX_GEN_LEN = int(os.getenv("MODEL_CONTEXT_MAX_GEN_LEN", "1024"))
+    MODEL_CONTEXT_TEMPERATURE = float(os.getenv("MODEL_CONTEXT_TEMPERATURE", "0.3"))
+    MODEL_MAP_ID = os.getenv("MODEL_MAP_ID", LLM_DEFAULT_MODEL_ID)
+    MODEL_MAP_MAX_GEN_LEN = int(os.getenv("MODEL_MAP_MAX_GEN_LEN", "1024"))
+    MODEL_MAP_TEMPERATURE = float(os.getenv("MODEL_MAP_TEMPERATURE", "0.3"))
+    MODEL_REDUCE_ID = os.getenv("MODEL_REDUCE_ID", LLM_DEFAULT_MODEL_ID)
+    MODEL_REDUCE_MAX_GEN_LEN = int(os.getenv("MODEL_REDUCE_MAX_GEN_LEN", "1024"))
+    MODEL_REDUCE_TEMPERATURE = float(os.getenv("MODEL_REDUCE_TEMPERATURE", "0.3"))
+    MODEL_FINAL_ID = os.getenv("MODEL_FINAL_ID", LLM_DEFAULT_MODEL_ID)
+    MODEL_FINAL_MAX_GEN_LEN = int(os.getenv("MODEL_FINAL_MAX_GEN_LEN", "1024"))
+    MODEL_FINAL_TEMPERATURE = float(os.getenv("MODEL_FINAL_TEMPERATURE", "0.3"))
+    MODEL_QUESTIONS_ID = os.getenv("MODEL_QUESTIONS_ID", LLM_DEFAULT_MODEL_ID)
+    MODEL_QUESTIONS_MAX_GEN_LEN = int(os.getenv("MODEL_QUESTIONS_MAX_GEN_LEN", "2048"))
+    MODEL_QUESTIONS_TEMPERATURE = float(os.getenv("MODEL_QUESTIONS_TEMPERATURE", "0.4"))
+    MODEL_ANSWERS_ID = os.getenv("MODEL_ANSWERS_ID", LLM_DEFAULT_MODEL_ID)
+    MODEL_ANSWERS_MAX_GEN_LEN = int(os.getenv("MODEL_ANSWERS_MAX_GEN_LEN", "2048"))
+    MODEL_ANSWERS_TEMPERATURE = float(os.getenv("MODEL_ANSWERS_TEMPERATURE", "0.4"))
+    
+    # Academic assistant answers: at most ANSWER_MAX_WORKERS concurrent calls per
+    # paper; questions worth at most ANSWER_BATCH_MAX_MARKS marks (0 = off) are
+    # answered ANSWER_BATCH_SIZE to a prompt
+    ANSWER_MAX_WORKERS = int(os.getenv("ANSWER_MAX_WORKERS", "4"))
+    ANSWER_BATCH_MAX_MARKS = int(os.getenv("ANSWER_BATCH_MAX_MARKS", "0"))
+    ANSWER_BATCH_SIZE = int(os.getenv("ANSWER_BATCH_SIZE", "4"))
+    
+    # Bedrock client connection pool, timeouts and retry behaviour
+    BEDROCK_MAX_POOL_CONNECTIONS = int(os.getenv("BEDROCK_MAX_POOL_CONNECTIONS", "10"))
+    BEDROCK_CONNECT_TIMEOUT = int(os.getenv("BEDROCK_CONNECT_TIMEOUT", "10"))
+    BEDROCK_READ_TIMEOUT = int(os.getenv("BEDROCK_READ_TIMEOUT", "120"))
+    BEDROCK_MAX_ATTEMPTS = int(os.getenv("BEDROCK_MAX_ATTEMPTS", "3"))
+    BEDROCK_BACKOFF_BASE = float(os.getenv("BEDROCK_BACKOFF_BASE", "0.5"))
+    BEDROCK_THROTTLE_BACKOFF_BASE = float(os.getenv("BEDROCK_THROTTLE_BACKOFF_BASE", "2.0"))
+    BEDROCK_BACKOFF_MAX = float(os.getenv("BEDROCK_BACKOFF_MAX", "20"))
+    BEDROCK_RETRY_BUDGET = float(os.getenv("BEDROCK_RETRY_BUDGET", "20"))
+    BEDROCK_RETRY_BUDGET_REFILL = float(os.getenv("BEDROCK_RETRY_BUDGET_REFILL", "0.1"))
+    
+    # Content-addressed cache for LLM responses
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_MEMORY_ITEMS = int(os.getenv("LLM_CACHE_MEMORY_ITEMS", "512"))
+    LLM_CACHE_DB_PATH = os.getenv("LLM_CACHE_DB_PATH", "cache/llm_responses.db")
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "20000"))
+    LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+    LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    
+    # Whole-document result cache for /summarize and /generate-questions
+    RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+    RESULT_CACHE_MEMORY_ITEMS = int(os.getenv("RESULT_CACHE_MEMORY_ITEMS", "128"))
+    RESULT_CACHE_DB_PATH = os.getenv("RESULT_CACHE_DB_PATH", "cache/results.db")
+    RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "5000"))
+    RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+    RESULT_CACHE_TTL_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SECONDS", str(24 * 3600)))
+    
+    # Identical documents processed concurrently (same file hash and parameters)
+    # share one pipeline run instead of each starting their own
+    COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "true").lower() == "true"
+    
+    # Memo of summarization tree nodes: chunk summaries keyed by chunk text and
+    # global-context fingerprint, reduce nodes by the content of their inputs,
+    # so a revised document only recomputes what changed
+    SUMMARY_MEMO_ENABLED = os.getenv("SUMMARY_MEMO_ENABLED", "true").lower() == "true"
+    SUMMARY_MEMO_MEMORY_ITEMS = int(os.getenv("SUMMARY_MEMO_MEMORY_ITEMS", "1024"))
+    SUMMARY_MEMO_DB_PATH = os.getenv("SUMMARY_MEMO_DB_PATH", "cache/summary_nodes.db")
+    SUMMARY_MEMO_MAX_ENTRIES = int(os.getenv("SUMMARY_MEMO_MAX_ENTRIES", "50000"))
+    SUMMARY_MEMO_MAX_BYTES = int(os.getenv("SUMMARY_MEMO_MAX_BYTES", str(256 * 1024 * 1024)))
+    SUMMARY_MEMO_TTL_SECONDS = int(os.getenv("SUMMARY_MEMO_TTL_SECONDS", str(30 * 24 * 3600)))
+    
+    # OCR result cache keyed by the hash of the image or rendered PDF page
+    OCR_CACHE_ENABLED = os.getenv("OCR_CACHE_ENABLED", "true").lower() == "true"
+    OCR_CACHE_MEMORY_ITEMS = int(os.getenv("OCR_CACHE_MEMORY_ITEMS", "256"))
+    OCR_CACHE_DB_PATH = os.getenv("OCR_CACHE_DB_PATH", "cache/ocr.db")
+    OCR_CACHE_MAX_ENTRIES = int(os.getenv("OCR_CACHE_MAX_ENTRIES", "20000"))
+    OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+    OCR_CACHE_TTL_SECONDS = int(os.getenv("OCR_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+    
+    # Background jobs for long-running document pipelines. A job keeps at most
+    # JOB_MAX_IN_FLIGHT model calls queued or running on the LLM pool, which
+    # also bounds the calls that still finish after it is cancelled
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_MAX_IN_FLIGHT = int(os.getenv("JOB_MAX_IN_FLIGHT", "4"))
+    JOB_BACKEND = os.getenv("JOB_BACKEND", "memory")  # "memory" or "sqlite"
+    JOB_DB_PATH = os.getenv("JOB_DB_PATH", "cache/jobs.db")
+    JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+    
+    # Streamed summaries (/summarize/stream) run on STREAM_WORKERS pipeline
+    # threads; further streams wait for a free one. A stream whose client
+    # disconnects stops at its next progress event
+    STREAM_WORKERS = int(os.getenv("STREAM_WORKERS", "4"))
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -23,6 +229,10 @@ class TestingConfig(Config):
     TESTING = True
     DEBUG = True
     CORS_ORIGIN = "*"
+    LLM_CACHE_DB_PATH = None  # Keep the caches in memory only
+    RESULT_CACHE_DB_PATH = None
+    OCR_CACHE_DB_PATH = None
+    SUMMARY_MEMO_DB_PATH = None
 
 class ProductionConfig(Config):
     """Production configuration"""
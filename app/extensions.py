@@ -1,33 +1,345 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import boto3
 import spacy
+from botocore.config import Config as BotoConfig
+from app.utils.admission import AdmissionController, MemoryRateLimiter, SQLiteRateLimiter
+from app.utils.cache import TieredCache
+from app.utils.fair_pool import FairThreadPool
+from app.utils.jobs import JobManager, MemoryJobBackend, SQLiteJobBackend
+from app.utils.metrics import StageMetrics, UploadMetrics
+from app.utils.ocr import TextractOCRBackend
+from app.utils.retry import RetryBudget, RetryPolicy
+from app.utils.singleflight import SingleFlight
+from app.utils.tokens import TokenCounter
 
 # Initialize global variables
-nlp = None
+config = None
+sentence_nlp = None
+token_counter = None
 bedrock_runtime = None
+textract_client = None
+bedrock_retry_policy = None
+llm_executor = None
+admission_controller = None
+llm_cache = None
+result_cache = None
+request_coalescer = None
+summary_memo = None
+job_manager = None
+stream_executor = None
+pdf_executor = None
+ocr_backend = None
+ocr_cache = None
+ocr_executor = None
+upload_metrics = None
+stage_metrics = None
+
+def load_sentence_segmenter(mode="senter"):
+    """
+    Load a lightweight spaCy pipeline that only sets sentence boundaries
+    
+    Args:
+        mode (str): 'senter' for the statistical sentence recognizer of
+            en_core_web_sm, 'sentencizer' for the rule-based one, or 'full'
+            for the whole en_core_web_sm pipeline (sentences from its parser)
+            
+    Returns:
+        spacy.language.Language: Pipeline producing doc.sents
+    """
+    if mode == "full":
+        return spacy.load("en_core_web_sm")
+    
+    if mode == "senter":
+        try:
+            segmenter = spacy.load(
+                "en_core_web_sm",
+                exclude=["tok2vec", "tagger", "parser", "attribute_ruler", "lemmatizer", "ner"]
+            )
+            segmenter.enable_pipe("senter")
+            return segmenter
+        except (OSError, ValueError) as e:
+            print(f"Falling back to the rule-based sentencizer: {str(e)}")
+    
+    segmenter = spacy.blank("en")
+    segmenter.add_pipe("sentencizer")
+    return segmenter
 
 def init_extensions(app):
     """Initialize Flask extensions and other services"""
-    global nlp, bedrock_runtime
+    global config, sentence_nlp, token_counter, pdf_executor, bedrock_runtime, bedrock_retry_policy, llm_executor, admission_controller, llm_cache, result_cache, request_coalescer, summary_memo, job_manager, stream_executor, textract_client, ocr_backend, ocr_cache, ocr_executor, upload_metrics, stage_metrics
+    
+    # Keep the configuration reachable from worker threads outside the app context
+    config = app.config
+    
+    # Optional components stay None when disabled, also when re-initialized
+    pdf_executor = llm_cache = result_cache = request_coalescer = summary_memo = ocr_cache = None
     
-    # Initialize spaCy
-    nlp = spacy.load("en_core_web_sm")
+    # Initialize spaCy. Chunking only needs sentence boundaries, so the full
+    # pipeline is loaded only when CHUNKING_SEGMENTER asks for it.
+    sentence_nlp = load_sentence_segmenter(app.config["CHUNKING_SEGMENTER"])
     
-    # Initialize AWS Bedrock client
+    # Memory held by uploads in flight
+    upload_metrics = UploadMetrics()
+    
+    # Latency and tokens of the model calls of each pipeline stage
+    stage_metrics = StageMetrics()
+    
+    # Token counting for chunk budgets
+    token_counter = TokenCounter(
+        app.config["LLAMA_TOKENIZER_PATH"],
+        chars_per_token=app.config["TOKEN_ESTIMATE_CHARS_PER_TOKEN"]
+    )
+    
+    # Initialize AWS Bedrock client. The pool must hold at least one connection
+    # per concurrent call, and retries are handled by bedrock_retry_policy
+    # rather than botocore so throttling and empty output are treated apart.
     bedrock_runtime = boto3.client(
         service_name='bedrock-runtime',
         region_name=app.config["AWS_REGION"],
         aws_access_key_id=app.config["AWS_ACCESS_KEY_ID"],
-        aws_secret_access_key=app.config["AWS_SECRET_ACCESS_KEY"]
+        aws_secret_access_key=app.config["AWS_SECRET_ACCESS_KEY"],
+        config=BotoConfig(
+            max_pool_connections=max(
+                app.config["BEDROCK_MAX_POOL_CONNECTIONS"],
+                app.config["BEDROCK_MAX_CONCURRENCY"]
+            ),
+            connect_timeout=app.config["BEDROCK_CONNECT_TIMEOUT"],
+            read_timeout=app.config["BEDROCK_READ_TIMEOUT"],
+            retries={"total_max_attempts": 1, "mode": "standard"}
+        )
+    )
+    bedrock_retry_policy = RetryPolicy(
+        max_attempts=app.config["BEDROCK_MAX_ATTEMPTS"],
+        base_delay=app.config["BEDROCK_BACKOFF_BASE"],
+        throttle_base_delay=app.config["BEDROCK_THROTTLE_BACKOFF_BASE"],
+        max_delay=app.config["BEDROCK_BACKOFF_MAX"],
+        budget=RetryBudget(
+            capacity=app.config["BEDROCK_RETRY_BUDGET"],
+            refill_per_success=app.config["BEDROCK_RETRY_BUDGET_REFILL"]
+        )
+    )
+    
+    # Initialize the process pool for parallel PDF page extraction. The workers
+    # are forked right away, before any of the app's threads exist; spawned
+    # workers would re-import the main module and build a whole app each.
+    pdf_workers = app.config["PDF_EXTRACT_WORKERS"] or os.cpu_count() or 1
+    if pdf_workers > 1:
+        pdf_executor = ProcessPoolExecutor(
+            max_workers=pdf_workers,
+            mp_context=multiprocessing.get_context("fork")
+        )
+        pdf_executor.submit(os.getpid).result()
+    
+    # Initialize the long-lived Textract client behind the OCR backend, with a
+    # connection per concurrent OCR call. Textract calls are idempotent, so
+    # botocore's own retries are kept.
+    textract_client = boto3.client(
+        service_name='textract',
+        region_name=app.config["AWS_REGION"],
+        aws_access_key_id=app.config["AWS_ACCESS_KEY_ID"],
+        aws_secret_access_key=app.config["AWS_SECRET_ACCESS_KEY"],
+        config=BotoConfig(
+            max_pool_connections=max(app.config["TEXTRACT_MAX_POOL_CONNECTIONS"], app.config["OCR_MAX_WORKERS"]),
+            connect_timeout=app.config["TEXTRACT_CONNECT_TIMEOUT"],
+            read_timeout=app.config["TEXTRACT_READ_TIMEOUT"],
+            retries={"max_attempts": app.config["TEXTRACT_MAX_ATTEMPTS"], "mode": "standard"}
+        )
+    )
+    
+    # Initialize the OCR backend and the worker pool for concurrent page OCR
+    ocr_backend = TextractOCRBackend(textract_client)
+    ocr_executor = ThreadPoolExecutor(
+        max_workers=app.config["OCR_MAX_WORKERS"],
+        thread_name_prefix="ocr-worker"
+    )
+    
+    # Initialize the worker pool used for concurrent LLM calls, which picks
+    # queued calls round-robin between clients, and the admission controller
+    # capping in-flight and per-minute Bedrock usage
+    llm_executor = FairThreadPool(
+        max_workers=app.config["LLM_MAX_WORKERS"],
+        thread_name_prefix="llm-worker",
+        default_priority=app.config["ADMISSION_DEFAULT_PRIORITY"]
+    )
+    rate_limits = {"requests": app.config["BEDROCK_MAX_RPM"], "tokens": app.config["BEDROCK_MAX_TPM"]}
+    if app.config["ADMISSION_BACKEND"] == "sqlite":
+        rate_limiter = SQLiteRateLimiter(app.config["ADMISSION_DB_PATH"], rate_limits)
+    else:
+        rate_limiter = MemoryRateLimiter(rate_limits)
+    admission_controller = AdmissionController(
+        max_concurrency=app.config["BEDROCK_MAX_CONCURRENCY"],
+        rate_limiter=rate_limiter if rate_limiter.limits else None,
+        max_wait=app.config["ADMISSION_MAX_WAIT_SECONDS"] or None,
+        max_queue=app.config["ADMISSION_MAX_QUEUE"] or None,
+        default_priority=app.config["ADMISSION_DEFAULT_PRIORITY"]
+    )
+    
+    # Initialize the LLM response cache
+    if app.config["LLM_CACHE_ENABLED"]:
+        llm_cache = TieredCache(
+            "llm_responses",
+            max_memory_items=app.config["LLM_CACHE_MEMORY_ITEMS"],
+            db_path=app.config["LLM_CACHE_DB_PATH"],
+            max_db_entries=app.config["LLM_CACHE_MAX_ENTRIES"],
+            max_db_bytes=app.config["LLM_CACHE_MAX_BYTES"],
+            ttl_seconds=app.config["LLM_CACHE_TTL_SECONDS"]
+        )
+    
+    # Initialize the whole-document result cache
+    if app.config["RESULT_CACHE_ENABLED"]:
+        result_cache = TieredCache(
+            "document_results",
+            max_memory_items=app.config["RESULT_CACHE_MEMORY_ITEMS"],
+            db_path=app.config["RESULT_CACHE_DB_PATH"],
+            max_db_entries=app.config["RESULT_CACHE_MAX_ENTRIES"],
+            max_db_bytes=app.config["RESULT_CACHE_MAX_BYTES"],
+            ttl_seconds=app.config["RESULT_CACHE_TTL_SECONDS"]
+        )
+    
+    # Coalesce concurrent runs of the same document pipeline
+    if app.config["COALESCE_REQUESTS"]:
+        request_coalescer = SingleFlight()
+    
+    # Initialize the memo of summary tree nodes for incremental re-summarization
+    if app.config["SUMMARY_MEMO_ENABLED"]:
+        summary_memo = TieredCache(
+            "summary_nodes",
+            max_memory_items=app.config["SUMMARY_MEMO_MEMORY_ITEMS"],
+            db_path=app.config["SUMMARY_MEMO_DB_PATH"],
+            max_db_entries=app.config["SUMMARY_MEMO_MAX_ENTRIES"],
+            max_db_bytes=app.config["SUMMARY_MEMO_MAX_BYTES"],
+            ttl_seconds=app.config["SUMMARY_MEMO_TTL_SECONDS"]
+        )
+    
+    # Initialize the OCR result cache
+    if app.config["OCR_CACHE_ENABLED"]:
+        ocr_cache = TieredCache(
+            "ocr_results",
+            max_memory_items=app.config["OCR_CACHE_MEMORY_ITEMS"],
+            db_path=app.config["OCR_CACHE_DB_PATH"],
+            max_db_entries=app.config["OCR_CACHE_MAX_ENTRIES"],
+            max_db_bytes=app.config["OCR_CACHE_MAX_BYTES"],
+            ttl_seconds=app.config["OCR_CACHE_TTL_SECONDS"]
+        )
+    
+    # Initialize the background job manager; handlers are registered and the
+    # workers started by the application factory
+    if app.config["JOB_BACKEND"] == "sqlite":
+        job_backend = SQLiteJobBackend(app.config["JOB_DB_PATH"])
+    else:
+        job_backend = MemoryJobBackend()
+    job_manager = JobManager(
+        job_backend,
+        workers=app.config["JOB_WORKERS"],
+        retention_seconds=app.config["JOB_RETENTION_SECONDS"]
+    )
+    
+    # Initialize the worker pool running the pipelines of streamed summaries
+    stream_executor = ThreadPoolExecutor(
+        max_workers=app.config["STREAM_WORKERS"],
+        thread_name_prefix="stream-worker"
     )
     
-    return nlp, bedrock_runtime
+    return sentence_nlp, bedrock_runtime
+
+def get_config():
+    """Get the application configuration (empty before initialization)"""
+    global config
+    return config if config is not None else {}
+
+def get_sentence_nlp():
+    """Get the spaCy pipeline used for sentence segmentation"""
+    global sentence_nlp
+    return sentence_nlp
+
+def get_token_counter():
+    """Get the Llama 3 token counter"""
+    global token_counter
+    return token_counter
+
+def get_pdf_executor():
+    """Get the process pool for parallel PDF extraction (None when disabled)"""
+    global pdf_executor
+    return pdf_executor
+
+def get_summary_memo():
+    """Get the memo of summary tree nodes (None when disabled)"""
+    global summary_memo
+    return summary_memo
+
+def get_textract_client():
+    """Get the AWS Textract client"""
+    global textract_client
+    return textract_client
 
-def get_nlp():
-    """Get the spaCy NLP instance"""
-    global nlp
-    return nlp
+def get_ocr_cache():
+    """Get the OCR result cache (None when disabled)"""
+    global ocr_cache
+    return ocr_cache
+
+def get_ocr_backend():
+    """Get the OCR backend used for images and scanned PDF pages"""
+    global ocr_backend
+    return ocr_backend
+
+def get_ocr_executor():
+    """Get the worker pool for concurrent OCR calls"""
+    global ocr_executor
+    return ocr_executor
 
 def get_bedrock_client():
     """Get the AWS Bedrock client"""
     global bedrock_runtime
-    return bedrock_runtime 
\ No newline at end of file
+    return bedrock_runtime
+
+def get_bedrock_retry_policy():
+    """Get the retry policy shared by all Bedrock invocations"""
+    global bedrock_retry_policy
+    return bedrock_retry_policy
+
+def get_llm_executor():
+    """Get the worker pool for concurrent LLM calls"""
+    global llm_executor
+    return llm_executor
+
+def get_admission_controller():
+    """Get the admission controller bounding in-flight and per-minute Bedrock usage"""
+    global admission_controller
+    return admission_controller
+
+def get_llm_cache():
+    """Get the LLM response cache (None when disabled)"""
+    global llm_cache
+    return llm_cache
+
+def get_result_cache():
+    """Get the whole-document result cache (None when disabled)"""
+    global result_cache
+    return result_cache
+
+def get_upload_metrics():
+    """Get the upload memory metrics"""
+    global upload_metrics
+    return upload_metrics
+
+def get_stage_metrics():
+    """Get the per-stage model call metrics"""
+    global stage_metrics
+    return stage_metrics
+
+def get_request_coalescer():
+    """Get the coalescer of identical concurrent document pipelines (None when disabled)"""
+    global request_coalescer
+    return request_coalescer
+
+def get_job_manager():
+    """Get the background job manager"""
+    global job_manager
+    return job_manager
+
+def get_stream_executor():
+    """Get the worker pool running the pipelines of streamed summaries"""
+    global stream_executor
+    return stream_executor
\ No newline at end of file
@@ -1,57 +1,33 @@
-import json
-from app.extensions import get_bedrock_client
+import re
+from app.extensions import get_config
+from app.services.bedrock_service import format_llama3_prompt, invoke_llama, stage_params
+from app.utils.concurrency import map_concurrently
+from app.utils.json_utils import extract_json_from_text
 
-def format_llama3_prompt(user_prompt):
+def parse_answer(answer_text):
     """
-    Format prompt for Llama 3 model on AWS Bedrock
+    Parse a model generation into an answer object
     
     Args:
-        user_prompt (str): The user prompt content
+        answer_text (str): Raw generation text
         
     Returns:
-        str: Formatted prompt for Llama 3
+        dict: Parsed answer or error
     """
-    return (
-        "<|begin_of_text|><|start_header_id|>user<|end_header_id|>\n\n"
-        + user_prompt +
-        "\n<|start_header_id|>assistant<|end_header_id|>\n\n"
-    )
+    return extract_json_from_text(answer_text)
 
-def extract_json_from_text(text):
+def is_usable_answer(answer_text):
     """
-    Extract a JSON object from text that may contain markdown code blocks or other text
+    Check whether a model generation parses into an answer object
     
     Args:
-        text (str): Text potentially containing JSON
+        answer_text (str): Raw generation text
         
     Returns:
-        dict: Extracted JSON object or error
+        bool: True if the generation yielded a JSON object
     """
-
-    if "```" in text:
-
-        parts = text.split("```")
-        for i in range(1, len(parts), 2):
-            try:
-                content = parts[i].strip()
-                if content.startswith("json"):
-                    content = content[4:].strip()
-                return json.loads(content)
-            except json.JSONDecodeError:
-                continue
-    
-    try:
-        return json.loads(text)
-    except json.JSONDecodeError:
-        try:
-            start = text.find('{')
-            end = text.rfind('}') + 1
-            if start != -1 and end > start:
-                return json.loads(text[start:end])
-        except:
-            pass
-            
-    return {"error": "Could not extract valid JSON from response"}
+    parsed = parse_answer(answer_text)
+    return isinstance(parsed, dict) and "error" not in parsed
 
 def generate_academic_answer(question, context):
     """
@@ -63,8 +39,6 @@ def generate_academic_answer(question, context):
     Returns:
         dict: The generated academic answer in structured JSON format
     """
-    bedrock_runtime = get_bedrock_client()
-    
     prompt_template = (
         "You are an expert academic assistant. Based on the following question and context, "
         "write a comprehensive, well-structured answer suitable for an exam. "
@@ -88,28 +62,14 @@ def generate_academic_answer(question, context):
     prompt = format_llama3_prompt(prompt_template)
     
     try:
-        request_body = json.dumps({
-            "prompt": prompt,
-            "max_gen_len": 2048,
-            "temperature": 0.4,
-            "top_p": 0.9
-        })
-        
-        response = bedrock_runtime.invoke_model(
-            modelId="meta.llama3-70b-instruct-v1:0",
-            contentType="application/json",
-            accept="application/json",
-            body=request_body
+        answer_text = invoke_llama(
+            prompt,
+            top_p=0.9,
+            is_valid=is_usable_answer,
+            stage="answers",
+            **stage_params("answers")
         )
-        
-        response_body = json.loads(response['body'].read().decode('utf-8'))
-        answer_text = response_body.get('generation', '').strip()
-        
-        try:
-            answer_json = json.loads(answer_text)
-            return answer_json
-        except json.JSONDecodeError:
-            return extract_json_from_text(answer_text)
+        return parse_answer(answer_text)
         
     except Exception as e:
         print(f"Error generating academic answer: {str(e)}")
@@ -124,16 +84,159 @@ def generate_academic_answer(question, context):
             "tips_for_maximum_marks": []
         } 
     
-def generate_answers_for_all_questions(preprocessed_text):
+def normalize_question_number(question_number):
+    """Normalize a question label so "Q.1", "Q1" and "q 1" compare equal"""
+    return re.sub(r'[\s.]', '', str(question_number or '')).upper()
+
+def is_usable_batch_answer(answer_text):
+    """
+    Check whether a model generation parses into a list of solutions
+    
+    Args:
+        answer_text (str): Raw generation text
+        
+    Returns:
+        bool: True if the generation yielded a "solutions" list
+    """
+    parsed = parse_answer(answer_text)
+    return isinstance(parsed, dict) and isinstance(parsed.get("solutions"), list)
+
+def generate_batched_answers(questions, context):
+    """
+    Answer several low-mark questions with a single model call
+    
+    Args:
+        questions (list): Parsed questions with question_number and question_text
+        context (str): Context of the question paper
+        
+    Returns:
+        dict: Answers keyed by normalized question number; questions the model
+            skipped or a failed call are simply missing
+    """
+    question_list = "\n".join(
+        f"{q['question_number']}: {q['question_text']}" for q in questions
+    )
+    prompt_template = (
+        "You are an expert academic assistant. Based on the following questions and context, "
+        "write a concise, well-structured answer suitable for an exam for each question. "
+        "Respond with a JSON object having the following structure:\n\n"
+        "{\"solutions\": [{\n"
+        "  \"question_number\": \"The question number exactly as given, e.g. Q.1\",\n"
+        "  \"question\": \"The question text\",\n"
+        "  \"introduction\": \"A brief introduction to the topic\",\n"
+        "  \"key_concepts\": [\"List of key concepts and terms with explanations\"],\n"
+        "  \"main_content\": \"The answer content with proper organization\",\n"
+        "  \"examples\": [\"Relevant examples or analogies\"],\n"
+        "  \"conclusion\": \"A concise conclusion or summary\",\n"
+        "  \"tips_for_maximum_marks\": [\"Strategies to impress examiners\", \"Ways to avoid common mistakes\"]\n"
+        "}]}\n\n"
+        "Include one solution per question, in the order given. "
+        "Ensure your response is a valid JSON object that can be parsed directly. "
+        "Don't include any markdown formatting, only provide the JSON object. "
+        "Don't include explanations or any text outside the JSON structure.\n\n"
+        f"Questions:\n{question_list}\n"
+        f"Context: {context}"
+    )
+    
+    prompt = format_llama3_prompt(prompt_template)
+    
+    try:
+        answer_text = invoke_llama(
+            prompt,
+            top_p=0.9,
+            is_valid=is_usable_batch_answer,
+            stage="answers",
+            **stage_params("answers")
+        )
+    except Exception as e:
+        print(f"Error generating batched academic answers: {str(e)}")
+        return {}
+    
+    answers = {}
+    for solution in parse_answer(answer_text).get("solutions", []):
+        if isinstance(solution, dict) and solution.get("question_number"):
+            answers.setdefault(normalize_question_number(solution.pop("question_number")), solution)
+    return answers
+
+def answer_question_group(questions, context):
+    """
+    Answer a group of questions: one question gets its own call, several share one
+    
+    Questions missing from a batched response are answered individually, as
+    are questions whose numbers normalize alike (e.g. "Q.1" and "Q1"), since
+    their solutions could not be told apart.
+    
+    Args:
+        questions (list): Parsed questions
+        context (str): Context of the question paper
+        
+    Returns:
+        list: Answers in the same order as questions, each its own dict
+    """
+    numbers = [normalize_question_number(q["question_number"]) for q in questions]
+    distinct = [q for q, number in zip(questions, numbers) if numbers.count(number) == 1]
+    batched = generate_batched_answers(distinct, context) if len(distinct) > 1 else {}
+    
+    answers = []
+    for q, number in zip(questions, numbers):
+        answer = batched.get(number) if numbers.count(number) == 1 else None
+        if answer is None:
+            answer = generate_academic_answer(question=q["question_text"], context=context)
+        answers.append(dict(answer))
+    return answers
+
+def generate_answers_for_all_questions(preprocessed_text, on_event=None):
+    """
+    Answer every question of a preprocessed question paper
+    
+    Questions are answered concurrently, at most ANSWER_MAX_WORKERS calls at a
+    time. With ANSWER_BATCH_MAX_MARKS set, questions worth at most that many
+    marks are packed ANSWER_BATCH_SIZE to a prompt.
+    
+    Progress is reported as a "questions" event with the question count and
+    an "answers" event per answered group; an exception raised by on_event
+    (e.g. JobCancelled) stops the run and drops the groups not yet started.
+    
+    Args:
+        preprocessed_text (dict): Output of preprocess_question_paper
+        on_event (callable, optional): Progress callback, called as on_event(event_name, data)
+        
+    Returns:
+        dict: {"solutions": [...]} in question order
+    """
+    config = get_config()
     context = preprocessed_text["context"]
     questions = preprocessed_text["questions"]
-    all_solutions = []
+    batch_max_marks = config.get("ANSWER_BATCH_MAX_MARKS", 0)
+    batch_size = max(1, config.get("ANSWER_BATCH_SIZE", 4))
+    
+    groups = []
+    batchable = []
     for q in questions:
-        answer = generate_academic_answer(
-            question=q["question_text"],
-            context=context,
-        )
-        answer["question_number"] = q["question_number"]
-        answer["marks"] = q["marks"]
-        all_solutions.append(answer)
+        if batch_max_marks and q["marks"] is not None and q["marks"] <= batch_max_marks:
+            batchable.append(q)
+        else:
+            groups.append([q])
+    groups.extend(batchable[i:i + batch_size] for i in range(0, len(batchable), batch_size))
+    
+    on_result = None
+    if on_event is not None:
+        on_event("questions", {"count": len(questions), "groups": len(groups)})
+        on_result = lambda index, answers: on_event("answers", {"index": index, "count": len(answers)})
+    
+    group_answers = map_concurrently(
+        lambda group: answer_question_group(group, context),
+        groups,
+        on_result=on_result,
+        max_in_flight=config.get("ANSWER_MAX_WORKERS", 4)
+    )
+    
+    answers = {}
+    for group, results in zip(groups, group_answers):
+        for q, answer in zip(group, results):
+            answer["question_number"] = q["question_number"]
+            answer["marks"] = q["marks"]
+            answers[id(q)] = answer
+    
+    all_solutions = [answers[id(q)] for q in questions]
     return {"solutions": all_solutions}
\ No newline at end of file
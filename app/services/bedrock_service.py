@@ -0,0 +1,383 @@
+import json
+import time
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, HTTPClientError
+from app.extensions import get_bedrock_client, get_bedrock_retry_policy, get_config, get_stage_metrics
+from app.services.llm_cache import get_cached_generation, cache_generation
+from app.services.token_budget import count_tokens, record_prompt_tokens
+from app.utils.admission import AdmissionRejected
+from app.utils.concurrency import bedrock_slot
+
+DEFAULT_MODEL_ID = "meta.llama3-70b-instruct-v1:0"
+
+# Pipeline stages routed to their own model: (max_gen_len, temperature) used
+# when the configuration does not set them
+STAGE_DEFAULTS = {
+    "context": (1024, 0.3),
+    "map": (1024, 0.3),
+    "reduce": (1024, 0.3),
+    "final": (1024, 0.3),
+    "questions": (2048, 0.4),
+    "answers": (2048, 0.4)
+}
+
+# Error codes Bedrock returns when the account or model is over its limits
+THROTTLING_ERROR_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceQuotaExceededException",
+    "ModelNotReadyException"
+}
+
+# Server-side error codes that are worth retrying
+TRANSIENT_ERROR_CODES = {
+    "InternalServerException",
+    "ServiceUnavailableException",
+    "ModelTimeoutException"
+}
+
+class BedrockInvocationError(Exception):
+    """Raised when a model invocation fails after all permitted attempts"""
+
+class BedrockThrottledError(BedrockInvocationError):
+    """Raised when Bedrock kept throttling the request"""
+
+class EmptyGenerationError(BedrockInvocationError):
+    """Raised when the model kept returning empty or unusable output"""
+
+def format_llama3_prompt(user_prompt):
+    """
+    Format prompt for Llama 3 model on AWS Bedrock
+
+    Args:
+        user_prompt (str): The user prompt content
+
+    Returns:
+        str: Formatted prompt for Llama 3
+    """
+    return (
+        "<|begin_of_text|><|start_header_id|>user<|end_header_id|>\n\n"
+        + user_prompt +
+        "\n<|start_header_id|>assistant<|end_header_id|>\n\n"
+    )
+
+def classify_error(error):
+    """
+    Classify an exception raised by the Bedrock client
+
+    Args:
+        error (Exception): Exception raised by invoke_model
+
+    Returns:
+        str: 'throttled', 'transient' or 'fatal'
+    """
+    if isinstance(error, ClientError):
+        code = error.response.get("Error", {}).get("Code", "")
+        if code in THROTTLING_ERROR_CODES:
+            return "throttled"
+        if code in TRANSIENT_ERROR_CODES:
+            return "transient"
+        return "fatal"
+    if isinstance(error, (BotoConnectionError, HTTPClientError)):
+        # Connection resets, endpoint connection failures and read/connect timeouts
+        return "transient"
+    return "fatal"
+
+def reported_usage(response_body):
+    """
+    Total tokens (prompt plus generation) Bedrock reports for a Llama response
+    
+    Args:
+        response_body (dict): Decoded response body
+        
+    Returns:
+        int: Token count, or None if the response carries no counts
+    """
+    prompt_tokens = response_body.get('prompt_token_count')
+    generation_tokens = response_body.get('generation_token_count')
+    if prompt_tokens is None and generation_tokens is None:
+        return None
+    return (prompt_tokens or 0) + (generation_tokens or 0)
+
+def stage_params(stage):
+    """
+    Model and generation parameters of a pipeline stage
+    
+    Read from MODEL_<STAGE>_ID, MODEL_<STAGE>_MAX_GEN_LEN and
+    MODEL_<STAGE>_TEMPERATURE, falling back to LLM_DEFAULT_MODEL_ID and
+    STAGE_DEFAULTS.
+    
+    Args:
+        stage (str): One of STAGE_DEFAULTS
+        
+    Returns:
+        dict: model_id, max_gen_len and temperature, ready to pass to invoke_llama
+    """
+    config = get_config()
+    max_gen_len, temperature = STAGE_DEFAULTS[stage]
+    prefix = f"MODEL_{stage.upper()}"
+    return {
+        "model_id": config.get(f"{prefix}_ID") or config.get("LLM_DEFAULT_MODEL_ID") or DEFAULT_MODEL_ID,
+        "max_gen_len": config.get(f"{prefix}_MAX_GEN_LEN") or max_gen_len,
+        "temperature": config.get(f"{prefix}_TEMPERATURE", temperature)
+    }
+
+def stage_routing():
+    """
+    Parameters of every pipeline stage, for keys of results that depend on them
+    
+    Returns:
+        dict: stage_params of each stage keyed by stage name
+    """
+    return {stage: stage_params(stage) for stage in STAGE_DEFAULTS}
+
+def record_stage_call(stage, model_id, seconds, response_body):
+    """
+    Record the latency and token counts of a completed model call
+    
+    Args:
+        stage (str): Pipeline stage, or None for calls outside the pipelines
+        model_id (str): Bedrock model identifier
+        seconds (float): Time from sending the request to the last byte of the response
+        response_body (dict): Decoded response body (or the token counts of a stream)
+    """
+    metrics = get_stage_metrics()
+    if metrics is None or stage is None:
+        return
+    metrics.record(
+        stage,
+        model_id,
+        seconds,
+        response_body.get('prompt_token_count'),
+        response_body.get('generation_token_count')
+    )
+
+def record_stage_event(stage, event):
+    """
+    Count a cache hit or failed attempt of a pipeline stage
+    
+    Args:
+        stage (str): Pipeline stage, or None for calls outside the pipelines
+        event (str): 'cache_hits', 'unusable' (empty or invalid output) or 'errors'
+    """
+    metrics = get_stage_metrics()
+    if metrics is None or stage is None:
+        return
+    metrics.count(stage, event)
+
+def build_request_body(prompt, max_gen_len, temperature, top_p):
+    """
+    Build the JSON request body for a Llama 3 invocation
+
+    Args:
+        prompt (str): Fully formatted Llama 3 prompt
+        max_gen_len (int): Maximum number of generated tokens
+        temperature (float): Sampling temperature
+        top_p (float): Nucleus sampling parameter
+
+    Returns:
+        str: JSON request body
+    """
+    return json.dumps({
+        "prompt": prompt,
+        "max_gen_len": max_gen_len,
+        "temperature": temperature,
+        "top_p": top_p
+    })
+
+def invoke_llama(prompt, model_id=DEFAULT_MODEL_ID, max_gen_len=1024, temperature=0.3, top_p=0.9,
+                 is_valid=None, use_cache=True, stage=None):
+    """
+    Invoke a Llama 3 model on Bedrock with caching, backoff and a shared retry budget
+
+    Args:
+        prompt (str): Fully formatted Llama 3 prompt
+        model_id (str): Bedrock model identifier
+        max_gen_len (int): Maximum number of generated tokens
+        temperature (float): Sampling temperature
+        top_p (float): Nucleus sampling parameter
+        is_valid (callable, optional): Predicate on the generation; output failing it
+            is retried like an empty generation and never cached
+        use_cache (bool): Whether to consult and populate the LLM response cache
+        stage (str, optional): Pipeline stage the call belongs to, for the per-stage metrics
+
+    Returns:
+        str: Stripped generation text
+
+    Raises:
+        BedrockThrottledError: Bedrock throttled every permitted attempt
+        EmptyGenerationError: Every permitted attempt returned empty or invalid output
+        BedrockInvocationError: A non-retryable or persistent transport error occurred
+    """
+    request_body = build_request_body(prompt, max_gen_len, temperature, top_p)
+
+    # Identical prompts are served from the response cache
+    if use_cache:
+        cached = get_cached_generation(model_id, request_body)
+        if cached:
+            record_stage_event(stage, "cache_hits")
+            return cached
+
+    bedrock_runtime = get_bedrock_client()
+    policy = get_bedrock_retry_policy()
+    # Admission is charged for the whole generation budget up front and settled
+    # with the reported usage once the call returns
+    estimated_tokens = count_tokens(prompt) + max_gen_len
+    attempt = 0
+
+    while True:
+        attempt += 1
+        throttled = False
+
+        try:
+            with bedrock_slot(estimated_tokens) as admission:
+                started = time.perf_counter()
+                response = bedrock_runtime.invoke_model(
+                    modelId=model_id,
+                    contentType="application/json",
+                    accept="application/json",
+                    body=request_body
+                )
+                response_body = json.loads(response['body'].read().decode('utf-8'))
+                record_stage_call(stage, model_id, time.perf_counter() - started, response_body)
+                if admission is not None:
+                    admission.record_tokens(reported_usage(response_body))
+            record_prompt_tokens(prompt, response_body.get('prompt_token_count'))
+
+            generation = response_body.get('generation', '').strip()
+            if generation and (is_valid is None or is_valid(generation)):
+                if policy is not None:
+                    policy.record_success()
+                if use_cache:
+                    cache_generation(model_id, request_body, generation)
+                return generation
+
+            record_stage_event(stage, "unusable")
+            failure = EmptyGenerationError(
+                "Model returned empty output" if not generation else "Model returned unusable output"
+            )
+        except AdmissionRejected as e:
+            # Retrying would only queue the call again behind the same backlog
+            raise BedrockThrottledError(str(e)) from e
+        except Exception as e:
+            kind = classify_error(e)
+            record_stage_event(stage, "errors")
+            if kind == "fatal":
+                raise BedrockInvocationError(str(e)) from e
+            throttled = kind == "throttled"
+            failure = BedrockThrottledError(str(e)) if throttled else BedrockInvocationError(str(e))
+            failure.__cause__ = e
+
+        if policy is None or not policy.allow_retry(attempt, throttled=throttled):
+            raise failure
+
+        delay = policy.backoff(attempt, throttled=throttled)
+        print(f"Bedrock attempt {attempt} failed ({failure}); retrying in {delay:.2f}s")
+        time.sleep(delay)
+
+
+def stream_llama(prompt, model_id=DEFAULT_MODEL_ID, max_gen_len=1024, temperature=0.3, top_p=0.9,
+                 is_valid=None, use_cache=True, stage=None):
+    """
+    Stream a Llama 3 generation from Bedrock as it is produced
+
+    Failures before the first piece of text are retried like invoke_llama; once
+    text has been yielded the stream cannot be restarted and errors propagate.
+
+    Args:
+        prompt (str): Fully formatted Llama 3 prompt
+        model_id (str): Bedrock model identifier
+        max_gen_len (int): Maximum number of generated tokens
+        temperature (float): Sampling temperature
+        top_p (float): Nucleus sampling parameter
+        is_valid (callable, optional): Predicate on the full generation; output
+            failing it is not cached (it has already been streamed, so it is not retried)
+        use_cache (bool): Whether to consult and populate the LLM response cache
+        stage (str, optional): Pipeline stage the call belongs to, for the per-stage metrics
+
+    Yields:
+        str: Pieces of generated text
+
+    Raises:
+        BedrockInvocationError: The stream could not be started or broke off
+    """
+    request_body = build_request_body(prompt, max_gen_len, temperature, top_p)
+
+    # A cached generation is replayed as a single piece
+    if use_cache:
+        cached = get_cached_generation(model_id, request_body)
+        if cached:
+            record_stage_event(stage, "cache_hits")
+            yield cached
+            return
+
+    bedrock_runtime = get_bedrock_client()
+    policy = get_bedrock_retry_policy()
+    estimated_tokens = count_tokens(prompt) + max_gen_len
+    attempt = 0
+
+    while True:
+        attempt += 1
+        throttled = False
+        pieces = []
+
+        try:
+            with bedrock_slot(estimated_tokens) as admission:
+                started = time.perf_counter()
+                response = bedrock_runtime.invoke_model_with_response_stream(
+                    modelId=model_id,
+                    contentType="application/json",
+                    accept="application/json",
+                    body=request_body
+                )
+                usage = {}
+                for event in response['body']:
+                    chunk = event.get('chunk')
+                    if not chunk:
+                        continue
+                    payload = json.loads(chunk['bytes'].decode('utf-8'))
+                    if payload.get('prompt_token_count'):
+                        record_prompt_tokens(prompt, payload['prompt_token_count'])
+                    # Token counts arrive spread over the chunks; keep the latest of each
+                    for key in ('prompt_token_count', 'generation_token_count'):
+                        if payload.get(key) is not None:
+                            usage[key] = payload[key]
+                    piece = payload.get('generation', '')
+                    if piece:
+                        pieces.append(piece)
+                        yield piece
+                record_stage_call(stage, model_id, time.perf_counter() - started, usage)
+                if admission is not None:
+                    admission.record_tokens(reported_usage(usage))
+
+            generation = "".join(pieces).strip()
+            if generation:
+                if policy is not None:
+                    policy.record_success()
+                if is_valid is None or is_valid(generation):
+                    if use_cache:
+                        cache_generation(model_id, request_body, generation)
+                else:
+                    record_stage_event(stage, "unusable")
+                return
+
+            record_stage_event(stage, "unusable")
+            failure = EmptyGenerationError("Model returned empty output")
+        except GeneratorExit:
+            raise
+        except AdmissionRejected as e:
+            raise BedrockThrottledError(str(e)) from e
+        except Exception as e:
+            kind = classify_error(e)
+            record_stage_event(stage, "errors")
+            if kind == "fatal" or pieces:
+                raise BedrockInvocationError(str(e)) from e
+            throttled = kind == "throttled"
+            failure = BedrockThrottledError(str(e)) if throttled else BedrockInvocationError(str(e))
+            failure.__cause__ = e
+
+        if policy is None or not policy.allow_retry(attempt, throttled=throttled):
+            raise failure
+
+        delay = policy.backoff(attempt, throttled=throttled)
+        print(f"Bedrock stream attempt {attempt} failed ({failure}); retrying in {delay:.2f}s")
+        time.sleep(delay)
\ No newline at end of file
@@ -0,0 +1,87 @@
+from app.extensions import get_config
+from app.services.token_budget import count_tokens
+from app.utils.dedup import MinHasher, find_boilerplate_lines, strip_boilerplate_lines
+
+def dedup_enabled():
+    """Whether boilerplate and near-duplicate chunks are removed (DEDUP_ENABLED)"""
+    return get_config().get("DEDUP_ENABLED", True)
+
+def find_document_boilerplate(pages):
+    """
+    Find the recurring header and footer lines of a document
+    
+    Args:
+        pages (iterable): Page texts
+        
+    Returns:
+        set: Normalized boilerplate lines (empty when deduplication is off)
+    """
+    if not dedup_enabled():
+        return set()
+    return find_boilerplate_lines(pages, min_fraction=get_config().get("DEDUP_BOILERPLATE_MIN_FRACTION", 0.5))
+
+def strip_page_boilerplate(page_text, boilerplate, stats):
+    """
+    Strip boilerplate lines from one page and account for them
+    
+    Args:
+        page_text (str): Text of the page
+        boilerplate (set): Lines from find_document_boilerplate
+        stats (dict): Counters updated in place (lines_stripped, tokens_saved)
+        
+    Returns:
+        str: Page text without its boilerplate lines
+    """
+    text, removed = strip_boilerplate_lines(page_text, boilerplate)
+    if removed:
+        stats["lines_stripped"] = stats.get("lines_stripped", 0) + len(removed)
+        stats["tokens_saved"] = stats.get("tokens_saved", 0) + count_tokens("\n".join(removed))
+    return text
+
+def remove_boilerplate(pages):
+    """
+    Strip recurring headers and footers from every page
+    
+    Args:
+        pages (list): Page texts
+        
+    Returns:
+        tuple: (stripped page texts, stats with lines_stripped and tokens_saved)
+    """
+    stats = {"lines_stripped": 0, "tokens_saved": 0}
+    boilerplate = find_document_boilerplate(pages)
+    return [strip_page_boilerplate(page, boilerplate, stats) for page in pages], stats
+
+def drop_duplicate_chunks(chunks):
+    """
+    Drop chunks that nearly repeat an earlier chunk (repeated slides, copied sections)
+    
+    Args:
+        chunks (list): Text chunks in document order
+        
+    Returns:
+        tuple: (remaining chunks, stats with chunks_dropped and tokens_saved)
+    """
+    stats = {"chunks_dropped": 0, "tokens_saved": 0}
+    if not dedup_enabled() or len(chunks) < 2:
+        return chunks, stats
+    
+    duplicates = MinHasher().find_near_duplicates(
+        chunks, threshold=get_config().get("DEDUP_SIMILARITY_THRESHOLD", 0.85)
+    )
+    stats["chunks_dropped"] = len(duplicates)
+    stats["tokens_saved"] = sum(count_tokens(chunks[index]) for index in duplicates)
+    return [chunk for index, chunk in enumerate(chunks) if index not in duplicates], stats
+
+def merge_dedup_stats(*stats):
+    """
+    Combine the counters of several deduplication steps
+    
+    Returns:
+        dict: lines_stripped, chunks_dropped and tokens_saved totals
+    """
+    merged = {"lines_stripped": 0, "chunks_dropped": 0, "tokens_saved": 0}
+    for item in stats:
+        for key, value in item.items():
+            merged[key] = merged.get(key, 0) + value
+    return merged
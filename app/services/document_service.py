@@ -0,0 +1,495 @@
+from functools import wraps
+from app.extensions import get_config
+from app.services.pdf_service import extract_text_from_pdf, iter_pdf_pages, find_pdf_headings
+from app.services.summarization_service import (
+    recursive_summarize, extract_json_from_text, summary_chunk_budget, start_global_context,
+    chunk_document, summarize_chunks, serialize_summary, split_sections
+)
+from app.services.question_service import (
+    recursive_generate_questions, generate_questions_chunk, question_chunk_budget, unique_questions
+)
+from app.services.token_budget import uses_token_budget
+from app.services.image_to_text_service import extract_text_from_bytes
+from app.services.academic_assistant_service import generate_answers_for_all_questions
+from app.services.preprocess import preprocess_question_paper
+from app.services.dedup_service import (
+    find_document_boilerplate, strip_page_boilerplate, remove_boilerplate, merge_dedup_stats
+)
+from app.services.result_cache import content_hash, document_cache_key, chunk_size_params, compute_once, get_cached_result, cache_result
+from app.utils.admission import admission_identity, parse_priorities
+from app.utils.concurrency import submit_llm_task
+
+# Outputs /analyze can produce from a single upload
+ANALYZE_OUTPUTS = ("text", "summary", "questions")
+
+def document_sections(source, pages):
+    """
+    Find the sections of a PDF for section-aware chunking
+    
+    Args:
+        source (bytes or str): Raw PDF content, or the path of a spooled upload
+        pages (list): Page texts with boilerplate removed
+        
+    Returns:
+        list: Sections from split_sections, or None to chunk by sentences
+        dict: Structure statistics: where the headings came from and how many
+    """
+    config = get_config()
+    if config.get("CHUNKING_STRATEGY", "sentences") != "sections":
+        return None, {"source": None, "headings": 0}
+    
+    headings, origin = find_pdf_headings(
+        source,
+        max_depth=config.get("SECTION_MAX_DEPTH", 3),
+        min_size_ratio=config.get("HEADING_MIN_SIZE_RATIO", 1.15),
+        max_words=config.get("HEADING_MAX_WORDS", 12)
+    )
+    if not headings:
+        return None, {"source": None, "headings": 0}
+    return split_sections(pages, headings), {"source": origin, "headings": len(headings)}
+
+def summarize_document(source, max_words=400, on_event=None, stream_final=False, max_in_flight=None):
+    """
+    Run the full extraction and summarization pipeline on an uploaded PDF
+    
+    Args:
+        source (bytes or str): Raw PDF content, or the path of a spooled upload
+        max_words (int): Maximum words per chunk
+        on_event (callable, optional): Progress callback, called as on_event(event_name, data)
+        stream_final (bool): Stream the final synthesis as "token" events
+        max_in_flight (int, optional): Maximum model calls queued on the LLM pool at once
+        
+    Returns:
+        dict: Response payload with the per-page text, the summary and
+            deduplication statistics
+    """
+    text_dict, all_text = extract_text_from_pdf(source)
+    
+    if on_event is not None:
+        on_event("pages_extracted", {"pages": len(text_dict)})
+    
+    # Recurring headers and footers are left out of the summarized text only
+    pages, boilerplate_stats = remove_boilerplate(list(text_dict.values()))
+    sections, structure_stats = document_sections(source, pages)
+    chunk_stats = {}
+    memo_stats = {"reused": 0, "recomputed": 0}
+    
+    def on_pipeline_event(event, data):
+        if event == "deduplicated":
+            chunk_stats.update(data)
+        elif event == "memoization":
+            memo_stats.update(data)
+        if on_event is not None:
+            on_event(event, data)
+    
+    summary = recursive_summarize(
+        "".join(page + "\n" for page in pages),
+        max_words=max_words,
+        on_event=on_pipeline_event,
+        stream_final=stream_final,
+        sections=sections,
+        max_in_flight=max_in_flight
+    )
+    
+    # Ensure summary is a proper JSON object, not a string
+    if isinstance(summary, str):
+        summary = extract_json_from_text(summary)
+    
+    return {
+        "text": text_dict,
+        "summary": summary,
+        "stats": {
+            "deduplication": merge_dedup_stats(boilerplate_stats, chunk_stats),
+            "memoization": memo_stats,
+            "structure": structure_stats
+        }
+    }
+
+def is_successful_summary(payload):
+    """
+    Check whether a summarization payload is worth caching
+    
+    Args:
+        payload (dict): Payload from summarize_document
+        
+    Returns:
+        bool: True unless the summary is an error object
+    """
+    summary = payload.get("summary")
+    return not (isinstance(summary, dict) and "error" in summary)
+
+def generate_questions_for_document(source, max_words=400, max_questions=5, on_event=None):
+    """
+    Run the full extraction and question generation pipeline on an uploaded PDF
+    
+    Args:
+        source (bytes or str): Raw PDF content, or the path of a spooled upload
+        max_words (int): Maximum words per chunk
+        max_questions (int): Maximum questions per chunk
+        on_event (callable, optional): Progress callback, called as on_event(event_name, data)
+        
+    Returns:
+        dict: Response payload with the generated questions and
+            deduplication statistics
+    """
+    # A first pass finds recurring headers and footers, keeping only the
+    # edge lines of each page
+    boilerplate = find_document_boilerplate(iter_pdf_pages(source))
+    boilerplate_stats = {}
+    chunk_stats = {}
+    
+    def pages():
+        # Stream pages into the chunker; the full text is never materialized
+        count = 0
+        for page_text in iter_pdf_pages(source):
+            count += 1
+            yield strip_page_boilerplate(page_text, boilerplate, boilerplate_stats)
+        if on_event is not None:
+            on_event("pages_extracted", {"pages": count})
+    
+    def on_pipeline_event(event, data):
+        if event == "deduplicated":
+            chunk_stats.update(data)
+        if on_event is not None:
+            on_event(event, data)
+    
+    questions = recursive_generate_questions(
+        pages(),
+        max_words=max_words,
+        max_questions=max_questions,
+        on_event=on_pipeline_event
+    )
+    
+    return {
+        "questions": questions,
+        "stats": {"deduplication": merge_dedup_stats(boilerplate_stats, chunk_stats)}
+    }
+
+def parse_analyze_outputs(value):
+    """
+    Parse the comma-separated outputs requested from /analyze
+    
+    Args:
+        value (str): Parameter value, e.g. "summary,questions"; empty for all outputs
+        
+    Returns:
+        tuple: Requested outputs in the order of ANALYZE_OUTPUTS
+        
+    Raises:
+        ValueError: An unknown output was requested
+    """
+    if not value:
+        return ANALYZE_OUTPUTS
+    requested = {output.strip() for output in value.split(",") if output.strip()}
+    unknown = requested - set(ANALYZE_OUTPUTS)
+    if unknown:
+        raise ValueError(
+            f"Unknown output(s): {', '.join(sorted(unknown))}. Expected any of: {', '.join(ANALYZE_OUTPUTS)}"
+        )
+    return tuple(output for output in ANALYZE_OUTPUTS if output in requested) or ANALYZE_OUTPUTS
+
+def analyze_document(source, outputs=ANALYZE_OUTPUTS, max_words=400, max_questions=5, on_event=None,
+                     max_in_flight=None):
+    """
+    Summarize an uploaded PDF and generate questions from it in one pass
+    
+    The text is extracted, stripped of boilerplate and chunked once, and the
+    global-context summary is computed once; the map step and question
+    generation share both. Question calls are queued on the LLM pool as soon
+    as the map step is done, so they run alongside the reduce tree. Only
+    single model calls are queued on the pool, never work that waits on the
+    pool itself. When both outputs are requested and chunks are sized by
+    tokens, the chunks fit the smaller of the two prompt budgets. If the
+    pipeline fails or on_event raises (e.g. JobCancelled), question calls
+    that have not started are cancelled.
+    
+    Args:
+        source (bytes or str): Raw PDF content, or the path of a spooled upload
+        outputs (tuple): Any of ANALYZE_OUTPUTS
+        max_words (int): Maximum words per chunk
+        max_questions (int): Maximum questions per chunk
+        on_event (callable, optional): Progress callback, called as on_event(event_name, data)
+        max_in_flight (int, optional): Maximum summary calls queued on the LLM pool at once
+        
+    Returns:
+        dict: Response payload with the requested outputs and statistics
+    """
+    want_summary = "summary" in outputs
+    want_questions = "questions" in outputs
+    text_dict, _ = extract_text_from_pdf(source)
+    
+    if on_event is not None:
+        on_event("pages_extracted", {"pages": len(text_dict)})
+    
+    payload = {"text": text_dict} if "text" in outputs else {}
+    if not (want_summary or want_questions):
+        return payload
+    
+    pages, boilerplate_stats = remove_boilerplate(list(text_dict.values()))
+    sections, structure_stats = document_sections(source, pages)
+    text = "".join(page + "\n" for page in pages)
+    chunk_stats = {}
+    memo_stats = {"reused": 0, "recomputed": 0}
+    
+    def on_pipeline_event(event, data):
+        if event == "deduplicated":
+            chunk_stats.update(data)
+        elif event == "memoization":
+            memo_stats.update(data)
+        if on_event is not None:
+            on_event(event, data)
+    
+    chunk_tokens = None
+    if uses_token_budget():
+        budgets = []
+        if want_summary:
+            budgets.append(summary_chunk_budget())
+        if want_questions:
+            budgets.append(question_chunk_budget(max_questions))
+        chunk_tokens = min(budgets)
+    
+    # The global-context call runs while the text is being chunked
+    context_future = start_global_context(text)
+    chunks = chunk_document(
+        text, max_words=max_words, max_tokens=chunk_tokens, on_event=on_pipeline_event, sections=sections
+    )
+    question_futures = []
+    
+    def start_questions():
+        global_context = context_future.result()[0]
+        if isinstance(global_context, dict) and "error" in global_context:
+            global_context = None
+        context = serialize_summary(global_context) if global_context else None
+        question_futures.extend(
+            submit_llm_task(generate_questions_chunk, chunk, context=context, max_questions=max_questions)
+            for chunk in chunks
+        )
+    
+    stats = {"chunks": len(chunks), "structure": structure_stats}
+    try:
+        if want_summary:
+            summary = summarize_chunks(
+                chunks,
+                context_future,
+                on_event=on_pipeline_event,
+                after_map=start_questions if want_questions else None,
+                max_in_flight=max_in_flight
+            )
+            if isinstance(summary, str):
+                summary = extract_json_from_text(summary)
+            payload["summary"] = summary
+            stats["memoization"] = memo_stats
+        elif want_questions:
+            start_questions()
+        
+        if want_questions:
+            questions = []
+            for index, future in enumerate(question_futures):
+                chunk_questions = future.result()
+                questions.extend(chunk_questions)
+                if on_event is not None:
+                    on_event("chunk_questions", {"index": index, "count": len(chunk_questions)})
+            payload["questions"] = unique_questions(questions)
+    finally:
+        # Question calls still queued must not outlive a failed or cancelled run
+        for future in question_futures:
+            future.cancel()
+    
+    stats["deduplication"] = merge_dedup_stats(boilerplate_stats, chunk_stats)
+    payload["stats"] = stats
+    return payload
+
+def is_complete_analysis(payload, outputs):
+    """
+    Check whether an analysis payload is worth caching
+    
+    Args:
+        payload (dict): Payload from analyze_document
+        outputs (tuple): Outputs that were requested
+        
+    Returns:
+        bool: True if the summary (when requested) succeeded and questions
+            (when requested) were generated
+    """
+    if "summary" in outputs and not is_successful_summary(payload):
+        return False
+    return "questions" not in outputs or bool(payload.get("questions"))
+
+def answer_question_paper(file_bytes, filename, on_event=None):
+    """
+    Extract a question paper from an image or PDF and generate answers
+    
+    Args:
+        file_bytes (bytes): Raw uploaded content
+        filename (str): Original file name, used to detect the file type
+        on_event (callable, optional): Progress callback, called as on_event(event_name, data)
+        
+    Returns:
+        dict: Response payload with the extracted text and the answers
+    """
+    extracted_text = extract_text_from_bytes(file_bytes, filename)
+    
+    if on_event is not None:
+        on_event("text_extracted", {"characters": len(extracted_text)})
+    
+    preprocessed_text = preprocess_question_paper(extracted_text)
+    model_response = generate_answers_for_all_questions(preprocessed_text, on_event=on_event)
+    
+    # Ensure model_response is a dictionary
+    if not isinstance(model_response, dict):
+        model_response = {"error": "Failed to generate a structured response", "raw_response": str(model_response)}
+    
+    return {
+        "extracted_text": extracted_text,
+        "preprocessed_text": preprocessed_text,
+        "answer": model_response
+    }
+
+def job_progress_reporter(context):
+    """
+    Translate pipeline progress events into job progress updates
+    
+    Args:
+        context (JobContext): Context of the running job
+        
+    Returns:
+        callable: on_event callback for the document pipelines
+    """
+    state = {"total": 0, "done": 0, "planned": False}
+    
+    def on_event(event, data):
+        if event in ("pages_extracted", "text_extracted"):
+            context.report(progress=0.1, stage="extracted")
+        elif event == "plan":
+            # Summarization announces every map and reduce call up front
+            state.update(total=sum(level["calls"] for level in data["levels"]), done=0, planned=True)
+            context.report(stage="map")
+        elif event == "chunks" and data["level"] == 0 and not state["planned"]:
+            state.update(total=data["count"], done=0)
+            context.report(stage="map")
+        elif event == "questions":
+            # The academic assistant answers the questions of a paper
+            state.update(total=data["count"], done=0)
+            context.report(stage="answers")
+        elif event in ("chunk_summary", "chunk_questions", "answers"):
+            state["done"] += data["count"] if event == "answers" else 1
+            context.report(progress=0.1 + 0.8 * min(state["done"] / max(state["total"], 1), 1.0))
+        elif event == "reduce_level":
+            context.report(stage=f"reduce level {data['level']}")
+        elif event == "final_synthesis":
+            context.report(progress=0.9, stage="final synthesis")
+    
+    return on_event
+
+def run_summarize_job(payload, filename, params, context):
+    """Job handler for document summarization"""
+    max_words = params.get("max_words", 400)
+    cache_key = document_cache_key("summarize", content_hash(payload), **chunk_size_params(max_words))
+    cached = get_cached_result(cache_key)
+    if cached is not None:
+        return cached
+    
+    def run_pipeline():
+        result = summarize_document(
+            payload,
+            max_words=max_words,
+            on_event=job_progress_reporter(context),
+            max_in_flight=get_config().get("JOB_MAX_IN_FLIGHT", 4)
+        )
+        if is_successful_summary(result):
+            cache_result(cache_key, result)
+        return result
+    
+    # Shares the run of an identical request or job that is already in progress,
+    # while still noticing a cancellation of this job
+    return compute_once(cache_key, run_pipeline, on_wait=context.check_cancelled)[0]
+
+def run_generate_questions_job(payload, filename, params, context):
+    """Job handler for question generation"""
+    max_words = params.get("max_words", 400)
+    max_questions = params.get("max_questions", 5)
+    cache_key = document_cache_key(
+        "generate-questions", content_hash(payload), max_words=max_words, max_questions=max_questions
+    )
+    cached = get_cached_result(cache_key)
+    if cached is not None:
+        return cached
+    
+    def run_pipeline():
+        result = generate_questions_for_document(
+            payload,
+            max_words=max_words,
+            max_questions=max_questions,
+            on_event=job_progress_reporter(context)
+        )
+        if result["questions"]:
+            cache_result(cache_key, result)
+        return result
+    
+    # Shares the run of an identical request or job that is already in progress,
+    # while still noticing a cancellation of this job
+    return compute_once(cache_key, run_pipeline, on_wait=context.check_cancelled)[0]
+
+def run_analyze_job(payload, filename, params, context):
+    """Job handler for the combined summary and question analysis"""
+    outputs = tuple(params.get("outputs") or ANALYZE_OUTPUTS)
+    max_words = params.get("max_words", 400)
+    max_questions = params.get("max_questions", 5)
+    cache_key = document_cache_key(
+        "analyze", content_hash(payload), outputs=outputs, max_questions=max_questions,
+        **chunk_size_params(max_words)
+    )
+    cached = get_cached_result(cache_key)
+    if cached is not None:
+        return cached
+    
+    def run_pipeline():
+        result = analyze_document(
+            payload,
+            outputs=outputs,
+            max_words=max_words,
+            max_questions=max_questions,
+            on_event=job_progress_reporter(context),
+            max_in_flight=get_config().get("JOB_MAX_IN_FLIGHT", 4)
+        )
+        if is_complete_analysis(result, outputs):
+            cache_result(cache_key, result)
+        return result
+    
+    # Shares the run of an identical request or job that is already in progress,
+    # while still noticing a cancellation of this job
+    return compute_once(cache_key, run_pipeline, on_wait=context.check_cancelled)[0]
+
+def run_academic_assistant_job(payload, filename, params, context):
+    """Job handler for the academic assistant"""
+    return answer_question_paper(payload, filename, on_event=job_progress_reporter(context))
+
+def run_as_job_client(handler):
+    """
+    Wrap a job handler so its model calls are admitted on behalf of the submitting
+    client, at the priority configured for jobs
+    
+    Args:
+        handler (callable): Job handler
+        
+    Returns:
+        callable: Wrapped job handler
+    """
+    @wraps(handler)
+    def wrapper(payload, filename, params, context):
+        priority = parse_priorities(get_config().get("ADMISSION_PRIORITIES")).get("jobs")
+        with admission_identity(params.get("client"), priority):
+            return handler(payload, filename, params, context)
+    return wrapper
+
+def register_job_handlers(manager):
+    """
+    Register the document pipelines with the background job manager
+    
+    Args:
+        manager (JobManager): Job manager to register with
+    """
+    manager.register("summarize", run_as_job_client(run_summarize_job))
+    manager.register("generate-questions", run_as_job_client(run_generate_questions_job))
+    manager.register("analyze", run_as_job_client(run_analyze_job))
+    manager.register("academic-assistant", run_as_job_client(run_academic_assistant_job))
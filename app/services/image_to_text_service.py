@@ -1,45 +1,198 @@
-import os
-import boto3
-from app.services.pdf_service import save_temp_file
+import io
+import math
+from collections import deque
+import fitz  # PyMuPDF
+from PIL import Image, ImageOps
+from app.extensions import get_config, get_ocr_backend, get_ocr_executor
+from app.services.ocr_cache import get_cached_lines, cache_lines
+from app.services.pdf_service import open_pdf
+from app.utils.ocr import TextractOCRBackend
 
-def extract_text_from_image(image_path):
+def ocr_image(image_bytes):
     """
-    Extract text from an image file using AWS Textract
+    Run the configured OCR backend over an encoded image
+    
+    Results are cached by the hash of the image, so a re-uploaded photo or
+    an identical rendered page is recognized only once.
     
     Args:
-        image_path (str): Path to the image file
+        image_bytes (bytes): Encoded image
         
     Returns:
-        str: Extracted text
+        list: Lines of text
     """
-    # Create a Textract client
-    textract = boto3.client('textract')
+    backend = get_ocr_backend() or TextractOCRBackend()
     
-    # Read the image file as bytes
-    with open(image_path, 'rb') as image_file:
-        image_bytes = image_file.read()
+    cached = get_cached_lines(backend.name, image_bytes)
+    if cached is not None:
+        return cached
     
-    response = textract.detect_document_text(Document={'Bytes': image_bytes})
+    lines = backend.detect_lines(image_bytes)
+    cache_lines(backend.name, image_bytes, lines)
+    return lines
+
+def normalize_image(image_bytes, max_pixels=4000000, jpeg_quality=85):
+    """
+    Shrink a photo for OCR: fix its EXIF orientation, convert it to grayscale
+    (transparent areas on white), downsample it to a pixel budget and re-encode
+    it as JPEG
     
-    lines = []
-    for item in response['Blocks']:
-        if item['BlockType'] == 'LINE':
-            lines.append(item['Text'])
+    Args:
+        image_bytes (bytes): Encoded image as uploaded
+        max_pixels (int): Pixel budget of the normalized image (about 4 MP is
+            an A4 page at 200 DPI)
+        jpeg_quality (int): JPEG quality of the re-encoded image
+        
+    Returns:
+        tuple: (image_bytes, stats) - the original bytes are kept when they
+            cannot be decoded or normalizing would not make them smaller
+    """
+    stats = {"original_bytes": len(image_bytes), "normalized_bytes": len(image_bytes), "bytes_saved": 0}
     
-    extracted_text = '\n'.join(lines)
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        stats["original_size"] = list(image.size)
+        rotated = image.getexif().get(0x0112, 1) != 1
+        
+        # JPEG can decode straight to grayscale at a reduced scale
+        scale = min(1.0, math.sqrt(max_pixels / (image.size[0] * image.size[1])))
+        image.draft("L", (int(image.size[0] * scale), int(image.size[1] * scale)))
+        
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info:
+            # Transparent areas read as paper, not as whatever color lies under the alpha
+            image = Image.alpha_composite(Image.new("RGBA", image.size, "white"), image.convert("RGBA"))
+        image = image.convert("L")
+        width, height = image.size
+        if width * height > max_pixels:
+            scale = math.sqrt(max_pixels / (width * height))
+            image = image.resize(
+                (max(1, int(width * scale)), max(1, int(height * scale))), Image.Resampling.LANCZOS
+            )
+        
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=jpeg_quality, optimize=True)
+        normalized = output.getvalue()
+    except Exception as e:
+        print(f"Could not normalize image for OCR: {str(e)}")
+        return image_bytes, stats
+    
+    # A small, already upright image may not get any smaller
+    if len(normalized) >= len(image_bytes) and not rotated:
+        return image_bytes, stats
+    
+    stats.update(
+        normalized_bytes=len(normalized),
+        bytes_saved=len(image_bytes) - len(normalized),
+        normalized_size=list(image.size)
+    )
+    return normalized, stats
+
+def extract_text_from_image(image_source):
+    """
+    Extract text from an image file using the OCR backend (AWS Textract by default)
+    
+    Photos are normalized first (see normalize_image) unless OCR_IMAGE_NORMALIZE
+    is off.
+    
+    Args:
+        image_source (bytes or str): Raw image content, or the path to the image file
+        
+    Returns:
+        str: Extracted text
+    """
+    if isinstance(image_source, (bytes, bytearray)):
+        image_bytes = bytes(image_source)
+    else:
+        # Read the image file as bytes
+        with open(image_source, 'rb') as image_file:
+            image_bytes = image_file.read()
+    
+    config = get_config()
+    if config.get("OCR_IMAGE_NORMALIZE", True):
+        image_bytes, stats = normalize_image(
+            image_bytes,
+            max_pixels=config.get("OCR_IMAGE_MAX_PIXELS", 4000000),
+            jpeg_quality=config.get("OCR_IMAGE_JPEG_QUALITY", 85)
+        )
+        if stats["bytes_saved"]:
+            print(f"Normalized image for OCR: {stats['original_bytes']} -> {stats['normalized_bytes']} bytes")
+    
+    extracted_text = '\n'.join(ocr_image(image_bytes))
     return extracted_text
 
-def determine_file_type(file_obj):
+def extract_text_from_pdf_hybrid(source):
+    """
+    Extract text from a PDF, using OCR only for pages without a usable text layer
+    
+    Each page's text layer is read with PyMuPDF. Pages with fewer than
+    OCR_MIN_PAGE_CHARS characters (scans, photos) are rendered to grayscale
+    PNGs and recognized concurrently on the OCR worker pool, so digital PDFs
+    never reach OCR at all. Pages are rendered as the pool frees up, so at most
+    two rendered pages per OCR worker are held in memory at a time.
+    
+    Args:
+        source (bytes or str): Raw PDF content, or the path to a PDF file
+        
+    Returns:
+        str: Extracted text, page by page
+    """
+    config = get_config()
+    min_chars = config.get("OCR_MIN_PAGE_CHARS", 32)
+    dpi = config.get("OCR_RENDER_DPI", 200)
+    executor = get_ocr_executor()
+    window = 2 * config.get("OCR_MAX_WORKERS", 4) if executor is not None else 1
+    
+    page_texts = []
+    pending = deque()
+    scanned = 0
+    
+    def collect():
+        index, future = pending.popleft()
+        page_texts[index] = '\n'.join(future.result())
+    
+    doc = open_pdf(source)
+    try:
+        for index, page in enumerate(doc):
+            text = page.get_text()
+            page_texts.append(text)
+            if len(text.strip()) >= min_chars:
+                continue
+            
+            # Rendering touches the document, so it stays on this thread
+            image_bytes = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY).tobytes("png")
+            scanned += 1
+            if executor is None:
+                page_texts[index] = '\n'.join(ocr_image(image_bytes))
+                continue
+            
+            pending.append((index, executor.submit(ocr_image, image_bytes)))
+            if len(pending) >= window:
+                collect()
+        while pending:
+            collect()
+    finally:
+        doc.close()
+        # Pages still queued when something failed are not recognized
+        for _, future in pending:
+            future.cancel()
+    
+    if scanned:
+        print(f"Ran OCR on {scanned} of {len(page_texts)} PDF pages")
+    
+    return '\n'.join(text.strip() for text in page_texts if text.strip())
+
+def determine_file_type(filename):
     """
     Determine the type of the uploaded file
     
     Args:
-        file_obj: File object from the request
+        filename (str): Name of the uploaded file
         
     Returns:
         str: File type ('pdf', 'image', or 'unknown')
     """
-    filename = file_obj.filename.lower()
+    filename = filename.lower()
     
     if filename.endswith('.pdf'):
         return 'pdf'
@@ -48,28 +201,22 @@ def determine_file_type(file_obj):
     else:
         return 'unknown'
 
-def extract_text_from_file(file_obj):
+def extract_text_from_bytes(file_bytes, filename):
     """
-    Extract text from a file (PDF or image)
+    Extract text from uploaded file content (PDF or image) without touching disk
     
     Args:
-        file_obj: File object from the request
+        file_bytes (bytes): Raw uploaded content
+        filename (str): Original file name, used to detect the file type
         
     Returns:
         str: Extracted text
     """
-    file_type = determine_file_type(file_obj)
-    temp_path = f"temp{os.path.splitext(file_obj.filename)[1]}"
+    file_type = determine_file_type(filename)
     
-    try:
-        # Save uploaded file to temporary location
-        save_temp_file(file_obj, temp_path)
-        
-        if file_type == 'pdf' or file_type == 'image':
-            return extract_text_from_image(temp_path)
-        else:
-            raise ValueError(f"Unsupported file type: {file_obj.filename}")
-    finally:
-        # Clean up temporary file
-        if os.path.exists(temp_path):
-            os.remove(temp_path) 
\ No newline at end of file
+    if file_type == 'pdf':
+        return extract_text_from_pdf_hybrid(file_bytes)
+    elif file_type == 'image':
+        return extract_text_from_image(file_bytes)
+    else:
+        raise ValueError(f"Unsupported file type: {filename}")
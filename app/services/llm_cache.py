@@ -0,0 +1,45 @@
+from app.extensions import get_llm_cache
+from app.utils.cache import make_cache_key
+
+def llm_cache_key(model_id, request_body):
+    """
+    Build the cache key for a model invocation
+    
+    Args:
+        model_id (str): Bedrock model identifier
+        request_body (str): JSON request body holding the prompt and generation parameters
+        
+    Returns:
+        str: Content hash of the model id, prompt and generation parameters
+    """
+    return make_cache_key("bedrock", model_id, request_body)
+
+def get_cached_generation(model_id, request_body):
+    """
+    Look up a previously generated completion
+    
+    Args:
+        model_id (str): Bedrock model identifier
+        request_body (str): JSON request body sent to the model
+        
+    Returns:
+        str: Cached generation, or None if the cache is disabled or missed
+    """
+    cache = get_llm_cache()
+    if cache is None:
+        return None
+    return cache.get(llm_cache_key(model_id, request_body))
+
+def cache_generation(model_id, request_body, generation):
+    """
+    Store a usable completion so identical requests can skip the model call
+    
+    Args:
+        model_id (str): Bedrock model identifier
+        request_body (str): JSON request body sent to the model
+        generation (str): Generated text returned by the model
+    """
+    cache = get_llm_cache()
+    if cache is None or not generation:
+        return
+    cache.set(llm_cache_key(model_id, request_body), generation)
@@ -0,0 +1,46 @@
+import hashlib
+from app.extensions import get_ocr_cache
+from app.utils.cache import make_cache_key
+
+def ocr_cache_key(backend_name, image_bytes):
+    """
+    Build the cache key for an OCR result
+    
+    Args:
+        backend_name (str): Name of the OCR backend that produced the lines
+        image_bytes (bytes): Encoded image or rendered PDF page
+        
+    Returns:
+        str: Cache key derived from the backend and the image content hash
+    """
+    return make_cache_key("ocr", backend_name, hashlib.sha256(image_bytes).hexdigest())
+
+def get_cached_lines(backend_name, image_bytes):
+    """
+    Look up the lines previously recognized in an image
+    
+    Args:
+        backend_name (str): Name of the OCR backend
+        image_bytes (bytes): Encoded image
+        
+    Returns:
+        list: Cached lines, or None if the cache is disabled or missed
+    """
+    cache = get_ocr_cache()
+    if cache is None:
+        return None
+    return cache.get(ocr_cache_key(backend_name, image_bytes))
+
+def cache_lines(backend_name, image_bytes, lines):
+    """
+    Store the lines recognized in an image
+    
+    Args:
+        backend_name (str): Name of the OCR backend
+        image_bytes (bytes): Encoded image
+        lines (list): Lines of text returned by the backend
+    """
+    cache = get_ocr_cache()
+    if cache is None:
+        return
+    cache.set(ocr_cache_key(backend_name, image_bytes), lines)
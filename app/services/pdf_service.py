@@ -1,46 +1,288 @@
 import os
+import tempfile
+from collections import Counter
+from contextlib import contextmanager
 import fitz  # PyMuPDF
+from app.extensions import get_config, get_pdf_executor
 
-def extract_text_from_pdf(file_path):
+def open_pdf(source):
+    """
+    Open a PDF from memory or from disk
+    
+    Args:
+        source (bytes or str): Raw PDF content, or the path to a PDF file
+        
+    Returns:
+        fitz.Document: Opened document
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source)
+
+def pdf_page_count(source):
+    """
+    Count the pages of a PDF without extracting any text
+    
+    Args:
+        source (bytes or str): Raw PDF content, or the path to a PDF file
+        
+    Returns:
+        int: Number of pages, or None if the document cannot be opened
+    """
+    try:
+        doc = open_pdf(source)
+    except Exception:
+        return None
+    try:
+        return doc.page_count
+    finally:
+        doc.close()
+
+def extract_page_range(source, start, stop):
+    """
+    Extract the text of a contiguous range of pages
+    
+    Runs in worker processes, so it opens its own copy of the document;
+    callers pass a path (see shared_pdf_path) so the content is not pickled
+    into every task.
+    
+    Args:
+        source (bytes or str): Raw PDF content, or the path to a PDF file
+        start (int): Index of the first page
+        stop (int): Index one past the last page
+        
+    Returns:
+        list: Text of each page in the range
+    """
+    doc = open_pdf(source)
+    try:
+        return [doc[i].get_text() for i in range(start, stop)]
+    finally:
+        doc.close()
+
+def iter_pdf_pages(source):
+    """
+    Lazily yield the text of each page of a PDF
+    
+    Only one page of text is held at a time, so memory stays bounded
+    regardless of document length.
+    
+    Args:
+        source (bytes or str): Raw PDF content, or the path to a PDF file
+        
+    Yields:
+        str: Text of each page, in order
+    """
+    try:
+        doc = open_pdf(source)
+    except Exception as e:
+        raise Exception(f"Error extracting text from PDF: {str(e)}")
+    
+    try:
+        for page in doc:
+            yield page.get_text()
+    finally:
+        doc.close()
+
+@contextmanager
+def shared_pdf_path(source):
+    """
+    Give worker processes a path to the PDF instead of its bytes
+    
+    Arguments of pool tasks are pickled into every task, so in-memory content
+    is written once to a temporary file that each worker opens itself.
+    Spooled uploads are already on disk and used as they are.
+    
+    Args:
+        source (bytes or str): Raw PDF content, or the path to a PDF file
+        
+    Yields:
+        str: Path to the PDF, removed on exit if it was created here
+    """
+    if not isinstance(source, (bytes, bytearray, memoryview)):
+        yield source
+        return
+    
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(source)
+        yield path
+    finally:
+        remove_temp_file(path)
+
+def split_page_ranges(page_count, parts):
+    """
+    Split pages into contiguous, nearly equal ranges
+    
+    Args:
+        page_count (int): Number of pages
+        parts (int): Number of ranges to produce
+        
+    Returns:
+        list: (start, stop) tuples covering every page in order
+    """
+    parts = max(1, min(parts, page_count))
+    size, remainder = divmod(page_count, parts)
+    ranges = []
+    start = 0
+    for i in range(parts):
+        stop = start + size + (1 if i < remainder else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+def extract_text_from_pdf(source):
     """
     Extract text from a PDF file
     
+    Large documents are split into page ranges that are extracted in parallel
+    on the PDF worker process pool; the workers read in-memory content from a
+    temporary file rather than receiving it with every range.
+    
     Args:
-        file_path (str): Path to the PDF file
+        source (bytes or str): Raw PDF content, or the path to a PDF file
         
     Returns:
         dict: Dictionary with page numbers as keys and extracted text as values
         str: All text combined
     """
     try:
-        doc = fitz.open(file_path)
-        result = {}
-        all_text = ""
+        doc = open_pdf(source)
+        page_count = doc.page_count
         
-        for i, page in enumerate(doc):
-            text = page.get_text()
-            result[i+1] = text
-            all_text += text + "\n"
-            
-        doc.close()
+        executor = get_pdf_executor()
+        min_pages = get_config().get("PDF_PARALLEL_MIN_PAGES", 64)
+        
+        if executor is None or page_count < min_pages:
+            texts = [page.get_text() for page in doc]
+            doc.close()
+        else:
+            doc.close()
+            # A few ranges per worker keeps the pool busy when pages differ in cost
+            workers = get_config().get("PDF_EXTRACT_WORKERS") or os.cpu_count() or 1
+            ranges = split_page_ranges(page_count, workers * 2)
+            with shared_pdf_path(source) as path:
+                futures = [executor.submit(extract_page_range, path, start, stop) for start, stop in ranges]
+                texts = [text for future in futures for text in future.result()]
+        
+        result = {i + 1: text for i, text in enumerate(texts)}
+        # Join once instead of growing a string page by page
+        all_text = "".join(text + "\n" for text in texts)
         return result, all_text
         
     except Exception as e:
         raise Exception(f"Error extracting text from PDF: {str(e)}")
 
-def save_temp_file(file_obj, temp_path="temp.pdf"):
+def normalize_heading(text):
+    """Normalize heading text for matching TOC titles against page lines"""
+    return " ".join(text.split()).lower()
+
+def collect_heading_candidates(source, start, stop, max_words=12):
     """
-    Save uploaded file to a temporary location
+    Collect the font statistics and short lines of a range of pages
+    
+    Runs in worker processes, so it opens its own copy of the document.
     
     Args:
-        file_obj: File object from request
-        temp_path (str): Path where to save the temporary file
+        source (bytes or str): Raw PDF content, or the path to a PDF file
+        start (int): Index of the first page
+        stop (int): Index one past the last page
+        max_words (int): Longer lines cannot be headings
         
     Returns:
-        str: Path to the saved temporary file
+        Counter: Characters set in each font size (rounded to half points)
+        list: (page_index, size, bold, text) of every line short enough to be a heading
+    """
+    # Text only; images are not needed to find headings
+    flags = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+    sizes = Counter()
+    candidates = []
+    doc = open_pdf(source)
+    try:
+        for index in range(start, stop):
+            for block in doc[index].get_text("dict", flags=flags)["blocks"]:
+                for line in block.get("lines", []):
+                    spans = [span for span in line["spans"] if span["text"].strip()]
+                    if not spans:
+                        continue
+                    for span in spans:
+                        sizes[round(span["size"] * 2) / 2] += len(span["text"].strip())
+                    text = "".join(span["text"] for span in line["spans"]).strip()
+                    if len(text.split()) <= max_words and any(c.isalpha() for c in text):
+                        size = max(round(span["size"] * 2) / 2 for span in spans)
+                        bold = all(span["flags"] & fitz.TEXT_FONT_BOLD for span in spans)
+                        candidates.append((index, size, bold, text))
+    finally:
+        doc.close()
+    return sizes, candidates
+
+def find_pdf_headings(source, max_depth=3, min_size_ratio=1.15, max_words=12):
     """
-    file_obj.save(temp_path)
-    return temp_path
+    Find the section headings of a PDF
+    
+    The document outline (get_toc) is used when the PDF has one. Otherwise
+    headings are inferred from fonts: the size covering the most characters
+    is the body size, lines set at least min_size_ratio larger are headings,
+    one level per distinct size from the largest down, and short lines set
+    entirely in bold at body size form the level below those.
+    
+    Args:
+        source (bytes or str): Raw PDF content, or the path to a PDF file
+        max_depth (int): Deepest heading level kept
+        min_size_ratio (float): Minimum heading size relative to the body size
+        max_words (int): Longer lines are never taken for headings
+        
+    Returns:
+        list: (page_index, level, title) of each heading in document order
+        str: "toc", "fonts", or None if no headings were found
+    """
+    doc = open_pdf(source)
+    try:
+        page_count = doc.page_count
+        toc = [
+            (page - 1, level, title)
+            for level, title, page in doc.get_toc(simple=True)
+            if level <= max_depth and 1 <= page <= page_count and title.strip()
+        ]
+    finally:
+        doc.close()
+    if toc:
+        return toc, "toc"
+    
+    executor = get_pdf_executor()
+    if executor is None or page_count < get_config().get("PDF_PARALLEL_MIN_PAGES", 64):
+        sizes, candidates = collect_heading_candidates(source, 0, page_count, max_words)
+    else:
+        workers = get_config().get("PDF_EXTRACT_WORKERS") or os.cpu_count() or 1
+        sizes, candidates = Counter(), []
+        with shared_pdf_path(source) as path:
+            futures = [
+                executor.submit(collect_heading_candidates, path, start, stop, max_words)
+                for start, stop in split_page_ranges(page_count, workers * 2)
+            ]
+            for future in futures:
+                range_sizes, range_candidates = future.result()
+                sizes.update(range_sizes)
+                candidates.extend(range_candidates)
+    if not sizes:
+        return [], None
+    
+    body_size = sizes.most_common(1)[0][0]
+    heading_sizes = sorted(
+        {size for _, size, _, _ in candidates if size >= body_size * min_size_ratio}, reverse=True
+    )
+    # Sizes beyond max_depth share the deepest level
+    levels = {size: min(rank, max_depth) for rank, size in enumerate(heading_sizes, start=1)}
+    bold_level = len(heading_sizes) + 1
+    
+    headings = []
+    for index, size, bold, text in candidates:
+        if size in levels:
+            headings.append((index, levels[size], text))
+        elif bold and size >= body_size and bold_level <= max_depth:
+            headings.append((index, bold_level, text))
+    return headings, ("fonts" if headings else None)
 
 def remove_temp_file(temp_path):
     """
@@ -50,4 +292,4 @@ def remove_temp_file(temp_path):
         temp_path (str): Path to the temporary file
     """
     if os.path.exists(temp_path):
-        os.remove(temp_path) 
\ No newline at end of file
+        os.remove(temp_path)
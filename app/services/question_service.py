@@ -1,10 +1,38 @@
-import json
-from app.extensions import get_nlp, get_bedrock_client
-from app.services.summarization_service import format_llama3_prompt, smart_chunk_text
+from app.services.bedrock_service import format_llama3_prompt, invoke_llama, stage_params
+from app.services.token_budget import prompt_budget
+from app.services.summarization_service import smart_chunk_text
+from app.services.dedup_service import drop_duplicate_chunks
+from app.utils.json_utils import extract_json
 
-def generate_questions_chunk(text, context=None, max_questions=5):
+QUESTION_KEYS = ["question", "answer", "key_points", "tips"]
+
+def parse_questions(questions):
     """
-    Generate exam questions for a chunk of text
+    Parse a model generation into a list of question objects
+    
+    Args:
+        questions (str): Raw generation text
+        
+    Returns:
+        list: Parsed question objects, or None if no array of them could be
+            recovered (prose such as "see section [1]" is not one)
+    """
+    parsed = extract_json(questions, expect=list, keys=QUESTION_KEYS)
+    if parsed is None:
+        # Some generations wrap the array in an object, e.g. {"questions": [...]}
+        wrapper = extract_json(questions, expect=dict)
+        if wrapper is not None:
+            parsed = next((
+                value for value in wrapper.values()
+                if isinstance(value, list) and any(isinstance(item, dict) for item in value)
+            ), None)
+    if parsed is None:
+        return None
+    return [item for item in parsed if isinstance(item, dict)] or None
+
+def build_questions_prompt(text, context=None, max_questions=5):
+    """
+    Build the Llama 3 prompt for a question generation call
     
     Args:
         text (str): Text chunk to generate questions from
@@ -12,10 +40,8 @@ def generate_questions_chunk(text, context=None, max_questions=5):
         max_questions (int): Maximum number of questions to generate
         
     Returns:
-        list: List of question objects with question, answer, key_points, and tips
+        str: Formatted prompt
     """
-    bedrock_runtime = get_bedrock_client()
-    
     user_prompt = (
         "You are an expert exam question generator for academic documents. Based on the following content, generate a diverse list of possible exam questions. For each question, provide:\n"
         "- The question (clear and concise)\n"
@@ -31,74 +57,110 @@ def generate_questions_chunk(text, context=None, max_questions=5):
         "```"
     )
     
-    prompt = format_llama3_prompt(user_prompt)
+    return format_llama3_prompt(user_prompt)
+
+def question_chunk_budget(max_questions=5):
+    """
+    Token budget of a chunk shared with question generation
     
-    try:
-        request_body = json.dumps({
-            "prompt": prompt,
-            "max_gen_len": 2048,
-            "temperature": 0.4,
-            "top_p": 0.9
-        })
+    Args:
+        max_questions (int): Maximum number of questions per chunk
         
-        for _ in range(3):  # Retry up to 3 times
-            response = bedrock_runtime.invoke_model(
-                modelId="meta.llama3-70b-instruct-v1:0",
-                contentType="application/json",
-                accept="application/json",
-                body=request_body
-            )
-            
-            response_body = json.loads(response['body'].read().decode('utf-8'))
-            questions = response_body.get('generation', '').strip()
-            
-            if questions:
-                try:
-                    parsed = json.loads(questions)
-                    if isinstance(parsed, list):
-                        return parsed
-                except Exception:
-                    continue
-                    
-        return []
+    Returns:
+        int: Tokens left for the chunk after the prompt template, a global
+            context summary (up to the context stage's max_gen_len tokens) and
+            the questions stage's generation
+    """
+    return prompt_budget(
+        build_questions_prompt("", context=" ", max_questions=max_questions),
+        stage_params("questions")["max_gen_len"],
+        reserve=stage_params("context")["max_gen_len"]
+    )
+
+def generate_questions_chunk(text, context=None, max_questions=5):
+    """
+    Generate exam questions for a chunk of text
+    
+    Args:
+        text (str): Text chunk to generate questions from
+        context (str, optional): Document context for improved question generation
+        max_questions (int): Maximum number of questions to generate
+        
+    Returns:
+        list: List of question objects with question, answer, key_points, and tips
+    """
+    prompt = build_questions_prompt(text, context=context, max_questions=max_questions)
+    
+    try:
+        # Generations that are not a JSON array are retried
+        questions = invoke_llama(
+            prompt,
+            top_p=0.9,
+            is_valid=lambda generation: parse_questions(generation) is not None,
+            stage="questions",
+            **stage_params("questions")
+        )
+        return parse_questions(questions)
     except Exception as e:
         print(f"Error in question generation: {str(e)}")
         return []
 
-def recursive_generate_questions(text, max_words=400, max_questions=5):
+def recursive_generate_questions(text, max_words=400, max_questions=5, on_event=None):
     """
     Recursively generate questions from a document by chunking and processing
     
     Args:
-        text (str): Full document text
+        text (str or iterable): Full document text, or an iterable of page texts
         max_words (int): Maximum words per chunk
         max_questions (int): Maximum questions per chunk
+        on_event (callable, optional): Progress callback, called as on_event(event_name, data)
         
     Returns:
         list: List of unique questions with answers, key points, and tips
     """
-    # 1. Chunk the document at semantic boundaries
+    # 1. Chunk the document at semantic boundaries, skipping repeated chunks
     chunks = smart_chunk_text(text, max_words=max_words)
+    chunks, dedup_stats = drop_duplicate_chunks(chunks)
+    if on_event is not None:
+        on_event("chunks", {"level": 0, "count": len(chunks)})
+        on_event("deduplicated", dedup_stats)
     
     # 2. Generate a short global context for coherence
     global_context = ""
-    if len(text.split()) > max_words:
+    if len(chunks) > 1:
         # Use first chunk as context if document is long
         global_context = " ".join(chunks[:2])
     
     # 3. Generate questions for each chunk
     all_questions = []
-    for chunk in chunks:
+    for index, chunk in enumerate(chunks):
         questions = generate_questions_chunk(chunk, context=global_context, max_questions=max_questions)
         all_questions.extend(questions)
+        if on_event is not None:
+            on_event("chunk_questions", {"index": index, "count": len(questions)})
     
     # 4. Deduplicate by question text
+    return unique_questions(all_questions)
+
+def unique_questions(questions):
+    """
+    Drop questions whose text repeats an earlier one
+    
+    Args:
+        questions (list): Question objects in document order
+        
+    Returns:
+        list: Questions with unique (case-insensitive) question text; items
+            that are not objects are dropped
+    """
     seen = set()
-    unique_questions = []
-    for q in all_questions:
-        q_text = q.get("question", "").strip().lower()
+    unique = []
+    for q in questions:
+        if not isinstance(q, dict):
+            continue
+        q_text = str(q.get("question") or "").strip().lower()
         if q_text and q_text not in seen:
             seen.add(q_text)
-            unique_questions.append(q)
+            unique.append(q)
             
-    return unique_questions 
\ No newline at end of file
+    return unique 
\ No newline at end of file
@@ -0,0 +1,124 @@
+import hashlib
+from app.extensions import get_result_cache, get_request_coalescer
+from app.services.bedrock_service import stage_routing
+from app.services.token_budget import uses_token_budget
+from app.utils.cache import make_cache_key
+from app.utils.jobs import JobCancelled
+
+def content_hash(file_bytes):
+    """
+    Hash uploaded file content
+    
+    Args:
+        file_bytes (bytes): Raw uploaded file content
+        
+    Returns:
+        str: SHA-256 hex digest
+    """
+    return hashlib.sha256(file_bytes).hexdigest()
+
+def document_cache_key(endpoint, file_hash, **params):
+    """
+    Build the result cache key for a processed document
+    
+    The model routing of the pipeline stages is part of the key, so results
+    are recomputed after a stage is moved to another model.
+    
+    Args:
+        endpoint (str): Name of the pipeline that produced the result
+        file_hash (str): SHA-256 hex digest of the uploaded file
+        **params: Request parameters that influence the result
+        
+    Returns:
+        str: Cache key derived from the file hash and the parameters
+    """
+    return make_cache_key("document", endpoint, file_hash, params, stage_routing())
+
+def chunk_size_params(max_words):
+    """
+    Cache key parameters for the chunk size of the summary pipelines
+    
+    max_words only sizes summary chunks under CHUNK_SIZING=words, so it is left
+    out of the key when chunks are sized by tokens and repeat uploads that only
+    differ in max_words share one result. Question generation always chunks by
+    words and keys on max_words directly.
+    
+    Args:
+        max_words (int): Maximum words per chunk requested by the client
+        
+    Returns:
+        dict: Parameters to pass on to document_cache_key
+    """
+    if uses_token_budget():
+        return {}
+    return {"max_words": max_words}
+
+def cache_policy(headers):
+    """
+    Read the client's caching preference from the request headers
+    
+    `Cache-Control: no-cache` skips the lookup but still stores the fresh
+    result; `Cache-Control: no-store` bypasses the cache entirely.
+    
+    Args:
+        headers: Request headers
+        
+    Returns:
+        tuple: (read_from_cache, write_to_cache)
+    """
+    directives = [d.strip().lower() for d in headers.get("Cache-Control", "").split(",")]
+    if "no-store" in directives:
+        return False, False
+    if "no-cache" in directives:
+        return False, True
+    return True, True
+
+def get_cached_result(cache_key):
+    """
+    Look up a previously computed response payload
+    
+    Args:
+        cache_key (str): Key from document_cache_key
+        
+    Returns:
+        dict: Cached payload, or None if the cache is disabled or missed
+    """
+    cache = get_result_cache()
+    if cache is None:
+        return None
+    return cache.get(cache_key)
+
+def compute_once(cache_key, compute, on_wait=None):
+    """
+    Run a document pipeline once for all concurrent requests with the same key
+    
+    Requests for the same document and parameters that arrive while the
+    pipeline runs wait for it and share its result (or its error). If the run
+    was a job that got cancelled, a waiting request starts the pipeline itself.
+    
+    Args:
+        cache_key (str): Key from document_cache_key
+        compute (callable): Runs the pipeline and returns the response payload
+        on_wait (callable, optional): Polled while waiting for another run, e.g.
+            to notice that the waiting job was cancelled (see SingleFlight.do)
+        
+    Returns:
+        tuple: (payload, shared) where shared is True if another request computed it
+    """
+    coalescer = get_request_coalescer()
+    if coalescer is None:
+        return compute(), False
+    return coalescer.do(cache_key, compute, retry_on=(JobCancelled,), on_wait=on_wait)
+
+def cache_result(cache_key, payload):
+    """
+    Store a response payload for later identical uploads
+    
+    Args:
+        cache_key (str): Key from document_cache_key
+        payload (dict): JSON-serializable response payload
+    """
+    cache = get_result_cache()
+    if cache is None:
+        return
+    cache.set(cache_key, payload)
@@ -0,0 +1,149 @@
+import contextvars
+import json
+import queue
+import threading
+from app.extensions import get_stream_executor
+from app.services.document_service import summarize_document, is_successful_summary
+from app.services.result_cache import get_cached_result, cache_result
+from app.utils.jobs import JobCancelled
+
+# Seconds of silence after which a comment line is sent to keep proxies from timing out
+HEARTBEAT_SECONDS = 15
+
+_DONE = object()
+
+class StreamClosed(JobCancelled):
+    """Raised inside the pipeline of a stream whose client has gone away"""
+
+def format_sse(event, data):
+    """
+    Format one server-sent event
+    
+    Args:
+        event (str): Event name
+        data: JSON-serializable event payload
+        
+    Returns:
+        str: Event in text/event-stream wire format
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_summarization(upload, max_words=400, cache_key=None, read_cache=True, write_cache=True,
+                         shape=None):
+    """
+    Summarize a PDF while streaming progress and partial results as server-sent events
+    
+    The pipeline runs on a background thread and reports pages extracted, each
+    chunk summary as it finishes, reduce levels, the tokens of the final
+    synthesis and finally the full result payload. The pipeline is queued on the
+    stream worker pool before this returns and owns the upload from then on, so
+    the upload is cleaned up even when the client disconnects before the
+    stream is first read. Once the client disconnects, the pipeline stops at
+    its next progress event and its queued model calls are dropped.
+    
+    Args:
+        upload (Upload): The uploaded PDF; it is cleaned up once the pipeline ends
+        max_words (int): Maximum words per chunk
+        cache_key (str, optional): Result cache key for this document
+        read_cache (bool): Whether a cached result may be replayed
+        write_cache (bool): Whether a fresh result may be stored
+        shape (callable, optional): Applied to the result payload before it is sent,
+            e.g. to select fields; the cached payload is left whole
+        
+    Returns:
+        iterator: Server-sent events; closing it stops the pipeline
+    """
+    if cache_key and read_cache:
+        cached = get_cached_result(cache_key)
+        if cached is not None:
+            upload.cleanup()
+            return iter([format_sse("result", shape(cached) if shape else cached)])
+    
+    events = queue.Queue()
+    closed = threading.Event()
+    
+    def on_event(event, data):
+        if closed.is_set():
+            raise StreamClosed("client disconnected")
+        events.put((event, data))
+    
+    def run():
+        try:
+            if closed.is_set():
+                raise StreamClosed("client disconnected")
+            payload = summarize_document(
+                upload.source, max_words=max_words, on_event=on_event, stream_final=True
+            )
+            if cache_key and write_cache and is_successful_summary(payload):
+                cache_result(cache_key, payload)
+            events.put(("result", shape(payload) if shape else payload))
+        except StreamClosed:
+            print("Summarization stream closed by the client; pipeline stopped")
+        except Exception as e:
+            print(f"Error in streaming summarization: {str(e)}")
+            events.put(("error", {"error": str(e)}))
+        finally:
+            upload.cleanup()
+            events.put(_DONE)
+    
+    # The pipeline keeps the request's client identity for admission control
+    task = contextvars.copy_context().run
+    executor = get_stream_executor()
+    if executor is not None:
+        executor.submit(task, run)
+    else:
+        threading.Thread(target=task, args=(run,), name="summarize-stream", daemon=True).start()
+    
+    return EventStream(relay_events(events, upload.size, closed), closed)
+
+class EventStream:
+    """
+    Server-sent events of a running pipeline
+    
+    The WSGI server closes the response iterator when the stream ends or the
+    client disconnects; closing this one tells the pipeline to stop, even if
+    the stream was never read.
+    """
+    
+    def __init__(self, events, closed):
+        self._events = events
+        self._closed = closed
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        return next(self._events)
+    
+    def close(self):
+        self._closed.set()
+        self._events.close()
+
+def relay_events(events, size, closed):
+    """
+    Relay pipeline events from a queue as server-sent events
+    
+    Args:
+        events (queue.Queue): (event, data) pairs, ended by the done marker
+        size (int): Upload size reported in the first event
+        closed (threading.Event): Set when the stream ends or is closed
+        
+    Yields:
+        str: Server-sent events
+    """
+    try:
+        # Send the first byte right away
+        yield format_sse("started", {"bytes": size})
+        
+        while True:
+            try:
+                item = events.get(timeout=HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            
+            if item is _DONE:
+                return
+            yield format_sse(*item)
+    finally:
+        closed.set()
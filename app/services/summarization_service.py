@@ -1,5 +1,15 @@
 import json
-from app.extensions import get_nlp, get_bedrock_client
+import math
+import zlib
+from collections import deque
+from app.extensions import get_config, get_sentence_nlp
+from app.services.dedup_service import drop_duplicate_chunks
+from app.services.pdf_service import normalize_heading
+from app.services.summary_memo import memoized, summary_node_key, text_fingerprint
+from app.services.bedrock_service import format_llama3_prompt, invoke_llama, stage_params, stream_llama, EmptyGenerationError
+from app.services.token_budget import count_tokens, prompt_budget, uses_token_budget
+from app.utils.concurrency import map_concurrently, submit_llm_task
+from app.utils.json_utils import extract_json_from_text
 
 SUMMARY_KEYS = [
     "title",
@@ -12,95 +22,298 @@ SUMMARY_KEYS = [
     "conclusion"
 ]
 
-def format_llama3_prompt(user_prompt):
+# Content-defined chunking: past CDC_MIN_FILL of the limit, a chunk ends after
+# any sentence whose hash is divisible by CDC_CUT_MODULUS
+CDC_MIN_FILL = 0.85
+CDC_CUT_MODULUS = 4
+
+# Section-aware chunking only cuts where the chunk is at least this full,
+# preferring higher-level headings among those cut points
+SECTION_MIN_FILL = 0.75
+
+# A chunk that cannot be cut that full is still emitted when it holds at least
+# this share of the limit; smaller ones, and headings left at its end, are
+# carried into the next piece instead
+SECTION_CARRY_FILL = 0.25
+
+# Upper bound on the characters handed to spaCy at once; well below its
+# default max_length of 1,000,000
+MAX_SEGMENT_CHARS = 100000
+
+def iter_text_segments(texts, max_chars=MAX_SEGMENT_CHARS):
     """
-    Format prompt for Llama 3 model on AWS Bedrock
+    Split texts into segments small enough for spaCy, preferring paragraph,
+    then line, then word boundaries
     
     Args:
-        user_prompt (str): The user prompt content
+        texts (str or iterable): Text, or an iterable of texts consumed lazily
+        max_chars (int): Maximum characters per segment
+        
+    Yields:
+        str: Text segments
+    """
+    if isinstance(texts, str):
+        texts = [texts]
+    
+    for text in texts:
+        while len(text) > max_chars:
+            cut = -1
+            for separator in ("\n\n", "\n", " "):
+                cut = text.rfind(separator, 0, max_chars)
+                if cut > 0:
+                    break
+            if cut <= 0:
+                cut = max_chars
+            yield text[:cut]
+            text = text[cut:]
+        if text:
+            yield text
+
+def chunk_measure(max_words, max_tokens=None):
+    """
+    Pick the length function and limit used to pack chunks
+    
+    Args:
+        max_words (int): Maximum words per chunk
+        max_tokens (int, optional): Maximum tokens per chunk; takes precedence
         
     Returns:
-        str: Formatted prompt for Llama 3
+        tuple: (measure, limit) where measure(text) returns the length of text
     """
-    return (
-        "<|begin_of_text|><|start_header_id|>user<|end_header_id|>\n\n"
-        + user_prompt +
-        "\n<|start_header_id|>assistant<|end_header_id|>\n\n"
-    )
+    if max_tokens:
+        return count_tokens, max_tokens
+    return (lambda text: len(text.split())), max_words
+
+def is_content_defined_cut(sentence):
+    """Whether a sentence may end a chunk early under content-defined chunking"""
+    return zlib.crc32(sentence.strip().encode("utf-8")) % CDC_CUT_MODULUS == 0
 
-def smart_chunk_text(text, max_words=400):
+def smart_chunk_text(text, max_words=400, nlp=None, max_tokens=None, content_defined=False):
     """
-    Split text into semantic chunks using spaCy
+    Split text into semantic chunks at sentence boundaries using spaCy
     
     Args:
-        text (str): Text to be chunked
+        text (str or iterable): Text to be chunked, or an iterable of page texts
+            (e.g. from iter_pdf_pages) that is consumed lazily
         max_words (int): Maximum words per chunk
+        nlp (spacy.language.Language, optional): Pipeline used for sentence
+            segmentation; defaults to the configured sentence segmenter
+        max_tokens (int, optional): Size chunks by Llama 3 tokens instead of words
+        content_defined (bool): Once a chunk is CDC_MIN_FILL full, end it after
+            any sentence whose hash marks a cut point, so an edit only moves
+            the boundaries near it and later chunks stay identical
         
     Returns:
         list: List of text chunks
     """
-    nlp = get_nlp()
-    doc = nlp(text)
+    if nlp is None:
+        nlp = get_sentence_nlp()
+    measure, limit = chunk_measure(max_words, max_tokens)
     chunks = []
     current_chunk = []
     current_len = 0
     
-    for sent in doc.sents:
-        sent_words = len(sent.text.split())
-        if current_len + sent_words > max_words and current_chunk:
-            chunks.append(" ".join(current_chunk))
-            current_chunk = []
-            current_len = 0
-        current_chunk.append(sent.text)
-        current_len += sent_words
+    # Long inputs are streamed in bounded segments, and a small batch size
+    # keeps only a few of them in flight
+    for doc in nlp.pipe(iter_text_segments(text), batch_size=8):
+        for sent in doc.sents:
+            sent_len = measure(sent.text)
+            if current_len + sent_len > limit and current_chunk:
+                chunks.append(" ".join(current_chunk))
+                current_chunk = []
+                current_len = 0
+            current_chunk.append(sent.text)
+            current_len += sent_len
+            if content_defined and current_len >= limit * CDC_MIN_FILL and is_content_defined_cut(sent.text):
+                chunks.append(" ".join(current_chunk))
+                current_chunk = []
+                current_len = 0
         
     if current_chunk:
         chunks.append(" ".join(current_chunk))
         
     return chunks
 
-def extract_json_from_text(text):
+def heading_matches(line, title):
+    """Whether a page line is the (first line of the) given heading"""
+    line = normalize_heading(line)
+    title = normalize_heading(title)
+    # Long titles may wrap onto several lines
+    return bool(line) and (line == title or (len(line) >= 8 and title.startswith(line)))
+
+def split_sections(pages, headings):
     """
-    Extract a JSON object from text that may contain markdown code blocks or other text
+    Split page texts into sections at their headings
+    
+    Each heading is looked up among the lines of its page; headings that
+    cannot be found there are ignored. Text before the first heading forms a
+    section of its own.
     
     Args:
-        text (str): Text potentially containing JSON
+        pages (list): Page texts, e.g. with boilerplate removed
+        headings (list): (page_index, level, title) tuples from find_pdf_headings
         
     Returns:
-        dict: Extracted JSON object or error
+        list: Sections as dicts with "level", "title" and "text", in document order
     """
-    # Check if the text contains a code block with JSON
-    if "```" in text:
-        # Extract content between code blocks
-        parts = text.split("```")
-        for i in range(1, len(parts), 2):
-            try:
-                # Try to parse as JSON, removing language identifier if present
-                content = parts[i].strip()
-                if content.startswith("json"):
-                    content = content[4:].strip()
-                return json.loads(content)
-            except json.JSONDecodeError:
-                continue
+    by_page = {}
+    for page_index, level, title in headings:
+        by_page.setdefault(page_index, []).append((level, title))
     
-    # If no valid JSON in code blocks, try parsing the whole text
-    try:
-        return json.loads(text)
-    except json.JSONDecodeError:
-        # As a last resort, try to find anything that looks like a JSON object
-        try:
-            start = text.find('{')
-            end = text.rfind('}') + 1
-            if start != -1 and end > start:
-                return json.loads(text[start:end])
-        except:
-            pass
+    # The preamble never contains other sections
+    sections = []
+    current = {"level": math.inf, "title": None, "lines": []}
+    for page_index, page in enumerate(pages):
+        pending = by_page.get(page_index, [])
+        next_heading = 0
+        for line in page.split("\n"):
+            match = next(
+                (i for i in range(next_heading, len(pending)) if heading_matches(line, pending[i][1])), None
+            )
+            if match is not None:
+                sections.append(current)
+                level, title = pending[match]
+                current = {"level": level, "title": title, "lines": []}
+                next_heading = match + 1
+            current["lines"].append(line)
+    sections.append(current)
+    
+    return [
+        {"level": section["level"], "title": section["title"], "text": "\n".join(section["lines"]).strip()}
+        for section in sections
+        if section["title"] is not None or "".join(section["lines"]).strip()
+    ]
+
+def section_chunk_text(sections, max_words=400, nlp=None, max_tokens=None, content_defined=False):
+    """
+    Pack sections into chunks, cutting at the highest-level heading available
+    
+    Sections are packed in order. When the next section does not fit, the
+    chunk is cut at the heading of the highest level (chapter before section
+    before subsection) among the cut points that leave it at least
+    SECTION_MIN_FILL full, so whole chapters stay together when they fit and
+    a chapter is divided between its sections only when it does not. A single
+    section larger than the limit is split at sentence boundaries by
+    smart_chunk_text. A chunk is never cut directly after a heading: headings
+    left at the end of a chunk that cannot be cut SECTION_MIN_FILL full (such
+    as a chapter heading followed by a section too large to join it), and
+    chunks below SECTION_CARRY_FILL, are carried into the next piece, and the
+    two are split again at sentence boundaries.
+    
+    Args:
+        sections (list): Sections from split_sections
+        max_words (int): Maximum words per chunk
+        nlp (spacy.language.Language, optional): Pipeline for sentence segmentation
+        max_tokens (int, optional): Size chunks by Llama 3 tokens instead of words
+        content_defined (bool): Split oversized sections with content-defined
+            boundaries (see smart_chunk_text)
+        
+    Returns:
+        list: List of text chunks
+    """
+    measure, limit = chunk_measure(max_words, max_tokens)
+    
+    # Pieces as (text, length, level of the heading that opens them, whether
+    # they are a heading with no text under it); the parts of a split section
+    # open with no heading at all
+    pieces = []
+    for section in sections:
+        length = measure(section["text"])
+        if length <= limit:
+            bare = (
+                section["title"] is not None
+                and normalize_heading(section["text"]) == normalize_heading(section["title"])
+            )
+            pieces.append((section["text"], length, section["level"], bare))
+            continue
+        parts = smart_chunk_text(
+            section["text"], max_words=max_words, nlp=nlp, max_tokens=max_tokens, content_defined=content_defined
+        )
+        for index, part in enumerate(parts):
+            pieces.append((part, measure(part), section["level"] if index == 0 else math.inf, False))
+    
+    chunks = []
+    current = []
+    current_len = 0
+    pending = deque(pieces)
+    while pending:
+        piece = pending.popleft()
+        while current and current_len + piece[1] > limit:
+            # Cut before current[cut]; cut == len(current) ends the chunk before this piece
+            best_cut, best_level = None, piece[2]
+            filled = 0
+            for cut in range(1, len(current) + 1):
+                filled += current[cut - 1][1]
+                level = current[cut][2] if cut < len(current) else piece[2]
+                if filled >= limit * SECTION_MIN_FILL and level <= best_level:
+                    best_cut, best_level = cut, level
+            
+            if best_cut is None:
+                # Headings at the end go with the piece that follows them
+                best_cut = len(current)
+                while best_cut and current[best_cut - 1][3]:
+                    best_cut -= 1
+                if sum(length for _, length, _, _ in current[:best_cut]) < limit * SECTION_CARRY_FILL:
+                    best_cut = 0
+            
+            if best_cut == 0:
+                # Too little to stand alone: carry it into this piece and split again
+                parts = smart_chunk_text(
+                    "\n\n".join([text for text, _, _, _ in current] + [piece[0]]),
+                    max_words=max_words, nlp=nlp, max_tokens=max_tokens, content_defined=content_defined
+                )
+                carried_words = sum(len(text.split()) for text, _, _, _ in current)
+                if len(parts[0].split()) > carried_words:
+                    pending.extendleft(reversed([
+                        (part, measure(part), current[0][2] if index == 0 else math.inf, False)
+                        for index, part in enumerate(parts)
+                    ]))
+                    current, current_len = [], 0
+                    piece = pending.popleft()
+                    break
+                # Nothing of the piece fits after it; emit it after all
+                best_cut = len(current)
             
-    return {"error": "Could not extract valid JSON from response"}
+            chunks.append("\n\n".join(text for text, _, _, _ in current[:best_cut]))
+            current = current[best_cut:]
+            current_len = sum(length for _, length, _, _ in current)
+        current.append(piece)
+        current_len += piece[1]
+    
+    if current:
+        chunks.append("\n\n".join(text for text, _, _, _ in current))
+    
+    return chunks
 
-def summarize_text(text, context=None, is_final=False):
+def parse_summary(summary):
     """
-    Generate summary using AWS Bedrock
+    Parse a model generation into a summary object
+    
+    Args:
+        summary (str): Raw generation text
+        
+    Returns:
+        dict: Parsed summary or error; objects without any of SUMMARY_KEYS
+            (e.g. {} repaired from truncated output) count as errors
+    """
+    return extract_json_from_text(summary, keys=SUMMARY_KEYS)
+
+def is_usable_summary(summary):
+    """
+    Check whether a model generation parses into a summary
+    
+    Args:
+        summary (str): Raw generation text
+        
+    Returns:
+        bool: True if the generation yielded usable JSON
+    """
+    parsed = parse_summary(summary)
+    return not (isinstance(parsed, dict) and "error" in parsed)
+
+def build_summary_prompt(text, context=None, is_final=False):
+    """
+    Build the Llama 3 prompt for a summarization call
     
     Args:
         text (str): Text to summarize
@@ -108,10 +321,8 @@ def summarize_text(text, context=None, is_final=False):
         is_final (bool): Whether this is the final summary
         
     Returns:
-        dict: Summary in JSON format
+        str: Formatted prompt
     """
-    bedrock_runtime = get_bedrock_client()
-    
     if is_final:
         user_prompt = (
             "You are an expert academic summarization assistant. Summarize the following document as a JSON object with the following keys if relevant: "
@@ -138,67 +349,409 @@ def summarize_text(text, context=None, is_final=False):
             "```"
         )
     
-    prompt = format_llama3_prompt(user_prompt)
+    return format_llama3_prompt(user_prompt)
+
+def summarize_text(text, context=None, is_final=False, stage=None):
+    """
+    Generate summary using AWS Bedrock
+    
+    Args:
+        text (str): Text to summarize
+        context (dict, optional): Context for the summarization
+        is_final (bool): Whether this is the final summary
+        stage (str, optional): Pipeline stage whose model routing applies;
+            defaults to "final" for a final summary and "map" otherwise
+        
+    Returns:
+        dict: Summary in JSON format
+    """
+    prompt = build_summary_prompt(text, context=context, is_final=is_final)
+    if stage is None:
+        stage = "final" if is_final else "map"
     
     try:
-        request_body = json.dumps({
-            "prompt": prompt,
-            "max_gen_len": 1024,
-            "temperature": 0.3,
-            "top_p": 0.9
-        })
-        
-        for _ in range(3):  # Retry up to 3 times if summary is empty
-            response = bedrock_runtime.invoke_model(
-                modelId="meta.llama3-70b-instruct-v1:0",
-                contentType="application/json",
-                accept="application/json",
-                body=request_body
-            )
-            
-            response_body = json.loads(response['body'].read().decode('utf-8'))
-            summary = response_body.get('generation', '').strip()
-            
-            if summary:
-                try:
-                    # First try to directly parse as JSON
-                    return json.loads(summary)
-                except json.JSONDecodeError:
-                    # If direct parsing fails, try to extract JSON from text
-                    return extract_json_from_text(summary)
-                    
+        summary = invoke_llama(
+            prompt,
+            top_p=0.9,
+            is_valid=is_usable_summary,
+            stage=stage,
+            **stage_params(stage)
+        )
+        return parse_summary(summary)
+    except EmptyGenerationError:
         return {"error": "Failed to generate summary (empty response)."}
     except Exception as e:
         print(f"Error in summarization: {str(e)}")
         return {"error": f"Failed to generate summary: {str(e)}"}
 
-def recursive_summarize(text, max_words=400):
+def stream_final_summary(text, on_token):
     """
-    Recursively summarize text by chunking and then combining summaries
+    Generate the final summary, streaming tokens as Bedrock produces them
+    
+    Args:
+        text (str): Combined chunk summaries
+        on_token (callable): Called with each piece of generated text
+        
+    Returns:
+        dict: Summary in JSON format
+    """
+    prompt = build_summary_prompt(text, is_final=True)
+    
+    try:
+        pieces = []
+        for piece in stream_llama(prompt, top_p=0.9, is_valid=is_usable_summary, stage="final",
+                                  **stage_params("final")):
+            pieces.append(piece)
+            on_token(piece)
+        summary = "".join(pieces).strip()
+        if not summary:
+            return {"error": "Failed to generate summary (empty response)."}
+        return parse_summary(summary)
+    except EmptyGenerationError:
+        return {"error": "Failed to generate summary (empty response)."}
+    except Exception as e:
+        print(f"Error in streaming summarization: {str(e)}")
+        return {"error": f"Failed to generate summary: {str(e)}"}
+
+def summary_chunk_budget():
+    """
+    Token budget of a map chunk when chunks are sized by tokens
+    
+    Returns:
+        int: Tokens left for the chunk after the prompt template, the global
+            context (itself a summary of up to the context stage's max_gen_len
+            tokens) and the map stage's generation
+    """
+    return prompt_budget(
+        build_summary_prompt("", context=" "),
+        stage_params("map")["max_gen_len"],
+        reserve=stage_params("context")["max_gen_len"]
+    )
+
+def node_key(kind, *parts):
+    """Memo key of a summary tree node, tied to the model and generation parameters of its stage"""
+    params = stage_params(kind)
+    return summary_node_key(kind, params["model_id"], params["max_gen_len"], params["temperature"], *parts)
+
+def summary_merge_budget(stage):
+    """
+    Token budget of the summaries merged by one reduce or final call
+    
+    Args:
+        stage (str): 'reduce' or 'final'
+        
+    Returns:
+        int: Tokens left after the prompt template and the stage's generation
+    """
+    return prompt_budget(build_summary_prompt("", is_final=True), stage_params(stage)["max_gen_len"])
+
+def plan_reduce_tree(chunk_count, fan_in=8, summary_tokens=None, max_tokens=None):
+    """
+    Compute the LLM calls a summarization makes before running it
+    
+    The map step summarizes every chunk; each reduce level then merges
+    batches of up to fan_in summaries until at most fan_in remain for the
+    final synthesis. One further call builds the global context.
+    
+    Summary sizes are only known once they are generated, so with a token
+    budget the plan assumes every summary is summary_tokens long and merges
+    only as many as fit max_tokens. The plan is then an upper bound: batches
+    of shorter summaries are filled up to fan_in and may skip levels.
+    
+    Args:
+        chunk_count (int): Number of chunks in the map step
+        fan_in (int): Maximum summaries merged by one call (at least 2)
+        summary_tokens (int, optional): Largest size of a summary in tokens
+            (the max_gen_len of the calls producing them)
+        max_tokens (int, optional): Token budget of the summaries merged by one call
+        
+    Returns:
+        dict: Plan with the calls per level, the reduce depth and the total calls
+    """
+    fan_in = max(2, fan_in)
+    per_call = fan_in
+    if summary_tokens and max_tokens:
+        per_call = max(2, min(fan_in, max_tokens // summary_tokens))
+    levels = [{"level": 0, "stage": "map", "calls": chunk_count}]
+    count = chunk_count
+    while count > per_call:
+        count = math.ceil(count / per_call)
+        levels.append({"level": len(levels), "stage": "reduce", "calls": count})
+    
+    return {
+        "fan_in": fan_in,
+        "planned_fan_in": per_call,
+        "chunks": chunk_count,
+        "levels": levels,
+        "depth": len(levels) - 1,
+        "total_calls": 1 + sum(level["calls"] for level in levels) + 1
+    }
+
+def batch_summaries(summaries, fan_in, max_tokens=None):
+    """
+    Split the summaries of one reduce level into order-preserving batches
+    
+    The summaries are spread evenly over the fewest batches of up to fan_in.
+    A batch is also closed when the next summary would take it past
+    max_tokens, so a reduce prompt never overflows the model window; it
+    always takes at least two summaries, so every level shrinks.
+    
+    Args:
+        summaries (list): Summaries (dicts or text)
+        fan_in (int): Maximum summaries per batch (at least 2)
+        max_tokens (int, optional): Token budget of the serialized summaries of a batch
+        
+    Returns:
+        list: List of batches, each a list of summaries
+    """
+    if not summaries:
+        return []
+    fan_in = max(2, fan_in)
+    size = math.ceil(len(summaries) / math.ceil(len(summaries) / fan_in))
+    batches = []
+    current = []
+    current_tokens = 0
+    for summary in summaries:
+        tokens = count_tokens(serialize_summary(summary)) if max_tokens else 0
+        if len(current) >= size or (max_tokens and len(current) >= 2 and current_tokens + tokens > max_tokens):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(summary)
+        current_tokens += tokens
+    batches.append(current)
+    return batches
+
+def serialize_summary(summary):
+    """Render a summary as text for a reduce or final prompt"""
+    # Ensure we're dealing with string representation of JSON objects
+    if isinstance(summary, dict):
+        return json.dumps(summary)
+    return str(summary)
+
+def summary_fingerprint(summary):
+    """Fingerprint of a summary, identifying it as the input of a reduce or final node"""
+    return text_fingerprint(serialize_summary(summary))
+
+def is_failed_summary(summary):
+    """Whether a summary is the error object of a failed call"""
+    return isinstance(summary, dict) and "error" in summary
+
+def start_global_context(text):
+    """
+    Start the global-context call on the LLM worker pool
+    
+    Args:
+        text (str): Full document text; its opening is summarized
+        
+    Returns:
+        Future: Future of (summary, reused) as returned by memoized
+    """
+    context_text = text[:min(len(text), 4000)]
+    return submit_llm_task(
+        memoized,
+        node_key("context", text_fingerprint(context_text)),
+        lambda: summarize_text(context_text, is_final=False, stage="context")
+    )
+
+def chunk_document(text, max_words=400, max_tokens=None, on_event=None, sections=None):
+    """
+    Split a document into content-defined chunks and drop near-duplicate ones
+    
+    Args:
+        text (str): Document text
+        max_words (int): Maximum words per chunk
+        max_tokens (int, optional): Maximum tokens per chunk; takes precedence
+        on_event (callable, optional): Progress callback, called with the
+            "chunks" and "deduplicated" events
+        sections (list, optional): Sections of the text from split_sections;
+            chunks are then packed from whole sections
+        
+    Returns:
+        list: Chunks
+    """
+    if sections:
+        chunks = section_chunk_text(sections, max_words=max_words, max_tokens=max_tokens, content_defined=True)
+    else:
+        chunks = smart_chunk_text(text, max_words=max_words, max_tokens=max_tokens, content_defined=True)
+    chunks, dedup_stats = drop_duplicate_chunks(chunks)
+    if on_event is not None:
+        on_event("chunks", {"level": 0, "count": len(chunks)})
+        on_event("deduplicated", dedup_stats)
+    return chunks
+
+def recursive_summarize(text, max_words=400, on_event=None, stream_final=False, fan_in=None, sections=None,
+                        max_in_flight=None):
+    """
+    Summarize text with a map step followed by a fan-in reduce tree
+    
+    The global context is computed once, concurrently with chunking, and
+    shared by every map call. Chunk summaries are then merged level by level
+    in batches of up to fan_in that fit the reduce prompt's token budget,
+    with the batches of a level reduced in parallel, until few enough remain
+    for the final synthesis and they fit its prompt. The call plan (an upper
+    bound, see plan_reduce_tree) is reported as a "plan" event before any
+    chunk is summarized; chunks
+    nearly repeating an earlier one are dropped first ("deduplicated" event).
+    
+    Every node of the tree is memoized: map nodes by chunk text and
+    global-context fingerprint, reduce and final nodes by the content of the
+    summaries they merge. Nodes built on a failed input are not memoized.
+    Chunk boundaries are content-defined, so a revised document recomputes
+    only the changed chunks and the nodes above them. The counts of reused
+    and recomputed nodes are reported as a "memoization" event.
+    
+    With CHUNK_SIZING=tokens, chunks are packed to the token budget of the
+    model window; max_words only applies when sizing by words.
     
     Args:
         text (str): Text to summarize
         max_words (int): Maximum words per chunk
+        on_event (callable, optional): Progress callback, called as
+            on_event(event_name, data)
+        stream_final (bool): Stream the final synthesis from Bedrock, reporting
+            each piece of text as a "token" event
+        fan_in (int, optional): Summaries merged per reduce call; defaults to
+            REDUCE_FAN_IN
+        sections (list, optional): Sections of the text from split_sections,
+            to pack whole sections into chunks
+        max_in_flight (int, optional): Maximum model calls queued on the LLM
+            pool at once (see map_concurrently)
         
     Returns:
         dict: Final summary in JSON format
     """
-    chunks = smart_chunk_text(text, max_words=max_words)
-    global_context = summarize_text(text[:min(len(text), 4000)], is_final=False)
-    chunk_summaries = []
+    chunk_tokens = summary_chunk_budget() if uses_token_budget() else None
     
-    for chunk in chunks:
-        summary = summarize_text(chunk, context=global_context)
-        # Ensure we're dealing with string representation of JSON objects
-        if isinstance(summary, dict):
-            chunk_summaries.append(json.dumps(summary))
-        else:
-            chunk_summaries.append(str(summary))
-        
-    combined_summary = "\n\n".join(chunk_summaries)
+    # Start the global-context call while the text is being chunked
+    context_future = start_global_context(text)
+    chunks = chunk_document(
+        text, max_words=max_words, max_tokens=chunk_tokens, on_event=on_event, sections=sections
+    )
+    return summarize_chunks(
+        chunks, context_future, on_event=on_event, stream_final=stream_final, fan_in=fan_in,
+        max_in_flight=max_in_flight
+    )
+
+def summarize_chunks(chunks, context_future, on_event=None, stream_final=False, fan_in=None, after_map=None,
+                     max_in_flight=None):
+    """
+    Run the map step, the reduce tree and the final synthesis over prepared chunks
     
-    if len(combined_summary.split()) > max_words * 2:
-        return recursive_summarize(combined_summary, max_words=max_words)
+    Args:
+        chunks (list): Chunks from chunk_document
+        context_future (Future): Global-context call from start_global_context
+        on_event (callable, optional): Progress callback, called as
+            on_event(event_name, data)
+        stream_final (bool): Stream the final synthesis as "token" events
+        fan_in (int, optional): Summaries merged per reduce call; defaults to
+            REDUCE_FAN_IN
+        after_map (callable, optional): Called without arguments once every chunk
+            is summarized, e.g. to queue other work on the LLM pool while the
+            few reduce calls run
+        max_in_flight (int, optional): Maximum model calls queued on the LLM
+            pool at once; calls not yet started are dropped when on_event
+            raises (e.g. JobCancelled)
         
-    final_summary = summarize_text(combined_summary, is_final=True)
-    return final_summary 
\ No newline at end of file
+    Returns:
+        dict: Final summary in JSON format
+    """
+    def emit(event, data):
+        if on_event is not None:
+            on_event(event, data)
+    
+    if fan_in is None:
+        fan_in = get_config().get("REDUCE_FAN_IN", 8)
+    
+    # Every node of the tree (context, map, reduce, final) is memoized, so a
+    # revised document only recomputes the nodes above what changed
+    tally = {"reused": 0, "recomputed": 0}
+    
+    def count(results):
+        for _, reused in results:
+            tally["reused" if reused else "recomputed"] += 1
+        return [summary for summary, _ in results]
+    
+    # Reduce and final prompts must fit the model window as well as fan_in
+    reduce_tokens = summary_merge_budget("reduce")
+    final_tokens = summary_merge_budget("final")
+    plan = plan_reduce_tree(
+        len(chunks),
+        fan_in,
+        summary_tokens=max(stage_params("map")["max_gen_len"], stage_params("reduce")["max_gen_len"]),
+        max_tokens=min(reduce_tokens, final_tokens)
+    )
+    fan_in = plan["fan_in"]
+    emit("plan", plan)
+    global_context = count([context_future.result()])[0]
+    context_fingerprint = summary_fingerprint(global_context)
+    context_failed = is_failed_summary(global_context)
+    
+    # Map: summarize every chunk with the shared global context
+    keys = [node_key("map", text_fingerprint(chunk), context_fingerprint) for chunk in chunks]
+    summaries = count(map_concurrently(
+        lambda item: memoized(
+            item[0], lambda: summarize_text(item[1], context=global_context), remember=not context_failed
+        ),
+        list(zip(keys, chunks)),
+        on_result=lambda index, result: emit(
+            "chunk_summary", {"level": 0, "index": index, "summary": result[0]}
+        ),
+        max_in_flight=max_in_flight
+    ))
+    if after_map is not None:
+        after_map()
+    
+    def combined(summaries):
+        return "\n\n".join(serialize_summary(summary) for summary in summaries)
+    
+    # A reduce node is keyed by the content of its inputs, and one built on a
+    # failed input is not memoized, so it is recomputed once that input succeeds
+    def reduce_batch(batch):
+        return memoized(
+            node_key("reduce", *(summary_fingerprint(summary) for summary in batch)),
+            lambda: summarize_text(combined(batch), is_final=True, stage="reduce"),
+            remember=not any(is_failed_summary(summary) for summary in batch)
+        )
+    
+    # Reduce: merge batches of summaries level by level, in parallel within a
+    # level, while more than fan_in remain or they overflow the final prompt
+    level = 0
+    while len(summaries) > 1 and (len(summaries) > fan_in or count_tokens(combined(summaries)) > final_tokens):
+        level += 1
+        batches = batch_summaries(summaries, fan_in, max_tokens=reduce_tokens)
+        emit("reduce_level", {"level": level, "count": len(batches), "words": len(combined(summaries).split())})
+        summaries = count(map_concurrently(
+            reduce_batch,
+            batches,
+            on_result=lambda index, result, level=level: emit(
+                "chunk_summary", {"level": level, "index": index, "summary": result[0]}
+            ),
+            max_in_flight=max_in_flight
+        ))
+    
+    combined_summary = combined(summaries)
+    size = {"words": len(combined_summary.split())}
+    if uses_token_budget():
+        size["tokens"] = count_tokens(combined_summary)
+    
+    emit("final_synthesis", {"level": level, **size})
+    final_key = node_key("final", *(summary_fingerprint(summary) for summary in summaries))
+    remember = not any(is_failed_summary(summary) for summary in summaries)
+    if stream_final:
+        final_summary, reused = memoized(
+            final_key,
+            lambda: stream_final_summary(combined_summary, lambda piece: emit("token", {"text": piece})),
+            remember=remember
+        )
+        if reused:
+            # Replay the memoized summary as a single piece of text
+            emit("token", {"text": json.dumps(final_summary)})
+    else:
+        final_summary, reused = memoized(
+            final_key, lambda: summarize_text(combined_summary, is_final=True), remember=remember
+        )
+    count([(final_summary, reused)])
+    
+    emit("memoization", dict(tally))
+    return final_summary
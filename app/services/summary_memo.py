@@ -0,0 +1,81 @@
+import hashlib
+from app.extensions import get_summary_memo
+from app.utils.cache import make_cache_key
+
+def text_fingerprint(text):
+    """
+    Hash a text for use in summary node keys
+    
+    Args:
+        text (str): Chunk text, context or serialized summary
+        
+    Returns:
+        str: SHA-256 hex digest
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def summary_node_key(kind, *parts):
+    """
+    Build the memo key of a node in the summarization tree
+    
+    Map nodes are keyed by their chunk text and the global-context
+    fingerprint; reduce and final nodes by the fingerprints of the summaries
+    they merge, so a node is reused exactly when its inputs are unchanged.
+    
+    Args:
+        kind (str): 'context', 'map', 'reduce' or 'final'
+        *parts: Fingerprints identifying the node
+        
+    Returns:
+        str: Cache key
+    """
+    return make_cache_key("summary-node", kind, *parts)
+
+def get_memoized_summary(key):
+    """
+    Look up a previously computed summary node
+    
+    Args:
+        key (str): Key from summary_node_key
+        
+    Returns:
+        dict: Memoized summary, or None if the memo is disabled or missed
+    """
+    memo = get_summary_memo()
+    if memo is None:
+        return None
+    return memo.get(key)
+
+def memoize_summary(key, summary):
+    """
+    Remember a successfully computed summary node
+    
+    Args:
+        key (str): Key from summary_node_key
+        summary (dict): Summary produced for the node; error objects are skipped
+    """
+    memo = get_summary_memo()
+    if memo is None or not isinstance(summary, dict) or "error" in summary:
+        return
+    memo.set(key, summary)
+
+def memoized(key, compute, remember=True):
+    """
+    Return a memoized summary node, computing and storing it on a miss
+    
+    Args:
+        key (str): Key from summary_node_key
+        compute (callable): Produces the summary when it is not memoized
+        remember (bool): Whether to store a computed summary; False for nodes
+            built on failed inputs, which must be recomputed next time
+        
+    Returns:
+        tuple: (summary, reused) where reused tells whether the memo was hit
+    """
+    summary = get_memoized_summary(key)
+    if summary is not None:
+        return summary, True
+    summary = compute()
+    if remember:
+        memoize_summary(key, summary)
+    return summary, False
@@ -0,0 +1,54 @@
+from app.extensions import get_config, get_token_counter
+
+# Characters per token assumed before the app (and its counter) is initialized
+FALLBACK_CHARS_PER_TOKEN = 3.8
+
+def count_tokens(text):
+    """
+    Count (or estimate) the Llama 3 tokens of a text
+    
+    Args:
+        text (str): Text to measure
+        
+    Returns:
+        int: Token count
+    """
+    counter = get_token_counter()
+    if counter is not None:
+        return counter.count(text)
+    return int(len(text) / FALLBACK_CHARS_PER_TOKEN) + 1 if text else 0
+
+def record_prompt_tokens(prompt, token_count):
+    """
+    Feed a token count reported by Bedrock back into the estimator
+    
+    Args:
+        prompt (str): Formatted prompt that was sent
+        token_count (int): prompt_token_count from the model response
+    """
+    counter = get_token_counter()
+    if counter is not None:
+        counter.observe(prompt, token_count)
+
+def uses_token_budget():
+    """Whether chunks are sized by tokens (CHUNK_SIZING=tokens) rather than words"""
+    return get_config().get("CHUNK_SIZING", "words") == "tokens"
+
+def prompt_budget(template_prompt, max_gen_len, reserve=0):
+    """
+    Tokens left for the variable text of a prompt
+    
+    The usable window is CONTEXT_BUDGET_FRACTION of LLM_CONTEXT_WINDOW; the
+    prompt template and the requested generation length are taken out of it.
+    
+    Args:
+        template_prompt (str): Formatted prompt with the variable text left empty
+        max_gen_len (int): max_gen_len of the call
+        reserve (int): Further tokens to keep free (e.g. for an injected context)
+        
+    Returns:
+        int: Token budget for the variable text (at least 1)
+    """
+    config = get_config()
+    window = int(config.get("LLM_CONTEXT_WINDOW", 8192) * config.get("CONTEXT_BUDGET_FRACTION", 0.75))
+    return max(1, window - count_tokens(template_prompt) - max_gen_len - reserve)
@@ -0,0 +1,192 @@
+import hashlib
+import os
+import tempfile
+import threading
+from app.extensions import get_upload_metrics
+from app.services.pdf_service import pdf_page_count, remove_temp_file
+from app.utils.metrics import current_rss_bytes
+
+# Size of the blocks read from the upload stream
+READ_BLOCK_SIZE = 1024 * 1024
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds the size or page limit of its endpoint"""
+
+class Upload:
+    """
+    An uploaded file held in memory, or in a unique temporary file when it is very large
+    """
+    
+    def __init__(self, filename, sha256, size, data=None, path=None):
+        self.filename = filename
+        self.sha256 = sha256
+        self.size = size
+        self.data = data
+        self.path = path
+        self.in_memory = data is not None
+        self.rss_at_start = current_rss_bytes()
+        self._released = False
+        self._release_lock = threading.Lock()
+    
+    @property
+    def source(self):
+        """The in-memory bytes, or the temporary file path for spooled uploads"""
+        return self.data if self.data is not None else self.path
+    
+    def read_bytes(self):
+        """
+        Get the full upload content as bytes
+        
+        Returns:
+            bytes: Upload content
+        """
+        if self.data is not None:
+            return self.data
+        with open(self.path, "rb") as spooled:
+            return spooled.read()
+    
+    def head(self, length):
+        """
+        Get the first bytes of the upload
+        
+        Args:
+            length (int): Number of bytes
+            
+        Returns:
+            bytes: Up to length leading bytes
+        """
+        if self.data is not None:
+            return bytes(self.data[:length])
+        with open(self.path, "rb") as spooled:
+            return spooled.read(length)
+    
+    def is_pdf(self):
+        """Whether the upload looks like a PDF, judging by its magic bytes"""
+        return self.head(5) == b"%PDF-"
+    
+    def cleanup(self):
+        """
+        Remove the temporary file of a spooled upload and report its memory use
+        
+        Safe to call more than once and from several threads; only the first
+        call has any effect.
+        """
+        with self._release_lock:
+            if self._released:
+                return
+            self._released = True
+            if self.path is not None:
+                remove_temp_file(self.path)
+                self.path = None
+        
+        metrics = get_upload_metrics()
+        if metrics is not None:
+            metrics.released(self.size, self.in_memory)
+        
+        rss = current_rss_bytes()
+        if rss is not None and self.rss_at_start is not None:
+            print(
+                f"Upload {self.filename}: {self.size} bytes "
+                f"{'in memory' if self.in_memory else 'spooled to disk'}, "
+                f"RSS {self.rss_at_start / 2**20:.0f} MB -> {rss / 2**20:.0f} MB"
+            )
+
+def reject_upload(message):
+    """
+    Count a rejected upload and build the error to raise for it
+    
+    Args:
+        message (str): Reason reported to the client
+        
+    Returns:
+        UploadTooLargeError: The error to raise
+    """
+    metrics = get_upload_metrics()
+    if metrics is not None:
+        metrics.rejected()
+    return UploadTooLargeError(message)
+
+def read_upload(file_obj, spool_threshold=32 * 1024 * 1024, max_bytes=None):
+    """
+    Read an uploaded file, hashing it on the way
+    
+    Uploads up to spool_threshold bytes are kept in memory; larger ones are
+    written to a uniquely named temporary file so concurrent requests never
+    share a path. Reading stops as soon as the upload passes max_bytes, which
+    catches clients that send no or a wrong Content-Length.
+    
+    Args:
+        file_obj: File object from the request
+        spool_threshold (int): Largest upload kept in memory, in bytes
+        max_bytes (int, optional): Largest upload accepted, in bytes
+        
+    Returns:
+        Upload: The uploaded file
+        
+    Raises:
+        UploadTooLargeError: The upload is larger than max_bytes
+    """
+    digest = hashlib.sha256()
+    blocks = []
+    size = 0
+    spooled = None
+    path = None
+    
+    try:
+        while True:
+            block = file_obj.stream.read(READ_BLOCK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+            size += len(block)
+            if max_bytes and size > max_bytes:
+                raise reject_upload(f"Upload exceeds the limit of {max_bytes} bytes")
+            
+            if spooled is None and size > spool_threshold:
+                # Move what we have so far to disk and continue there
+                fd, path = tempfile.mkstemp(suffix=os.path.splitext(file_obj.filename or "")[1])
+                spooled = os.fdopen(fd, "wb")
+                spooled.writelines(blocks)
+                blocks = []
+                
+            if spooled is not None:
+                spooled.write(block)
+            else:
+                blocks.append(block)
+    except Exception:
+        if spooled is not None:
+            spooled.close()
+            remove_temp_file(path)
+        raise
+    
+    if spooled is not None:
+        spooled.close()
+        upload = Upload(file_obj.filename, digest.hexdigest(), size, path=path)
+    else:
+        upload = Upload(file_obj.filename, digest.hexdigest(), size, data=b"".join(blocks))
+    
+    metrics = get_upload_metrics()
+    if metrics is not None:
+        metrics.admitted(size, upload.in_memory)
+    return upload
+
+def check_page_limit(upload, max_pages):
+    """
+    Reject a PDF upload with more pages than an endpoint accepts
+    
+    Only the page tree is read, so the check is cheap even for large documents.
+    Uploads that are not PDFs, or cannot be opened, are left to the pipeline.
+    
+    Args:
+        upload (Upload): The uploaded file
+        max_pages (int): Largest accepted page count (0 disables the check)
+        
+    Raises:
+        UploadTooLargeError: The PDF has more than max_pages pages
+    """
+    if not max_pages or not upload.is_pdf():
+        return
+    page_count = pdf_page_count(upload.source)
+    if page_count is not None and page_count > max_pages:
+        upload.cleanup()
+        raise reject_upload(f"Document has {page_count} pages; the limit is {max_pages}")
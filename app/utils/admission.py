@@ -0,0 +1,445 @@
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Identity of the caller on whose behalf model calls are made. Request handlers
+# set these; worker threads inherit them through copied contexts.
+current_client = ContextVar("admission_client", default=None)
+current_priority = ContextVar("admission_priority", default=None)
+# When the current call started waiting for its turn before it asked for
+# admission; set by the LLM worker pool and used up by the next acquire()
+queued_since = ContextVar("admission_queued_since", default=None)
+
+class AdmissionRejected(Exception):
+    """Raised when a call could not be admitted within the allowed wait or queue length"""
+
+@contextmanager
+def admission_identity(client=None, priority=None):
+    """
+    Run a block on behalf of a client at a given priority
+
+    Args:
+        client (str, optional): Client identifier used for fair queueing
+        priority (int, optional): Lower values are admitted first
+    """
+    client_token = current_client.set(client)
+    priority_token = current_priority.set(priority)
+    try:
+        yield
+    finally:
+        current_client.reset(client_token)
+        current_priority.reset(priority_token)
+
+def parse_priorities(value):
+    """
+    Parse an endpoint priority map such as "academic_assistant=0,jobs=2"
+
+    Args:
+        value (str): Comma-separated name=priority pairs
+
+    Returns:
+        dict: Priority by name
+    """
+    priorities = {}
+    for item in (value or "").split(","):
+        name, _, priority = item.partition("=")
+        if name.strip() and priority.strip():
+            priorities[name.strip()] = int(priority)
+    return priorities
+
+class MemoryRateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute token buckets for one process
+    """
+
+    def __init__(self, limits):
+        """
+        Args:
+            limits (dict): Per-minute rate by bucket name, e.g. {"requests": 60, "tokens": 100000};
+                buckets with a rate of 0 are not limited
+        """
+        self.limits = {name: float(rate) for name, rate in limits.items() if rate and rate > 0}
+        now = time.monotonic()
+        # Buckets start full so a fresh process can burst up to one minute's budget
+        self._levels = {name: (rate, now) for name, rate in self.limits.items()}
+        self._lock = threading.Lock()
+
+    def _refilled(self, name, now):
+        level, updated_at = self._levels[name]
+        rate = self.limits[name]
+        return min(rate, level + (now - updated_at) * rate / 60.0)
+
+    def try_take(self, amounts):
+        """
+        Take from every bucket at once, or from none of them
+
+        Args:
+            amounts (dict): Amount to take by bucket name
+
+        Returns:
+            float: 0 if taken, otherwise seconds until enough will have refilled
+        """
+        now = time.monotonic()
+        with self._lock:
+            levels = {name: self._refilled(name, now) for name in self.limits}
+            wait = 0.0
+            for name, amount in amounts.items():
+                if name not in self.limits:
+                    continue
+                # A single call larger than a bucket can still run once it is full
+                amount = min(amount, self.limits[name])
+                if levels[name] < amount:
+                    wait = max(wait, (amount - levels[name]) * 60.0 / self.limits[name])
+            if wait > 0:
+                return wait
+            for name in self.limits:
+                taken = min(amounts.get(name, 0), self.limits[name])
+                self._levels[name] = (levels[name] - taken, now)
+            return 0.0
+
+    def adjust(self, amounts):
+        """
+        Correct earlier charges once actual usage is known
+
+        Args:
+            amounts (dict): Amount to add back (negative) or charge extra (positive) by bucket name
+        """
+        now = time.monotonic()
+        with self._lock:
+            for name, amount in amounts.items():
+                if name in self.limits and amount:
+                    level = self._refilled(name, now) - amount
+                    # Debt is allowed, so under-estimates slow later calls down
+                    self._levels[name] = (max(min(level, self.limits[name]), -self.limits[name]), now)
+
+    def levels(self):
+        """Current bucket levels by name"""
+        now = time.monotonic()
+        with self._lock:
+            return {name: round(self._refilled(name, now), 1) for name in self.limits}
+
+class SQLiteRateLimiter:
+    """
+    Token buckets kept in a SQLite file so several worker processes share one budget
+
+    Bedrock quotas apply to the whole account, so with several workers the
+    per-minute budgets have to be shared for them to mean anything.
+    """
+
+    def __init__(self, db_path, limits):
+        """
+        Args:
+            db_path (str): SQLite file shared by the worker processes
+            limits (dict): Per-minute rate by bucket name; 0 disables a bucket
+        """
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.limits = {name: float(rate) for name, rate in limits.items() if rate and rate > 0}
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            "name TEXT PRIMARY KEY, level REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        now = time.time()
+        for name, rate in self.limits.items():
+            self._db.execute(
+                "INSERT OR IGNORE INTO buckets (name, level, updated_at) VALUES (?, ?, ?)", (name, rate, now)
+            )
+
+    def _read_levels(self, now):
+        rows = self._db.execute(
+            f"SELECT name, level, updated_at FROM buckets WHERE name IN ({', '.join('?' for _ in self.limits)})",
+            tuple(self.limits)
+        ).fetchall()
+        levels = {}
+        for name, level, updated_at in rows:
+            rate = self.limits[name]
+            levels[name] = min(rate, level + max(now - updated_at, 0) * rate / 60.0)
+        return levels
+
+    def _write_levels(self, levels, now):
+        self._db.executemany(
+            "UPDATE buckets SET level = ?, updated_at = ? WHERE name = ?",
+            [(level, now, name) for name, level in levels.items()]
+        )
+
+    def try_take(self, amounts):
+        """Take from every bucket at once, or return the seconds to wait (see MemoryRateLimiter)"""
+        if not self.limits:
+            return 0.0
+        now = time.time()
+        with self._lock:
+            # BEGIN IMMEDIATE serializes the read-modify-write across processes
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                levels = self._read_levels(now)
+                wait = 0.0
+                for name, amount in amounts.items():
+                    if name not in levels:
+                        continue
+                    amount = min(amount, self.limits[name])
+                    if levels[name] < amount:
+                        wait = max(wait, (amount - levels[name]) * 60.0 / self.limits[name])
+                if wait == 0:
+                    for name in levels:
+                        levels[name] -= min(amounts.get(name, 0), self.limits[name])
+                    self._write_levels(levels, now)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return wait
+
+    def adjust(self, amounts):
+        """Correct earlier charges once actual usage is known (see MemoryRateLimiter)"""
+        amounts = {name: amount for name, amount in amounts.items() if name in self.limits and amount}
+        if not amounts:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                levels = self._read_levels(now)
+                for name, amount in amounts.items():
+                    levels[name] = max(min(levels[name] - amount, self.limits[name]), -self.limits[name])
+                self._write_levels(levels, now)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def levels(self):
+        """Current bucket levels by name"""
+        if not self.limits:
+            return {}
+        with self._lock:
+            return {name: round(level, 1) for name, level in self._read_levels(time.time()).items()}
+
+class Admission:
+    """A granted (or pending) permission to make one model call"""
+
+    def __init__(self, seq, client, priority, tokens, enqueued_at=None):
+        self.seq = seq
+        self.client = client
+        self.priority = priority
+        self.tokens = tokens
+        self.enqueued_at = enqueued_at if enqueued_at is not None else time.monotonic()
+        self.used_tokens = None
+
+    def record_tokens(self, used_tokens):
+        """Report the tokens the call actually consumed (prompt plus generation)"""
+        self.used_tokens = used_tokens
+
+class AdmissionController:
+    """
+    Admission control for model calls: a concurrency cap, rate budgets and fair queueing
+
+    Callers wait in one queue per (priority, client). The next call admitted
+    comes from the highest priority (lowest number) with waiters and, within
+    it, from the client served least recently, so one large document cannot
+    starve other users. A call is admitted once a concurrency slot is free and
+    the rate limiter has budget for it; callers that wait longer than max_wait,
+    or arrive when max_queue calls are already waiting, are rejected instead of
+    adding to an unbounded backlog. Time a call spent queued in the LLM worker
+    pool as the next call of its client counts towards max_wait.
+
+    The rate limiter is consulted outside the controller's lock, so a slow
+    shared budget store never blocks release() or other callers.
+    """
+
+    # Clients whose last service time is remembered before idle ones are forgotten
+    MAX_TRACKED_CLIENTS = 4096
+
+    def __init__(self, max_concurrency=8, rate_limiter=None, max_wait=None, max_queue=None,
+                 default_priority=1):
+        """
+        Args:
+            max_concurrency (int): Calls in flight at once in this process
+            rate_limiter (MemoryRateLimiter or SQLiteRateLimiter, optional): Shared budgets
+            max_wait (float, optional): Longest time a call may wait, in seconds
+            max_queue (int, optional): Most calls allowed to wait at once
+            default_priority (int): Priority of calls made without one
+        """
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = rate_limiter
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.default_priority = default_priority
+
+        self._condition = threading.Condition()
+        self._queues = {}
+        self._waiting = 0
+        self._in_flight = 0
+        self._seq = itertools.count()
+        self._service_order = itertools.count()
+        self._last_served = {}
+        self._stats = {
+            "admitted": 0,
+            "rejected": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+            "max_queue_depth": 0
+        }
+
+    def _head(self):
+        """The waiter to admit next (caller holds the condition)"""
+        best, best_rank = None, None
+        for (priority, client), queue in self._queues.items():
+            ticket = queue[0]
+            rank = (priority, self._last_served.get(client, -1), ticket.seq)
+            if best_rank is None or rank < best_rank:
+                best, best_rank = ticket, rank
+        return best
+
+    def _forget_idle_clients(self):
+        """Drop the service history of clients with nothing queued (caller holds the condition)"""
+        queued = {client for _, client in self._queues}
+        self._last_served = {
+            client: seq for client, seq in self._last_served.items() if client in queued
+        }
+
+    def _dequeue(self, ticket):
+        key = (ticket.priority, ticket.client)
+        queue = self._queues[key]
+        queue.remove(ticket)
+        if not queue:
+            del self._queues[key]
+        self._waiting -= 1
+
+    def acquire(self, tokens=0, client=None, priority=None):
+        """
+        Wait until a model call may be made
+
+        Args:
+            tokens (int): Estimated tokens of the call (prompt plus max_gen_len)
+            client (str, optional): Client identifier; defaults to the current context
+            priority (int, optional): Priority; defaults to the current context
+
+        Returns:
+            Admission: Pass it to release() once the call has finished
+
+        Raises:
+            AdmissionRejected: The queue is full or the call waited longer than max_wait
+        """
+        client = client if client is not None else current_client.get()
+        priority = priority if priority is not None else current_priority.get()
+        if priority is None:
+            priority = self.default_priority
+        enqueued_at = queued_since.get()
+        if enqueued_at is not None:
+            # Only the first call made by a pool task was waiting in the pool
+            queued_since.set(None)
+
+        with self._condition:
+            if self.max_queue and self._waiting >= self.max_queue:
+                self._stats["rejected"] += 1
+                raise AdmissionRejected(f"Too many model calls waiting ({self._waiting})")
+
+            ticket = Admission(next(self._seq), client, priority, tokens, enqueued_at=enqueued_at)
+            self._queues.setdefault((priority, client), deque()).append(ticket)
+            self._waiting += 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._waiting)
+            deadline = ticket.enqueued_at + self.max_wait if self.max_wait else None
+
+            while True:
+                timeout = None
+                if self._head() is ticket and self._in_flight < self.max_concurrency:
+                    # Hold the slot while the budget is checked without the lock;
+                    # other waiters cannot pass this ticket meanwhile
+                    self._in_flight += 1
+                    wait = 0.0
+                    if self.rate_limiter is not None:
+                        try:
+                            wait = self._try_take_unlocked({"requests": 1, "tokens": tokens})
+                        except Exception:
+                            self._in_flight -= 1
+                            self._dequeue(ticket)
+                            self._condition.notify_all()
+                            raise
+                    if wait > 0:
+                        self._in_flight -= 1
+                    else:
+                        self._dequeue(ticket)
+                        self._last_served[client] = next(self._service_order)
+                        if len(self._last_served) > self.MAX_TRACKED_CLIENTS:
+                            self._forget_idle_clients()
+                        waited = time.monotonic() - ticket.enqueued_at
+                        self._stats["admitted"] += 1
+                        self._stats["total_wait_seconds"] += waited
+                        self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], waited)
+                        # The next waiter may be admissible as well
+                        self._condition.notify_all()
+                        return ticket
+                    timeout = wait
+
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._dequeue(ticket)
+                        self._stats["rejected"] += 1
+                        self._condition.notify_all()
+                        raise AdmissionRejected(f"Model call not admitted within {self.max_wait}s")
+                    timeout = remaining if timeout is None else min(timeout, remaining)
+                self._condition.wait(timeout)
+
+    def _try_take_unlocked(self, amounts):
+        """Ask the rate limiter for budget with the condition released (caller holds it)"""
+        self._condition.release()
+        try:
+            return self.rate_limiter.try_take(amounts)
+        finally:
+            self._condition.acquire()
+
+    def release(self, ticket):
+        """
+        Free the slot of a finished call and settle its token charge
+
+        Args:
+            ticket (Admission): Admission returned by acquire()
+        """
+        if self.rate_limiter is not None and ticket.used_tokens is not None:
+            self.rate_limiter.adjust({"tokens": ticket.used_tokens - ticket.tokens})
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def admit(self, tokens=0, client=None, priority=None):
+        """Context manager around acquire() and release()"""
+        ticket = self.acquire(tokens, client=client, priority=priority)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def stats(self):
+        """
+        Report admission counters, the current queue and the rate budgets
+
+        Returns:
+            dict: Admission statistics
+        """
+        with self._condition:
+            stats = dict(self._stats)
+            stats["in_flight"] = self._in_flight
+            stats["waiting"] = self._waiting
+            waiting_by_priority = {}
+            for (priority, _), queue in self._queues.items():
+                waiting_by_priority[str(priority)] = waiting_by_priority.get(str(priority), 0) + len(queue)
+            stats["waiting_by_priority"] = waiting_by_priority
+            stats["waiting_clients"] = len({client for _, client in self._queues})
+        stats["avg_wait_seconds"] = round(stats["total_wait_seconds"] / stats["admitted"], 4) if stats["admitted"] else 0.0
+        stats["total_wait_seconds"] = round(stats["total_wait_seconds"], 4)
+        stats["max_wait_seconds"] = round(stats["max_wait_seconds"], 4)
+        if self.rate_limiter is not None:
+            stats["budgets"] = self.rate_limiter.levels()
+        return stats
@@ -0,0 +1,285 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+def make_cache_key(*parts):
+    """
+    Build a content-addressed cache key from JSON-serializable parts
+
+    Args:
+        *parts: Values identifying the cached item (model id, prompt, parameters, ...)
+
+    Returns:
+        str: SHA-256 hex digest of the serialized parts
+    """
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class TieredCache:
+    """
+    Two-tier key/value cache: an in-process LRU in front of an optional SQLite store
+
+    Values must be JSON-serializable. They are stored serialized in both tiers so
+    callers always receive a fresh copy they are free to mutate.
+
+    Reads from either tier refresh the entry's access time in SQLite, which
+    drives its LRU eviction. Access times are collected in memory and written
+    in batches, so a read never commits on its own.
+    """
+
+    # How many writes happen between two eviction passes over the SQLite tier
+    PRUNE_INTERVAL = 64
+
+    # Reads whose access times are written to SQLite in one batch, and the
+    # longest (in seconds) an access time waits before it is written
+    TOUCH_BATCH = 64
+    TOUCH_INTERVAL = 30.0
+
+    def __init__(self, name, max_memory_items=256, db_path=None, max_db_entries=10000,
+                 max_db_bytes=None, ttl_seconds=None):
+        """
+        Args:
+            name (str): Name reported in the cache statistics
+            max_memory_items (int): Capacity of the in-process LRU tier (0 disables it)
+            db_path (str, optional): SQLite file for the persistent tier (None disables it)
+            max_db_entries (int): Maximum number of rows kept in the SQLite tier
+            max_db_bytes (int, optional): Maximum total value size kept in the SQLite tier
+            ttl_seconds (float, optional): Lifetime of an entry in both tiers
+        """
+        self.name = name
+        self.max_memory_items = max_memory_items
+        self.db_path = db_path
+        self.max_db_entries = max_db_entries
+        self.max_db_bytes = max_db_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._writes_since_prune = 0
+        self._touches = {}
+        self._touches_flushed_at = time.time()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "evictions": 0
+        }
+
+        if db_path:
+            self._init_db()
+
+    def _init_db(self):
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache (accessed_at)")
+        self._db.commit()
+
+    def _is_expired(self, created_at, now):
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def _count(self, stat, amount=1):
+        with self._lock:
+            self._stats[stat] += amount
+
+    def _remember(self, key, serialized, created_at):
+        if self.max_memory_items <= 0:
+            return
+        with self._lock:
+            self._memory[key] = (serialized, created_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_items:
+                self._memory.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def _touch(self, key, now):
+        """Record a read of key; the access time reaches SQLite with the next batch"""
+        if self._db is None:
+            return
+        with self._lock:
+            self._touches[key] = now
+            due = (
+                len(self._touches) >= self.TOUCH_BATCH
+                or now - self._touches_flushed_at >= self.TOUCH_INTERVAL
+            )
+        if due:
+            with self._db_lock:
+                self._flush_touches(now)
+                self._db.commit()
+
+    def _flush_touches(self, now):
+        """Write the recorded access times to the SQLite tier (caller holds _db_lock)"""
+        with self._lock:
+            touches = [(accessed_at, key) for key, accessed_at in self._touches.items()]
+            self._touches.clear()
+            self._touches_flushed_at = now
+        if touches:
+            self._db.executemany("UPDATE cache SET accessed_at = ? WHERE key = ?", touches)
+
+    def get(self, key):
+        """
+        Look up a value in the memory tier, then the SQLite tier
+
+        Args:
+            key (str): Cache key
+
+        Returns:
+            The cached value, or None on a miss
+        """
+        now = time.time()
+        hit = None
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if self._is_expired(entry[1], now):
+                    del self._memory[key]
+                else:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    hit = entry[0]
+
+        if hit is not None:
+            self._touch(key, now)
+            return json.loads(hit)
+
+        if self._db is not None:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT value, created_at FROM cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and self._is_expired(row[1], now):
+                    self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+                    self._db.commit()
+                    row = None
+
+            if row is not None:
+                self._touch(key, now)
+                self._count("disk_hits")
+                self._remember(key, row[0], row[1])
+                return json.loads(row[0])
+
+        self._count("misses")
+        return None
+
+    def set(self, key, value):
+        """
+        Store a value in every enabled tier
+
+        Args:
+            key (str): Cache key
+            value: JSON-serializable value
+        """
+        serialized = json.dumps(value)
+        now = time.time()
+        self._remember(key, serialized, now)
+        self._count("writes")
+
+        if self._db is None:
+            return
+
+        with self._db_lock:
+            # Pending access times go out with the write's commit
+            self._flush_touches(now)
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, serialized, len(serialized), now, now)
+            )
+            self._db.commit()
+            self._writes_since_prune += 1
+            if self._writes_since_prune >= self.PRUNE_INTERVAL:
+                self._writes_since_prune = 0
+                self._prune_db(now)
+
+    def _prune_db(self, now):
+        """Apply TTL and size-based eviction to the SQLite tier (caller holds _db_lock)"""
+        evicted = 0
+
+        if self.ttl_seconds is not None:
+            evicted += self._db.execute(
+                "DELETE FROM cache WHERE created_at < ?", (now - self.ttl_seconds,)
+            ).rowcount
+
+        count, total_size = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache"
+        ).fetchone()
+
+        # Evict least recently used rows until both limits are satisfied
+        while count > self.max_db_entries or (self.max_db_bytes and total_size > self.max_db_bytes):
+            batch = count - self.max_db_entries if count > self.max_db_entries else 16
+            rows = self._db.execute(
+                "SELECT key, size FROM cache ORDER BY accessed_at ASC LIMIT ?", (batch,)
+            ).fetchall()
+            if not rows:
+                break
+            self._db.executemany("DELETE FROM cache WHERE key = ?", [(row[0],) for row in rows])
+            count -= len(rows)
+            total_size -= sum(row[1] for row in rows)
+            evicted += len(rows)
+
+        self._db.commit()
+        if evicted:
+            self._count("evictions", evicted)
+
+    def delete(self, key):
+        """Remove a key from every tier"""
+        with self._lock:
+            self._memory.pop(key, None)
+            self._touches.pop(key, None)
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._db.commit()
+
+    def clear(self):
+        """Remove every entry from every tier"""
+        with self._lock:
+            self._memory.clear()
+            self._touches.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM cache")
+                self._db.commit()
+
+    def stats(self):
+        """
+        Report hit/miss counters and tier sizes
+
+        Returns:
+            dict: Cache statistics
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_items"] = len(self._memory)
+
+        if self._db is not None:
+            with self._db_lock:
+                count, total_size = self._db.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache"
+                ).fetchone()
+            stats["disk_items"] = count
+            stats["disk_bytes"] = total_size
+
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        lookups = hits + stats["misses"]
+        stats["name"] = self.name
+        stats["hits"] = hits
+        stats["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        return stats
@@ -0,0 +1,107 @@
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from contextlib import contextmanager
+from app.extensions import get_llm_executor, get_admission_controller
+
+def submit_llm_task(func, *args, **kwargs):
+    """
+    Submit a callable to the shared LLM worker pool
+    
+    The pool queues the callable under the caller's client and priority and
+    runs it in a copy of the caller's context, so the client identity used for
+    admission control follows the work onto the pool (see FairThreadPool).
+    
+    Args:
+        func (callable): Function to run
+        *args: Positional arguments for func
+        **kwargs: Keyword arguments for func
+        
+    Returns:
+        Future: Future holding the result of func
+    """
+    executor = get_llm_executor()
+    if executor is not None:
+        return executor.submit(func, *args, **kwargs)
+    
+    # No pool configured (e.g. outside the app factory); run inline
+    future = Future()
+    try:
+        future.set_result(func(*args, **kwargs))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+def map_concurrently(func, items, on_result=None, max_in_flight=None):
+    """
+    Apply a function to every item on the shared LLM worker pool
+    
+    Args:
+        func (callable): Function taking a single item
+        items (list): Items to process
+        on_result (callable, optional): Called as on_result(index, result) in the
+            calling thread as soon as each item finishes
+        max_in_flight (int, optional): Maximum items submitted at once, bounding
+            how much of the shared pool one caller can occupy
+        
+    Returns:
+        list: Results in the same order as items
+        
+    Raises:
+        Exception: The first error raised by func or on_result; items not yet
+            started are then cancelled
+    """
+    items = list(items)
+    if len(items) <= 1 or get_llm_executor() is None:
+        results = []
+        for index, item in enumerate(items):
+            results.append(func(item))
+            if on_result is not None:
+                on_result(index, results[-1])
+        return results
+    
+    limit = max_in_flight if max_in_flight and max_in_flight > 0 else len(items)
+    pending = {}
+    results = [None] * len(items)
+    next_index = 0
+    try:
+        while next_index < len(items) or pending:
+            while next_index < len(items) and len(pending) < limit:
+                pending[submit_llm_task(func, items[next_index])] = next_index
+                next_index += 1
+            
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                results[index] = future.result()
+                if on_result is not None:
+                    on_result(index, results[index])
+    finally:
+        # On an error (e.g. JobCancelled raised by on_result) queued items must
+        # not go on to call the model; those already running finish on their own
+        for future in pending:
+            future.cancel()
+    return results
+
+@contextmanager
+def bedrock_slot(tokens=0):
+    """
+    Hold admission for one Bedrock call for its duration
+    
+    Waits for a concurrency slot and per-minute budget in the fair queue of the
+    current client (see AdmissionController).
+    
+    Args:
+        tokens (int): Estimated tokens of the call (prompt plus max_gen_len)
+        
+    Yields:
+        Admission: Report the actual usage with record_tokens(), or None without a controller
+        
+    Raises:
+        AdmissionRejected: The call could not be admitted in time
+    """
+    controller = get_admission_controller()
+    if controller is None:
+        yield None
+        return
+    
+    with controller.admit(tokens) as admission:
+        yield admission
@@ -0,0 +1,169 @@
+import math
+import re
+import zlib
+from collections import Counter
+import numpy as np
+
+# Prime just above 2**32 for the universal hash family ((a * x + b) mod p);
+# with 32-bit shingle hashes and a < 2**31 the products fit in uint64
+HASH_PRIME = np.uint64(4294967311)
+
+def normalize_words(text):
+    """Lower-cased word tokens of a text"""
+    return re.findall(r"\w+", text.lower())
+
+def shingle_hashes(text, size=5):
+    """
+    Hash the word shingles of a text
+
+    Args:
+        text (str): Text to shingle
+        size (int): Words per shingle
+
+    Returns:
+        numpy.ndarray: Distinct 32-bit shingle hashes (uint64)
+    """
+    words = normalize_words(text)
+    if len(words) <= size:
+        shingles = {" ".join(words)} if words else set()
+    else:
+        shingles = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return np.fromiter(
+        (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64, count=len(shingles)
+    )
+
+class MinHasher:
+    """
+    MinHash signatures over word shingles, with LSH banding to find
+    near-duplicate texts without comparing every pair
+    """
+
+    def __init__(self, num_perm=64, bands=16, shingle_size=5, seed=1):
+        """
+        Args:
+            num_perm (int): Hash functions per signature
+            bands (int): LSH bands; num_perm must be a multiple of it
+            shingle_size (int): Words per shingle
+            seed (int): Seed of the hash family, so signatures are reproducible
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, 1 << 31, size=num_perm).astype(np.uint64)
+        self.b = rng.randint(0, 1 << 31, size=num_perm).astype(np.uint64)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+
+    def signature(self, text):
+        """
+        Compute the MinHash signature of a text
+
+        Args:
+            text (str): Text to sign
+
+        Returns:
+            numpy.ndarray: num_perm minimum hash values
+        """
+        hashes = shingle_hashes(text, self.shingle_size)
+        if not len(hashes):
+            return np.full(self.num_perm, HASH_PRIME, dtype=np.uint64)
+        return ((hashes[:, None] * self.a + self.b) % HASH_PRIME).min(axis=0)
+
+    def find_near_duplicates(self, texts, threshold=0.85):
+        """
+        Find texts that nearly duplicate an earlier text
+
+        Args:
+            texts (list): Texts in document order
+            threshold (float): Minimum estimated Jaccard similarity of the shingle sets
+
+        Returns:
+            dict: Index of each duplicate mapped to the index of the earlier text it repeats
+        """
+        rows = self.num_perm // self.bands
+        buckets = [{} for _ in range(self.bands)]
+        signatures = []
+        duplicates = {}
+
+        for index, text in enumerate(texts):
+            signature = self.signature(text)
+            keys = [signature[band * rows:(band + 1) * rows].tobytes() for band in range(self.bands)]
+
+            # Texts sharing a band are candidates; confirm with the full signature
+            candidates = {buckets[band][key] for band, key in enumerate(keys) if key in buckets[band]}
+            match = next(
+                (
+                    candidate for candidate in sorted(candidates)
+                    if np.mean(signatures[candidate] == signature) >= threshold
+                ),
+                None
+            )
+            signatures.append(signature)
+            if match is not None:
+                duplicates[index] = match
+                continue
+
+            for band, key in enumerate(keys):
+                buckets[band].setdefault(key, index)
+
+        return duplicates
+
+def boilerplate_key(line):
+    """Normalize a line so page numbers and spacing don't hide repeats ("Page 3" == "Page 4")"""
+    return re.sub(r"\s+", " ", re.sub(r"\d+", "#", line.strip().lower()))
+
+def edge_lines(page_text, count=3):
+    """The first and last `count` non-empty lines of a page"""
+    lines = [line for line in page_text.splitlines() if line.strip()]
+    if len(lines) <= 2 * count:
+        return lines
+    return lines[:count] + lines[-count:]
+
+def find_boilerplate_lines(pages, min_fraction=0.5, edge_count=3, min_pages=3):
+    """
+    Find lines that recur at the top or bottom of many pages (headers, footers, banners)
+
+    Args:
+        pages (iterable): Page texts; consumed once, keeping only their edge lines
+        min_fraction (float): Fraction of pages a line must appear on
+        edge_count (int): Lines considered at the top and at the bottom of each page
+        min_pages (int): Minimum pages a line must appear on
+
+    Returns:
+        set: Normalized boilerplate lines (see boilerplate_key)
+    """
+    counts = Counter()
+    page_count = 0
+    for page_text in pages:
+        page_count += 1
+        counts.update({boilerplate_key(line) for line in edge_lines(page_text, edge_count)})
+
+    needed = max(min_pages, math.ceil(min_fraction * page_count))
+    return {key for key, count in counts.items() if count >= needed and key}
+
+def strip_boilerplate_lines(page_text, boilerplate, edge_count=3):
+    """
+    Remove boilerplate lines from the top and bottom of a page
+
+    Args:
+        page_text (str): Text of the page
+        boilerplate (set): Normalized lines from find_boilerplate_lines
+        edge_count (int): Lines considered at the top and at the bottom of the page
+
+    Returns:
+        tuple: (stripped text, list of removed lines)
+    """
+    if not boilerplate:
+        return page_text, []
+
+    lines = page_text.splitlines()
+    content = [i for i, line in enumerate(lines) if line.strip()]
+    edges = set(content[:edge_count] + content[-edge_count:])
+    removed = [i for i in sorted(edges) if boilerplate_key(lines[i]) in boilerplate]
+    if not removed:
+        return page_text, []
+
+    dropped = set(removed)
+    kept = [line for i, line in enumerate(lines) if i not in dropped]
+    return "\n".join(kept), [lines[i] for i in removed]
@@ -0,0 +1,164 @@
+import contextvars
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from app.utils.admission import current_client, current_priority, queued_since
+
+class _Task:
+    """A submitted callable waiting for a worker"""
+
+    def __init__(self, seq, fn, args, kwargs):
+        self.seq = seq
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.context = contextvars.copy_context()
+        self.head_since = None
+
+    def run(self):
+        # The wait for admission continues the wait this task had as the next
+        # task of its client, so ADMISSION_MAX_WAIT_SECONDS covers both
+        queued_since.set(self.head_since)
+        return self.fn(*self.args, **self.kwargs)
+
+class FairThreadPool:
+    """
+    Worker pool that picks queued tasks fairly across clients
+
+    A drop-in for ThreadPoolExecutor.submit/shutdown. Tasks wait in one queue
+    per (priority, client), taken from the submitting context (see
+    admission_identity), and idle workers take the next task the same way the
+    AdmissionController admits calls: highest priority first, then the client
+    served least recently. A document that submits all of its chunks at once
+    therefore does not hold back the calls of other clients behind it.
+
+    Tasks run in a copy of the submitting context.
+    """
+
+    # Clients whose last service time is remembered before idle ones are forgotten
+    MAX_TRACKED_CLIENTS = 4096
+
+    def __init__(self, max_workers, thread_name_prefix="fair-worker", default_priority=1):
+        """
+        Args:
+            max_workers (int): Number of worker threads, started as tasks arrive
+            thread_name_prefix (str): Prefix of the worker thread names
+            default_priority (int): Priority of tasks submitted without one
+        """
+        self.max_workers = max_workers
+        self.thread_name_prefix = thread_name_prefix
+        self.default_priority = default_priority
+
+        self._condition = threading.Condition()
+        self._queues = {}
+        self._seq = itertools.count()
+        self._service_order = itertools.count()
+        self._last_served = {}
+        self._threads = []
+        self._idle = 0
+        self._shutdown = False
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queue a callable for the current client
+
+        Args:
+            fn (callable): Function to run
+            *args: Positional arguments for fn
+            **kwargs: Keyword arguments for fn
+
+        Returns:
+            Future: Future holding the result of fn
+        """
+        client = current_client.get()
+        priority = current_priority.get()
+        if priority is None:
+            priority = self.default_priority
+
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new tasks after shutdown")
+            task = _Task(next(self._seq), fn, args, kwargs)
+            queue = self._queues.setdefault((priority, client), deque())
+            if not queue:
+                task.head_since = time.monotonic()
+            queue.append(task)
+
+            # Wake a waiting worker, or start one while below max_workers
+            if self._idle:
+                self._idle -= 1
+                self._condition.notify()
+            elif len(self._threads) < self.max_workers:
+                thread = threading.Thread(
+                    target=self._work, name=f"{self.thread_name_prefix}_{len(self._threads)}", daemon=True
+                )
+                self._threads.append(thread)
+                thread.start()
+        return task.future
+
+    def _next_task(self):
+        """Take the next task to run (caller holds the condition)"""
+        best_key, best_rank = None, None
+        for key, queue in self._queues.items():
+            priority, client = key
+            rank = (priority, self._last_served.get(client, -1), queue[0].seq)
+            if best_rank is None or rank < best_rank:
+                best_key, best_rank = key, rank
+
+        queue = self._queues[best_key]
+        task = queue.popleft()
+        if queue:
+            queue[0].head_since = time.monotonic()
+        else:
+            del self._queues[best_key]
+
+        self._last_served[best_key[1]] = next(self._service_order)
+        if len(self._last_served) > self.MAX_TRACKED_CLIENTS:
+            queued = {client for _, client in self._queues}
+            self._last_served = {
+                client: seq for client, seq in self._last_served.items() if client in queued
+            }
+        return task
+
+    def _work(self):
+        while True:
+            with self._condition:
+                # submit() takes a worker off the idle count when it wakes it
+                while not self._queues and not self._shutdown:
+                    self._idle += 1
+                    self._condition.wait()
+                if not self._queues:
+                    return
+                task = self._next_task()
+
+            if not task.future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = task.context.run(task.run)
+            except BaseException as e:
+                task.future.set_exception(e)
+            else:
+                task.future.set_result(result)
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        """
+        Stop accepting tasks; workers exit once the queues are empty
+
+        Args:
+            wait (bool): Whether to wait for the workers to exit
+            cancel_futures (bool): Whether to cancel the tasks not yet started
+        """
+        with self._condition:
+            self._shutdown = True
+            if cancel_futures:
+                for queue in self._queues.values():
+                    for task in queue:
+                        task.future.cancel()
+            self._condition.notify_all()
+            threads = list(self._threads)
+        if wait:
+            for thread in threads:
+                thread.join()
@@ -0,0 +1,368 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+class JobCancelled(Exception):
+    """Raised inside a job handler when the job has been cancelled"""
+
+class MemoryJobBackend:
+    """
+    In-process job store and queue
+
+    Jobs live only as long as the process, so this backend suits a single
+    worker process.
+    """
+
+    def __init__(self):
+        self._jobs = {}
+        self._payloads = {}
+        self._queue = deque()
+        self._condition = threading.Condition()
+
+    def submit(self, job, payload):
+        with self._condition:
+            self._jobs[job["id"]] = dict(job)
+            self._payloads[job["id"]] = payload
+            self._queue.append(job["id"])
+            self._condition.notify()
+
+    def claim(self, timeout):
+        """Take the next queued job, mark it running and return (job, payload)"""
+        deadline = time.time() + timeout
+        with self._condition:
+            while True:
+                while self._queue:
+                    job_id = self._queue.popleft()
+                    job = self._jobs.get(job_id)
+                    if job is None or job["status"] != QUEUED:
+                        continue
+                    job.update(status=RUNNING, started_at=time.time())
+                    return dict(job), self._payloads.pop(job_id, None)
+
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None, None
+                self._condition.wait(remaining)
+
+    def update(self, job_id, **fields):
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+
+    def get(self, job_id):
+        with self._condition:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def request_cancel(self, job_id):
+        """Flag a job for cancellation; queued jobs are cancelled immediately"""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job["status"] == QUEUED:
+                job.update(status=CANCELLED, finished_at=time.time())
+                self._payloads.pop(job_id, None)
+            elif job["status"] == RUNNING:
+                job["cancel_requested"] = True
+            return dict(job)
+
+    def is_cancel_requested(self, job_id):
+        with self._condition:
+            job = self._jobs.get(job_id)
+            return bool(job and job.get("cancel_requested"))
+
+    def purge(self, older_than):
+        """Drop finished jobs that completed before the given timestamp"""
+        with self._condition:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job["status"] in FINISHED_STATUSES and (job.get("finished_at") or 0) < older_than
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+class SQLiteJobBackend:
+    """
+    Job store and queue backed by a SQLite file
+
+    Several worker processes can share the same file; each claims queued jobs
+    with a conditional update so a job only runs once.
+    """
+
+    # Seconds between polls of the jobs table while the queue is empty
+    POLL_INTERVAL = 0.5
+
+    COLUMNS = (
+        "id", "type", "status", "progress", "stage", "params", "filename", "created_at",
+        "started_at", "finished_at", "error", "result", "cancel_requested"
+    )
+
+    def __init__(self, db_path):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, type TEXT NOT NULL, status TEXT NOT NULL, "
+            "progress REAL NOT NULL DEFAULT 0, stage TEXT, params TEXT, filename TEXT, "
+            "created_at REAL NOT NULL, started_at REAL, finished_at REAL, error TEXT, "
+            "result TEXT, cancel_requested INTEGER NOT NULL DEFAULT 0, payload BLOB)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+        self._db.commit()
+
+    def _row_to_job(self, row):
+        job = dict(zip(self.COLUMNS, row))
+        job["params"] = json.loads(job["params"]) if job["params"] else {}
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def submit(self, job, payload):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, type, status, progress, stage, params, filename, created_at, payload) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job["id"], job["type"], job["status"], job["progress"], job["stage"],
+                 json.dumps(job["params"]), job["filename"], job["created_at"], payload)
+            )
+            self._db.commit()
+
+    def claim(self, timeout):
+        """Take the next queued job, mark it running and return (job, payload)"""
+        deadline = time.time() + timeout
+        while True:
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+                ).fetchone()
+                if row is not None:
+                    claimed = self._db.execute(
+                        "UPDATE jobs SET status = ?, started_at = ? WHERE id = ? AND status = ?",
+                        (RUNNING, time.time(), row[0], QUEUED)
+                    ).rowcount
+                    self._db.commit()
+                    if claimed:
+                        job_row = self._db.execute(
+                            f"SELECT {', '.join(self.COLUMNS)}, payload FROM jobs WHERE id = ?", (row[0],)
+                        ).fetchone()
+                        # The payload is only needed once; don't keep uploads around
+                        self._db.execute("UPDATE jobs SET payload = NULL WHERE id = ?", (row[0],))
+                        self._db.commit()
+                        return self._row_to_job(job_row[:-1]), job_row[-1]
+                    continue
+
+            if time.time() >= deadline:
+                return None, None
+            time.sleep(self.POLL_INTERVAL)
+
+    def update(self, job_id, **fields):
+        if not fields:
+            return
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        if "params" in fields:
+            fields["params"] = json.dumps(fields["params"])
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self._db.commit()
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._row_to_job(row) if row is not None else None
+
+    def request_cancel(self, job_id):
+        """Flag a job for cancellation; queued jobs are cancelled immediately"""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, payload = NULL WHERE id = ? AND status = ?",
+                (CANCELLED, time.time(), job_id, QUEUED)
+            )
+            self._db.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?", (job_id, RUNNING)
+            )
+            self._db.commit()
+        return self.get(job_id)
+
+    def is_cancel_requested(self, job_id):
+        with self._lock:
+            row = self._db.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def purge(self, older_than):
+        """Drop finished jobs that completed before the given timestamp"""
+        with self._lock:
+            self._db.execute(
+                f"DELETE FROM jobs WHERE status IN ({', '.join('?' for _ in FINISHED_STATUSES)}) "
+                "AND finished_at < ?",
+                (*FINISHED_STATUSES, older_than)
+            )
+            self._db.commit()
+
+class JobContext:
+    """
+    Handle passed to job handlers for reporting progress and observing cancellation
+    """
+
+    def __init__(self, manager, job_id):
+        self._manager = manager
+        self.job_id = job_id
+
+    def check_cancelled(self):
+        """Raise JobCancelled if the job has been cancelled"""
+        if self._manager.backend.is_cancel_requested(self.job_id):
+            raise JobCancelled(self.job_id)
+
+    def report(self, progress=None, stage=None):
+        """
+        Record progress and give the job a chance to stop if it was cancelled
+
+        Args:
+            progress (float, optional): Completion fraction between 0 and 1
+            stage (str, optional): Name of the current pipeline stage
+        """
+        fields = {}
+        if progress is not None:
+            fields["progress"] = round(min(max(progress, 0.0), 1.0), 4)
+        if stage is not None:
+            fields["stage"] = stage
+        if fields:
+            self._manager.backend.update(self.job_id, **fields)
+        self.check_cancelled()
+
+class JobManager:
+    """
+    Background worker pool executing long-running jobs from a pluggable backend
+    """
+
+    def __init__(self, backend, workers=2, retention_seconds=3600):
+        """
+        Args:
+            backend: MemoryJobBackend, SQLiteJobBackend or a compatible object
+            workers (int): Number of worker threads
+            retention_seconds (float): How long finished jobs remain queryable
+        """
+        self.backend = backend
+        self.workers = workers
+        self.retention_seconds = retention_seconds
+        self._handlers = {}
+        self._threads = []
+        self._stopping = threading.Event()
+
+    def register(self, job_type, handler):
+        """
+        Register the handler for a job type
+
+        Args:
+            job_type (str): Job type name
+            handler (callable): Called as handler(payload, filename, params, context)
+                and returns a JSON-serializable result
+        """
+        self._handlers[job_type] = handler
+
+    @property
+    def job_types(self):
+        return sorted(self._handlers)
+
+    def start(self):
+        """Start the worker threads"""
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Ask the worker threads to exit after their current job"""
+        self._stopping.set()
+
+    def submit(self, job_type, payload, filename=None, params=None):
+        """
+        Queue a job
+
+        Args:
+            job_type (str): Registered job type
+            payload (bytes): Uploaded file content
+            filename (str, optional): Original file name
+            params (dict, optional): Job parameters
+
+        Returns:
+            dict: The queued job record
+        """
+        if job_type not in self._handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+
+        now = time.time()
+        self.backend.purge(now - self.retention_seconds)
+
+        job = {
+            "id": uuid.uuid4().hex,
+            "type": job_type,
+            "status": QUEUED,
+            "progress": 0.0,
+            "stage": "queued",
+            "params": params or {},
+            "filename": filename,
+            "created_at": now,
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+            "result": None,
+            "cancel_requested": False
+        }
+        self.backend.submit(job, payload)
+        return job
+
+    def get(self, job_id):
+        """Get a job record, or None if it is unknown"""
+        return self.backend.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a job; running jobs stop at their next progress report"""
+        return self.backend.request_cancel(job_id)
+
+    def _work(self):
+        while not self._stopping.is_set():
+            job, payload = self.backend.claim(timeout=1.0)
+            if job is None:
+                continue
+            self._run(job, payload)
+
+    def _run(self, job, payload):
+        job_id = job["id"]
+        context = JobContext(self, job_id)
+        try:
+            context.report(stage="running")
+            result = self._handlers[job["type"]](payload, job["filename"], job["params"], context)
+            self.backend.update(
+                job_id, status=SUCCEEDED, progress=1.0, stage="done", result=result,
+                finished_at=time.time()
+            )
+        except JobCancelled:
+            self.backend.update(job_id, status=CANCELLED, stage="cancelled", finished_at=time.time())
+        except Exception as e:
+            print(f"Error in job {job_id}: {str(e)}")
+            self.backend.update(
+                job_id, status=FAILED, stage="failed", error=str(e), finished_at=time.time()
+            )
@@ -0,0 +1,230 @@
+import json
+
+OPENERS = {"{": "}", "[": "]"}
+
+# Characters that may follow a closing quote of an object key or value
+KEY_TERMINATORS = {":"}
+VALUE_TERMINATORS = {",", "}", "]"}
+
+# Characters that can start a JSON value inside an array
+VALUE_STARTS = set('"{[-0123456789tfn')
+
+def _next_significant(text, index):
+    """Index of the next non-whitespace character at or after index (len(text) if none)"""
+    length = len(text)
+    while index < length and text[index] in " \t\r\n":
+        index += 1
+    return index
+
+def _closes_string(text, index, is_key, container):
+    """
+    Decide whether the quote at text[index] ends the current string
+
+    Models often emit quotes inside strings without escaping them
+    ("He said "yes" to it"). A quote only closes the string when what follows
+    could legally follow a key or value.
+    """
+    after = _next_significant(text, index + 1)
+    if after >= len(text):
+        return True
+    char = text[after]
+    if is_key:
+        return char in KEY_TERMINATORS
+    if char not in VALUE_TERMINATORS:
+        return False
+    if char != ",":
+        return True
+    # After a comma an object expects a key and an array expects a value
+    following = _next_significant(text, after + 1)
+    if following >= len(text):
+        return True
+    # A closer right after the comma is a trailing comma
+    if container == "{":
+        return text[following] in '"}'
+    return text[following] in VALUE_STARTS or text[following] == "]"
+
+def _scan(text, start):
+    """
+    Scan one JSON value starting at text[start], repairing it on the way
+
+    The scan is a single pass that tracks the open containers and whether the
+    current string is a key. It escapes stray quotes and raw newlines inside
+    strings, drops trailing commas and, if the text ends early, closes the
+    value at the last complete element.
+
+    Returns:
+        tuple: (repaired text or None, index just past the scanned value)
+    """
+    out = []
+    stack = []  # entries: [opener, expecting_key]
+    in_string = False
+    is_key = False
+    escaped = False
+    # Output length after the last complete element; the open containers only
+    # change at points that also move it, so the stack still describes it
+    safe = 0
+    index = start
+    length = len(text)
+
+    while index < length:
+        char = text[index]
+
+        if in_string:
+            if escaped:
+                escaped = False
+                out.append(char)
+            elif char == "\\":
+                escaped = True
+                out.append(char)
+            elif char == '"':
+                if _closes_string(text, index, is_key, stack[-1][0] if stack else None):
+                    in_string = False
+                    out.append(char)
+                    if not is_key:
+                        safe = len(out)
+                    if not stack:
+                        return "".join(out), index + 1
+                else:
+                    out.append('\\"')
+            elif char == "\n":
+                out.append("\\n")
+            else:
+                out.append(char)
+            index += 1
+            continue
+
+        if char == '"':
+            in_string = True
+            is_key = bool(stack) and stack[-1][0] == "{" and stack[-1][1]
+            out.append(char)
+        elif char in OPENERS:
+            stack.append([char, char == "{"])
+            out.append(char)
+            safe = len(out)
+        elif char in "}]":
+            if not stack or OPENERS[stack[-1][0]] != char:
+                # Unbalanced closer: the candidate is not JSON
+                return None, index + 1
+            # Drop a trailing comma before the closer
+            while out and out[-1] in " \t\r\n":
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            stack.pop()
+            out.append(char)
+            safe = len(out)
+            if not stack:
+                return "".join(out), index + 1
+        elif char == ":":
+            if stack and stack[-1][0] == "{":
+                stack[-1][1] = False
+            out.append(char)
+        elif char == ",":
+            if stack and stack[-1][0] == "{":
+                stack[-1][1] = True
+            out.append(char)
+        else:
+            out.append(char)
+            # A number or literal is complete once a delimiter follows it; at the
+            # end of the text it may have been cut (12 of 125)
+            if char not in " \t\r\n" and index + 1 < length and text[index + 1] in ",}] \t\r\n":
+                safe = len(out)
+        index += 1
+
+    # The text ended inside the value, e.g. truncated at max_gen_len
+    if in_string and not is_key:
+        if escaped:
+            out.pop()
+        out.append('"')
+        return "".join(out) + "".join(OPENERS[entry[0]] for entry in reversed(stack)), length
+
+    if not safe:
+        return None, length
+    repaired = "".join(out[:safe]).rstrip()
+    if repaired.endswith(","):
+        repaired = repaired[:-1]
+    return repaired + "".join(OPENERS[entry[0]] for entry in reversed(stack)), length
+
+def _is_record(value, keys):
+    return isinstance(value, dict) and (keys is None or any(key in value for key in keys))
+
+def _usable(value, expect, keys):
+    """
+    Whether a parsed value is worth returning
+
+    Empty containers are what the repairs make of truncated junk ("{" or
+    'Sure: {"ti' both become {}), so they never count as a result.
+    """
+    if expect is not None and not isinstance(value, expect):
+        return False
+    if isinstance(value, dict):
+        return bool(value) and _is_record(value, keys)
+    if isinstance(value, list):
+        return bool(value) and (keys is None or any(_is_record(item, keys) for item in value))
+    return True
+
+def extract_json(text, expect=None, keys=None):
+    """
+    Extract a JSON object or array from model output, repairing common defects
+
+    Handles markdown fences and leading or trailing prose, truncation at
+    max_gen_len, trailing commas, unescaped quotes and raw newlines inside
+    strings. Runs in time linear in the length of the text. Empty objects and
+    arrays are skipped.
+
+    Args:
+        text (str): Raw model output
+        expect (type, optional): dict or list; values of another type are skipped
+        keys (iterable, optional): Expected object keys; objects with none of
+            them, and arrays holding no such object, are skipped
+
+    Returns:
+        The parsed value, or None if nothing usable was found
+    """
+    if not text:
+        return None
+
+    # Well-formed output needs no scanning
+    try:
+        value = json.loads(text)
+        if _usable(value, expect, keys):
+            return value
+    except (ValueError, RecursionError):
+        pass
+
+    openers = {"{"} if expect is dict else {"["} if expect is list else set(OPENERS)
+    index = 0
+    length = len(text)
+    while index < length:
+        if text[index] not in openers:
+            index += 1
+            continue
+
+        candidate, end = _scan(text, index)
+        if candidate is not None:
+            try:
+                value = json.loads(candidate, strict=False)
+                if _usable(value, expect, keys):
+                    return value
+            except (ValueError, RecursionError):
+                pass
+        # Continue after the scanned value so every character is scanned once
+        index = max(end, index + 1)
+
+    return None
+
+def extract_json_from_text(text, keys=None):
+    """
+    Extract a JSON object from text that may contain markdown code blocks or other text
+
+    Args:
+        text (str): Text potentially containing JSON
+        keys (iterable, optional): Expected keys, at least one of which must be present
+
+    Returns:
+        dict: Extracted JSON object or error
+    """
+    value = extract_json(text, expect=dict, keys=keys)
+    if value is None:
+        return {"error": "Could not extract valid JSON from response"}
+    return value
@@ -0,0 +1,185 @@
+import os
+import threading
+from collections import deque
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+def current_rss_bytes():
+    """
+    Resident set size of this process
+
+    Returns:
+        int: RSS in bytes, or None where /proc is not available
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+def peak_rss_bytes():
+    """
+    Peak resident set size of this process since it started
+
+    Returns:
+        int: Peak RSS in bytes, or None if it cannot be determined
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class UploadMetrics:
+    """
+    Counters and gauges describing the memory held by uploads in flight
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {
+            "uploads": 0,
+            "spooled": 0,
+            "rejected": 0,
+            "bytes_received": 0,
+            "in_flight": 0,
+            "in_memory_bytes": 0,
+            "peak_in_memory_bytes": 0,
+            "largest_upload_bytes": 0
+        }
+
+    def admitted(self, size, in_memory):
+        """
+        Record an upload that was read completely
+
+        Args:
+            size (int): Upload size in bytes
+            in_memory (bool): Whether the content is held in memory rather than spooled
+        """
+        with self._lock:
+            stats = self._stats
+            stats["uploads"] += 1
+            stats["bytes_received"] += size
+            stats["in_flight"] += 1
+            stats["largest_upload_bytes"] = max(stats["largest_upload_bytes"], size)
+            if in_memory:
+                stats["in_memory_bytes"] += size
+                stats["peak_in_memory_bytes"] = max(stats["peak_in_memory_bytes"], stats["in_memory_bytes"])
+            else:
+                stats["spooled"] += 1
+
+    def released(self, size, in_memory):
+        """Record that the request owning an admitted upload has finished with it"""
+        with self._lock:
+            self._stats["in_flight"] -= 1
+            if in_memory:
+                self._stats["in_memory_bytes"] -= size
+
+    def rejected(self):
+        """Record an upload refused for its size or page count"""
+        with self._lock:
+            self._stats["rejected"] += 1
+
+    def stats(self):
+        """
+        Report the upload counters together with the process memory usage
+
+        Returns:
+            dict: Upload statistics
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats["rss_bytes"] = current_rss_bytes()
+        stats["peak_rss_bytes"] = peak_rss_bytes()
+        return stats
+
+class StageMetrics:
+    """
+    Latency and token counters of the model calls of each pipeline stage
+
+    Latencies of the most recent calls are kept per stage for percentiles, so
+    the model and generation length of a stage can be tuned against what they cost.
+    """
+
+    def __init__(self, window=1024):
+        self._lock = threading.Lock()
+        self._window = window
+        self._stages = {}
+
+    def _stage(self, stage):
+        entry = self._stages.get(stage)
+        if entry is None:
+            entry = self._stages[stage] = {
+                "model_id": None,
+                "calls": 0,
+                "cache_hits": 0,
+                "unusable": 0,
+                "errors": 0,
+                "prompt_tokens": 0,
+                "generation_tokens": 0,
+                "latency_seconds": 0.0,
+                "recent": deque(maxlen=self._window)
+            }
+        return entry
+
+    def record(self, stage, model_id, seconds, prompt_tokens=None, generation_tokens=None):
+        """
+        Record a completed model call
+
+        Args:
+            stage (str): Pipeline stage
+            model_id (str): Bedrock model that served the call
+            seconds (float): Latency of the call
+            prompt_tokens (int, optional): Prompt tokens reported by Bedrock
+            generation_tokens (int, optional): Generated tokens reported by Bedrock
+        """
+        with self._lock:
+            entry = self._stage(stage)
+            entry["model_id"] = model_id
+            entry["calls"] += 1
+            entry["prompt_tokens"] += prompt_tokens or 0
+            entry["generation_tokens"] += generation_tokens or 0
+            entry["latency_seconds"] += seconds
+            entry["recent"].append(seconds)
+
+    def count(self, stage, event):
+        """
+        Count a cache hit or failed attempt
+
+        Args:
+            stage (str): Pipeline stage
+            event (str): 'cache_hits', 'unusable' or 'errors'
+        """
+        with self._lock:
+            self._stage(stage)[event] += 1
+
+    def stats(self):
+        """
+        Report the counters of every stage with latency percentiles and throughput
+
+        Returns:
+            dict: Statistics keyed by stage
+        """
+        with self._lock:
+            stages = {
+                stage: (dict(entry), sorted(entry["recent"]))
+                for stage, entry in self._stages.items()
+            }
+
+        report = {}
+        for stage, (entry, recent) in stages.items():
+            del entry["recent"]
+            total = entry.pop("latency_seconds")
+            entry["latency_seconds"] = {
+                "mean": round(total / entry["calls"], 3) if entry["calls"] else None,
+                "p50": round(recent[len(recent) // 2], 3) if recent else None,
+                "p95": round(recent[min(len(recent) - 1, int(len(recent) * 0.95))], 3) if recent else None,
+                "max": round(recent[-1], 3) if recent else None
+            }
+            entry["generation_tokens_per_second"] = (
+                round(entry["generation_tokens"] / total, 1) if total > 0 else None
+            )
+            report[stage] = entry
+        return report
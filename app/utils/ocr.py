@@ -0,0 +1,44 @@
+from abc import ABC, abstractmethod
+import boto3
+
+class OCRBackend(ABC):
+    """
+    Interface for OCR engines
+
+    Implementations turn an encoded image (PNG, JPEG, ...) into its lines of
+    text. A local stand-in can replace Textract by implementing detect_lines.
+    """
+
+    name = "ocr"
+
+    @abstractmethod
+    def detect_lines(self, image_bytes):
+        """
+        Recognize the text of an image
+
+        Args:
+            image_bytes (bytes): Encoded image
+
+        Returns:
+            list: Lines of text in reading order
+        """
+
+class TextractOCRBackend(OCRBackend):
+    """
+    OCR with AWS Textract's synchronous detect_document_text API
+    """
+
+    name = "textract"
+
+    def __init__(self, client=None):
+        """
+        Args:
+            client (optional): boto3 Textract client; a new client is created
+                for every call when omitted
+        """
+        self.client = client
+
+    def detect_lines(self, image_bytes):
+        textract = self.client if self.client is not None else boto3.client('textract')
+        response = textract.detect_document_text(Document={'Bytes': image_bytes})
+        return [item['Text'] for item in response['Blocks'] if item['BlockType'] == 'LINE']
@@ -0,0 +1,226 @@
+import gzip
+import itertools
+import json
+import zlib
+from flask import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Encoder shared by every response: compact separators, keys in insertion order
+_ENCODER = json.JSONEncoder(separators=(",", ":"))
+
+def parse_field_list(value):
+    """
+    Parse a comma-separated list of dotted field paths from a query parameter
+
+    Args:
+        value (str): Parameter value, e.g. "summary,stats.memoization"
+
+    Returns:
+        list: Paths as tuples of keys, or None if the parameter is absent or empty
+    """
+    if not value:
+        return None
+    paths = [tuple(part for part in field.strip().split(".") if part) for field in value.split(",")]
+    return [path for path in paths if path] or None
+
+def _pick(payload, path):
+    value = payload
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            return False, None
+        value = value[key]
+    return True, value
+
+def _place(target, path, value):
+    for key in path[:-1]:
+        target = target.setdefault(key, {})
+    target[path[-1]] = value
+
+def _drop(payload, path):
+    """Return a copy of payload without path, copying only the dicts along it"""
+    if not isinstance(payload, dict) or path[0] not in payload:
+        return payload
+    trimmed = dict(payload)
+    if len(path) == 1:
+        del trimmed[path[0]]
+    else:
+        trimmed[path[0]] = _drop(payload[path[0]], path[1:])
+    return trimmed
+
+def select_fields(payload, fields=None, exclude=None):
+    """
+    Keep only the requested fields of a response payload, or drop unwanted ones
+
+    The payload itself is never modified, since it may be shared with the
+    result cache. An "error" key is always kept so failures stay visible.
+
+    Args:
+        payload: Response payload
+        fields (list, optional): Paths to keep (see parse_field_list)
+        exclude (list, optional): Paths to remove
+
+    Returns:
+        The shaped payload
+    """
+    if not isinstance(payload, dict):
+        return payload
+
+    if fields:
+        selected = {}
+        for path in list(fields) + [("error",)]:
+            found, value = _pick(payload, path)
+            if found:
+                _place(selected, path, value)
+        payload = selected
+
+    for path in exclude or ():
+        payload = _drop(payload, path)
+    return payload
+
+def negotiate_encoding(accept_encoding):
+    """
+    Choose a response encoding from an Accept-Encoding header
+
+    Args:
+        accept_encoding (str): Header value, e.g. "gzip, deflate, br;q=0.9"
+
+    Returns:
+        str: "br", "gzip" or None for an uncompressed response
+    """
+    supported = ("br", "gzip") if brotli is not None else ("gzip",)
+    best, best_quality = None, 0.0
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        candidates = supported if name == "*" else (name,) if name in supported else ()
+        for candidate in candidates:
+            # Prefer brotli on equal quality since it compresses JSON better
+            if quality > best_quality or (quality == best_quality and quality > 0 and candidate == "br"):
+                best, best_quality = candidate, quality
+    return best
+
+class _StreamCompressor:
+    """Incremental gzip or brotli compressor with one interface"""
+
+    def __init__(self, encoding, level):
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=level)
+            self._compress = self._compressor.process
+            self._flush = self._compressor.finish
+        else:
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+            self._compress = self._compressor.compress
+            self._flush = self._compressor.flush
+
+    def compress(self, data):
+        return self._compress(data)
+
+    def flush(self):
+        return self._flush()
+
+def compress_body(body, encoding, level):
+    """
+    Compress a complete response body
+
+    Args:
+        body (bytes): Response body
+        encoding (str): "br" or "gzip"
+        level (int): Brotli quality (0-11) or gzip level (1-9)
+
+    Returns:
+        bytes: Compressed body
+    """
+    if encoding == "br":
+        return brotli.compress(body, quality=level)
+    return gzip.compress(body, compresslevel=level)
+
+def iter_json(payload, chunk_size=64 * 1024):
+    """
+    Serialize a payload to JSON incrementally
+
+    Args:
+        payload: JSON-serializable value
+        chunk_size (int): Approximate number of characters per yielded piece
+
+    Yields:
+        str: Consecutive pieces of the JSON document
+    """
+    buffer = []
+    buffered = 0
+    for piece in _ENCODER.iterencode(payload):
+        buffer.append(piece)
+        buffered += len(piece)
+        if buffered >= chunk_size:
+            yield "".join(buffer)
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield "".join(buffer)
+
+def json_response(payload, status=200, encoding=None, gzip_level=6, brotli_quality=5,
+                  min_compress_bytes=1024, stream_threshold=1024 * 1024, chunk_size=64 * 1024):
+    """
+    Build a JSON response, compressed and streamed when it is large
+
+    Serialization stops buffering once the body passes stream_threshold; the
+    rest is serialized (and compressed) while it is being sent, so a large body
+    never exists as a whole in memory.
+
+    Args:
+        payload: JSON-serializable response payload
+        status (int): HTTP status code
+        encoding (str, optional): "br" or "gzip" as chosen by negotiate_encoding
+        gzip_level (int): gzip compression level
+        brotli_quality (int): Brotli quality
+        min_compress_bytes (int): Smaller bodies are sent uncompressed
+        stream_threshold (int): Bodies larger than this are streamed
+        chunk_size (int): Size of the streamed pieces
+
+    Returns:
+        Response: Flask response
+    """
+    level = brotli_quality if encoding == "br" else gzip_level
+    pieces = iter_json(payload, chunk_size)
+    head = []
+    size = 0
+    for piece in pieces:
+        head.append(piece)
+        size += len(piece)
+        if size > stream_threshold:
+            break
+    else:
+        body = "".join(head).encode("utf-8")
+        response = Response(body, status=status, mimetype="application/json")
+        if encoding and len(body) >= min_compress_bytes:
+            response.set_data(compress_body(body, encoding, level))
+            response.headers["Content-Encoding"] = encoding
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+    def generate():
+        compressor = _StreamCompressor(encoding, level) if encoding else None
+        for piece in itertools.chain(head, pieces):
+            data = piece.encode("utf-8")
+            if compressor is not None:
+                data = compressor.compress(data)
+            if data:
+                yield data
+        if compressor is not None:
+            yield compressor.flush()
+
+    response = Response(generate(), status=status, mimetype="application/json")
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
@@ -0,0 +1,106 @@
+import random
+import threading
+
+class RetryBudget:
+    """
+    Process-wide token bucket limiting how many retries may be issued
+
+    Every retry withdraws one token and every successful call deposits
+    `refill_per_success` tokens, so under sustained failure retries are capped at
+    roughly that fraction of successful traffic instead of multiplying load.
+    """
+
+    def __init__(self, capacity=20, refill_per_success=0.1):
+        """
+        Args:
+            capacity (float): Maximum number of tokens (and the initial balance)
+            refill_per_success (float): Tokens deposited per successful call
+        """
+        self.capacity = float(capacity)
+        self.refill_per_success = refill_per_success
+        self._tokens = float(capacity)
+        self._lock = threading.Lock()
+
+    def try_acquire(self, cost=1.0):
+        """
+        Withdraw tokens for a retry
+
+        Args:
+            cost (float): Tokens the retry costs
+
+        Returns:
+            bool: True if the retry may proceed
+        """
+        with self._lock:
+            if self._tokens < cost:
+                return False
+            self._tokens -= cost
+            return True
+
+    def record_success(self):
+        """Deposit tokens after a successful call"""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + self.refill_per_success)
+
+    @property
+    def available(self):
+        with self._lock:
+            return self._tokens
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter, sharing a RetryBudget across callers
+    """
+
+    def __init__(self, max_attempts=3, base_delay=0.5, throttle_base_delay=2.0, max_delay=20.0,
+                 budget=None):
+        """
+        Args:
+            max_attempts (int): Attempts per call, including the first one
+            base_delay (float): Backoff base in seconds for transient errors and empty output
+            throttle_base_delay (float): Backoff base in seconds after a throttling error
+            max_delay (float): Upper bound of a single backoff in seconds
+            budget (RetryBudget, optional): Shared retry budget
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.throttle_base_delay = throttle_base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+
+    def backoff(self, attempt, throttled=False):
+        """
+        Compute the delay before the next attempt
+
+        Args:
+            attempt (int): Number of attempts made so far (1 after the first failure)
+            throttled (bool): Whether the last failure was a throttling error
+
+        Returns:
+            float: Delay in seconds
+        """
+        base = self.throttle_base_delay if throttled else self.base_delay
+        return random.uniform(0, min(self.max_delay, base * (2 ** (attempt - 1))))
+
+    def allow_retry(self, attempt, throttled=False):
+        """
+        Decide whether another attempt may be made
+
+        Args:
+            attempt (int): Number of attempts made so far
+            throttled (bool): Whether the last failure was a throttling error
+
+        Returns:
+            bool: True if the caller should retry
+        """
+        if attempt >= self.max_attempts:
+            return False
+        if self.budget is None:
+            return True
+        # Retrying into throttling adds load where it hurts most, so it costs more
+        return self.budget.try_acquire(2.0 if throttled else 1.0)
+
+    def record_success(self):
+        """Report a successful call to the shared budget"""
+        if self.budget is not None:
+            self.budget.record_success()
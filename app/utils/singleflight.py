@@ -0,0 +1,94 @@
+import threading
+
+class _Call:
+    """One in-flight computation and the outcome its followers wait for"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Run at most one computation per key at a time
+
+    The first caller for a key (the leader) runs the computation; callers
+    arriving while it runs wait for it and receive the same result or
+    exception. The key is released as soon as the computation ends, whether it
+    succeeded or not, so a failure is never remembered beyond the callers that
+    were already waiting for it.
+    """
+
+    # How often a waiting follower calls its on_wait hook, in seconds
+    WAIT_POLL_SECONDS = 0.5
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {
+            "computations": 0,
+            "shared": 0,
+            "failures": 0
+        }
+
+    def do(self, key, func, retry_on=(), on_wait=None):
+        """
+        Run func once for all concurrent callers with the same key
+
+        Args:
+            key (str): Identity of the computation
+            func (callable): Computation taking no arguments
+            retry_on (tuple): Exception types that end the leader's computation
+                without answering for the followers (e.g. cancellation of the
+                leader's job); a follower then starts the computation itself
+            on_wait (callable, optional): Called every WAIT_POLL_SECONDS while this
+                caller waits as a follower; an exception it raises (e.g.
+                JobCancelled) ends the wait, leaving the leader running
+
+        Returns:
+            tuple: (result, shared) where shared is True if another caller computed it.
+                A shared result is the same object for every caller and must not be mutated.
+        """
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                    self._stats["computations"] += 1
+
+            if leader:
+                try:
+                    call.result = func()
+                    return call.result, False
+                except BaseException as e:
+                    call.error = e
+                    with self._lock:
+                        self._stats["failures"] += 1
+                    raise
+                finally:
+                    with self._lock:
+                        if self._calls.get(key) is call:
+                            del self._calls[key]
+                    call.done.set()
+
+            while not call.done.wait(self.WAIT_POLL_SECONDS if on_wait is not None else None):
+                on_wait()
+            if call.error is None:
+                with self._lock:
+                    self._stats["shared"] += 1
+                return call.result, True
+            if not isinstance(call.error, retry_on):
+                raise call.error
+
+    def stats(self):
+        """
+        Report how many computations ran and how many callers shared one
+
+        Returns:
+            dict: Coalescing statistics
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._calls)
+        return stats
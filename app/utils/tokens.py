@@ -0,0 +1,97 @@
+import math
+import threading
+
+try:
+    from tokenizers import Tokenizer
+except ImportError:
+    Tokenizer = None
+
+class TokenCounter:
+    """
+    Count Llama 3 tokens with a local tokenizer, or estimate them from text length
+
+    Without a tokenizer the estimate starts from a fixed characters-per-token
+    ratio and is calibrated against the prompt token counts Bedrock reports.
+    """
+
+    # Reported tokens needed before the observed ratio replaces the configured one
+    MIN_CALIBRATION_TOKENS = 2000
+
+    def __init__(self, tokenizer_path=None, chars_per_token=3.8):
+        """
+        Args:
+            tokenizer_path (str, optional): Llama 3 tokenizer.json loaded with the
+                optional `tokenizers` package
+            chars_per_token (float): Initial characters-per-token ratio of the estimator
+        """
+        self.tokenizer = None
+        self.chars_per_token = chars_per_token
+        self._observed_chars = 0
+        self._observed_tokens = 0
+        self._lock = threading.Lock()
+
+        if tokenizer_path:
+            if Tokenizer is None:
+                print("The tokenizers package is not installed; estimating token counts")
+            else:
+                try:
+                    self.tokenizer = Tokenizer.from_file(tokenizer_path)
+                except Exception as e:
+                    print(f"Could not load tokenizer from {tokenizer_path}: {str(e)}")
+
+    @property
+    def exact(self):
+        return self.tokenizer is not None
+
+    @property
+    def ratio(self):
+        """Characters per token used by the estimator"""
+        with self._lock:
+            if self._observed_tokens >= self.MIN_CALIBRATION_TOKENS:
+                return self._observed_chars / self._observed_tokens
+        return self.chars_per_token
+
+    def count(self, text):
+        """
+        Count the tokens of a text
+
+        Args:
+            text (str): Text to measure
+
+        Returns:
+            int: Exact token count with a tokenizer, otherwise an estimate
+        """
+        if not text:
+            return 0
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+        return int(math.ceil(len(text) / self.ratio))
+
+    def observe(self, text, token_count):
+        """
+        Calibrate the estimator against a token count reported by the model
+
+        Args:
+            text (str): Text that was sent (e.g. the formatted prompt)
+            token_count (int): Tokens the model counted for it
+        """
+        if self.tokenizer is not None or not text or not token_count:
+            return
+        with self._lock:
+            self._observed_chars += len(text)
+            self._observed_tokens += token_count
+
+    def stats(self):
+        """
+        Report how token counts are obtained
+
+        Returns:
+            dict: Counter mode, ratio and calibration sample size
+        """
+        with self._lock:
+            observed = self._observed_tokens
+        return {
+            "mode": "tokenizer" if self.exact else "estimate",
+            "chars_per_token": None if self.exact else round(self.ratio, 3),
+            "calibration_tokens": observed
+        }
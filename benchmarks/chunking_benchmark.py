@@ -0,0 +1,76 @@
+"""
+Benchmark smart_chunk_text with the available sentence segmentation pipelines
+
+Usage:
+    python benchmarks/chunking_benchmark.py [--paragraphs 4000] [--max-words 400]
+
+Modes whose model is not installed (en_core_web_sm for 'full' and 'senter')
+are reported as skipped.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import spacy
+from app.extensions import load_sentence_segmenter
+from app.services.summarization_service import smart_chunk_text
+
+WORDS = (
+    "model data analysis system result method process network learning value "
+    "student research study theory paper function energy signal structure design"
+).split()
+
+def build_document(paragraphs, seed=0):
+    """Build a synthetic document of short paragraphs of random sentences"""
+    rng = random.Random(seed)
+    text = []
+    for _ in range(paragraphs):
+        sentences = []
+        for _ in range(rng.randint(3, 7)):
+            words = [rng.choice(WORDS) for _ in range(rng.randint(8, 24))]
+            sentences.append(" ".join(words).capitalize() + ".")
+        text.append(" ".join(sentences))
+    return "\n\n".join(text)
+
+def load_pipeline(mode):
+    if mode == "full":
+        nlp = spacy.load("en_core_web_sm")
+        # The full pipeline refuses long inputs unless max_length is raised
+        nlp.max_length = 10000000
+        return nlp
+    if mode == "senter":
+        # Don't let load_sentence_segmenter fall back silently
+        spacy.load("en_core_web_sm")
+    return load_sentence_segmenter(mode)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--paragraphs", type=int, default=4000)
+    parser.add_argument("--max-words", type=int, default=400)
+    args = parser.parse_args()
+
+    text = build_document(args.paragraphs)
+    print(f"Document: {len(text):,} characters, {len(text.split()):,} words")
+
+    baseline = None
+    for mode in ("full", "senter", "sentencizer"):
+        try:
+            nlp = load_pipeline(mode)
+        except (OSError, ValueError) as e:
+            print(f"{mode:>12}: skipped ({str(e).splitlines()[0]})")
+            continue
+
+        start = time.perf_counter()
+        chunks = smart_chunk_text(text, max_words=args.max_words, nlp=nlp)
+        elapsed = time.perf_counter() - start
+
+        baseline = baseline or elapsed
+        print(f"{mode:>12}: {elapsed:8.2f}s  {len(chunks):5d} chunks  {baseline / elapsed:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Compare the tolerant JSON extractor with the previous extract_json_from_text
+
+Usage:
+    python benchmarks/json_extraction_benchmark.py [--repeat 2000]
+
+Every sample in CORPUS is a malformed generation of the kind Llama 3 returns
+(prose around the JSON, fences, truncation at max_gen_len, trailing commas,
+unescaped quotes). A sample the extractor cannot recover costs a full retry of
+the model call.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.utils.json_utils import extract_json
+
+# (generation, expected type, expected value)
+CORPUS = [
+    ('{"title": "Thermodynamics", "overview": "Heat and work"}', dict,
+     {"title": "Thermodynamics", "overview": "Heat and work"}),
+    ('Here is the summary:\n```json\n{"title": "X", "main_points": ["a", "b",],}\n```\nHope this helps!', dict,
+     {"title": "X", "main_points": ["a", "b"]}),
+    ('{"answer": "Newton called it "fluxions" in his notes", "marks": 5}', dict,
+     {"answer": 'Newton called it "fluxions" in his notes', "marks": 5}),
+    ('{"answer": "She said "no", then explained why", "marks": 2}', dict,
+     {"answer": 'She said "no", then explained why', "marks": 2}),
+    ('{"title": "Cells", "overview": "The cell is the basic unit of life and', dict,
+     {"title": "Cells", "overview": "The cell is the basic unit of life and"}),
+    ('{"title": "Cells", "main_points": ["Membranes", "Organel', dict,
+     {"title": "Cells", "main_points": ["Membranes", "Organel"]}),
+    ('{"title": "Cells", "important_te', dict, {"title": "Cells"}),
+    ('{"title": "Cells", "important_terms":', dict, {"title": "Cells"}),
+    ('{"overview": "First paragraph.\nSecond paragraph."}', dict,
+     {"overview": "First paragraph.\nSecond paragraph."}),
+    ('Sure! Below are the questions [as requested]:\n[{"question": "Q1", "answer": "A1"}, {"question": "Q2", "ans', list,
+     [{"question": "Q1", "answer": "A1"}, {"question": "Q2"}]),
+    ('[{"question": "Define entropy.", "key_points": ["disorder", "state function",],},]', list,
+     [{"question": "Define entropy.", "key_points": ["disorder", "state function"]}]),
+    ('```\n[{"question": "What is "entropy"?", "answer": "A measure of disorder"}]\n```', list,
+     [{"question": 'What is "entropy"?', "answer": "A measure of disorder"}]),
+    ('The JSON {as requested} is: {"title": "Optics", "examples": []}', dict,
+     {"title": "Optics", "examples": []}),
+    ('{"question_number": "3", "answer": {"introduction": "Intro", "main_content": ["p1", {"step": "s', dict,
+     {"question_number": "3", "answer": {"introduction": "Intro", "main_content": ["p1", {"step": "s"}]}}),
+]
+
+def legacy_extract(text):
+    """The extractor previously duplicated in the summarization and answer services"""
+    if "```" in text:
+        parts = text.split("```")
+        for i in range(1, len(parts), 2):
+            try:
+                content = parts[i].strip()
+                if content.startswith("json"):
+                    content = content[4:].strip()
+                return json.loads(content)
+            except json.JSONDecodeError:
+                continue
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        try:
+            start = text.find('{')
+            end = text.rfind('}') + 1
+            if start != -1 and end > start:
+                return json.loads(text[start:end])
+        except Exception:
+            pass
+    return None
+
+def run(name, extractor, repeat):
+    recovered = sum(1 for text, expect, value in CORPUS if extractor(text, expect) == value)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text, expect, _ in CORPUS:
+            extractor(text, expect)
+    elapsed = (time.perf_counter() - start) / (repeat * len(CORPUS))
+    print(f"{name:>8}: {recovered:2d}/{len(CORPUS)} recovered  {elapsed * 1e6:8.1f} us/sample")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    run("legacy", lambda text, expect: legacy_extract(text), args.repeat)
+    run("tolerant", extract_json, args.repeat)
+
+    # Linear time: a large generation full of stray quotes
+    text = '{"overview": "' + 'a "quoted" word ' * 50000 + '"}'
+    start = time.perf_counter()
+    extract_json(text, expect=dict)
+    print(f"{len(text):,} character generation: {time.perf_counter() - start:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
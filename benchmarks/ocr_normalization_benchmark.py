@@ -0,0 +1,162 @@
+"""
+Benchmark image normalization before OCR on synthetic phone photos of exam papers
+
+Usage:
+    python benchmarks/ocr_normalization_benchmark.py [--images 5] [--bandwidth-mbps 20]
+
+Each sample is a 12 MP photo of a page of text, saved as a high-quality JPEG
+with an EXIF rotation. OCR runs on a local stand-in: pytesseract when it is
+installed, otherwise a line detector whose latency models the upload at
+--bandwidth-mbps plus a fixed per-megapixel processing cost. Output is
+compared between the original and the normalized image.
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont, ImageOps
+from app.services.image_to_text_service import normalize_image
+from app.utils.ocr import OCRBackend
+
+WORDS = (
+    "explain the difference between supervised and unsupervised learning with examples "
+    "derive the expression for energy stored in a capacitor state ohms law marks"
+).split()
+
+class LineDetectorOCRBackend(OCRBackend):
+    """
+    Stand-in OCR that finds text lines from the dark-pixel row profile and
+    models Textract's latency as upload time plus processing per megapixel
+    """
+
+    name = "line-detector"
+
+    def __init__(self, bandwidth_mbps=20.0, seconds_per_megapixel=0.05):
+        self.bytes_per_second = bandwidth_mbps * 1000000 / 8
+        self.seconds_per_megapixel = seconds_per_megapixel
+
+    def detect_lines(self, image_bytes):
+        image = ImageOps.exif_transpose(Image.open(io.BytesIO(image_bytes))).convert("L")
+        time.sleep(
+            len(image_bytes) / self.bytes_per_second
+            + image.size[0] * image.size[1] / 1000000 * self.seconds_per_megapixel
+        )
+
+        # Rows darker than the paper, grouped into bands; each band is one line
+        # of text. Box-filtering averages out sensor noise: the 1-pixel-wide
+        # resize yields the mean of every row.
+        rows = max(1, image.size[1] * 600 // image.size[0])
+        row_means = image.resize((1, rows), Image.Resampling.BOX).tobytes()
+        paper = sorted(row_means)[len(row_means) // 2]
+        bands = []
+        for y, mean in enumerate(row_means):
+            if mean >= paper - 3:
+                continue
+            if bands and y - bands[-1][1] <= 4:
+                bands[-1][1] = y
+            else:
+                bands.append([y, y])
+
+        # Report each line by its relative vertical position
+        return [
+            f"text line at y={(top + bottom) / 2 / rows:.3f}" for top, bottom in bands if bottom - top >= 2
+        ]
+
+class TesseractOCRBackend(OCRBackend):
+    """Stand-in OCR with a local Tesseract install"""
+
+    name = "tesseract"
+
+    def __init__(self):
+        import pytesseract
+        self.pytesseract = pytesseract
+
+    def detect_lines(self, image_bytes):
+        image = ImageOps.exif_transpose(Image.open(io.BytesIO(image_bytes)))
+        text = self.pytesseract.image_to_string(image)
+        return [line.strip() for line in text.splitlines() if line.strip()]
+
+def equivalent(original_lines, normalized_lines):
+    """Compare OCR output; line positions from the line detector may shift by a pixel row"""
+    if len(original_lines) != len(normalized_lines):
+        return False
+    return all(
+        abs(float(a.split("y=")[1]) - float(b.split("y=")[1])) <= 0.005 if "y=" in a else a == b
+        for a, b in zip(original_lines, normalized_lines)
+    )
+
+def build_photo(seed, size=(3000, 4000)):
+    """Render a noisy photo of a page of text, stored sideways with an EXIF rotation"""
+    rng = random.Random(seed)
+    font = ImageFont.load_default(size=64)
+    image = Image.new("RGB", size, (226, 220, 205))
+    draw = ImageDraw.Draw(image)
+    for index, y in enumerate(range(300, size[1] - 300, 140)):
+        text = f"Q{index + 1}. " + " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 8)))
+        draw.text((200, y), text, fill=(30, 30, 40), font=font)
+
+    # Sensor noise and slight blur make the photo compress like a real one
+    noise = Image.effect_noise(size, 64).convert("RGB")
+    image = Image.blend(image, noise, 0.2).filter(ImageFilter.GaussianBlur(0.6))
+
+    # Phones store the sensor image sideways and record the rotation in EXIF
+    image = image.transpose(Image.Transpose.ROTATE_90)
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=97, exif=exif.tobytes())
+    return output.getvalue()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--images", type=int, default=5)
+    parser.add_argument("--bandwidth-mbps", type=float, default=20.0)
+    parser.add_argument("--max-pixels", type=int, default=4000000)
+    args = parser.parse_args()
+
+    try:
+        backend = TesseractOCRBackend()
+    except ImportError:
+        backend = LineDetectorOCRBackend(bandwidth_mbps=args.bandwidth_mbps)
+    print(f"OCR stand-in: {backend.name}")
+
+    totals = {"original_bytes": 0, "normalized_bytes": 0, "original_seconds": 0.0, "normalized_seconds": 0.0}
+    matches = 0
+    for seed in range(args.images):
+        photo = build_photo(seed)
+
+        start = time.perf_counter()
+        original_lines = backend.detect_lines(photo)
+        original_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        normalized, stats = normalize_image(photo, max_pixels=args.max_pixels)
+        normalized_lines = backend.detect_lines(normalized)
+        normalized_seconds = time.perf_counter() - start
+
+        same = equivalent(original_lines, normalized_lines)
+        matches += same
+        totals["original_bytes"] += stats["original_bytes"]
+        totals["normalized_bytes"] += stats["normalized_bytes"]
+        totals["original_seconds"] += original_seconds
+        totals["normalized_seconds"] += normalized_seconds
+        print(
+            f"image {seed}: {stats['original_bytes'] / 1e6:6.2f} MB -> {stats['normalized_bytes'] / 1e6:5.2f} MB, "
+            f"{original_seconds:5.2f}s -> {normalized_seconds:5.2f}s (incl. normalization), "
+            f"{len(normalized_lines)} lines, output {'equivalent' if same else 'differs'}"
+        )
+
+    print(
+        f"total: {totals['original_bytes'] / 1e6:.1f} MB -> {totals['normalized_bytes'] / 1e6:.1f} MB "
+        f"({1 - totals['normalized_bytes'] / totals['original_bytes']:.0%} smaller), "
+        f"{totals['original_seconds']:.2f}s -> {totals['normalized_seconds']:.2f}s, "
+        f"{matches}/{args.images} outputs equivalent"
+    )
+
+if __name__ == "__main__":
+    main()
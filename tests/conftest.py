@@ -0,0 +1,59 @@
+import os
+import pytest
+
+# boto3 needs a region to build the clients, and the configuration reads it
+# when app.config is first imported
+os.environ.setdefault("AWS_REGION", "us-east-1")
+
+from app import create_app
+from app.config import TestingConfig
+import app.extensions as extensions
+from tests.fakes import FakeBedrock
+
+# Settings every test app starts from: no process pool, no backoff sleeps
+TEST_CONFIG = {
+    "PDF_EXTRACT_WORKERS": 1,
+    "JOB_WORKERS": 1,
+    "BEDROCK_BACKOFF_BASE": 0.0,
+    "BEDROCK_THROTTLE_BACKOFF_BASE": 0.0,
+    "BEDROCK_BACKOFF_MAX": 0.0
+}
+
+@pytest.fixture
+def fake_bedrock():
+    return FakeBedrock()
+
+@pytest.fixture
+def make_app(monkeypatch, fake_bedrock):
+    """Factory building a testing app wired to fake_bedrock, with config overrides"""
+    started = []
+
+    def factory(**overrides):
+        for key, value in {**TEST_CONFIG, **overrides}.items():
+            monkeypatch.setattr(TestingConfig, key, value, raising=False)
+        app = create_app("testing")
+        monkeypatch.setattr(extensions, "bedrock_runtime", fake_bedrock)
+        started.append((
+            extensions.get_job_manager(),
+            extensions.get_pdf_executor(),
+            extensions.get_llm_executor(),
+            extensions.get_stream_executor()
+        ))
+        return app
+
+    yield factory
+
+    for manager, pdf_executor, llm_executor, stream_executor in started:
+        manager.stop()
+        if pdf_executor is not None:
+            pdf_executor.shutdown()
+        llm_executor.shutdown(cancel_futures=True)
+        stream_executor.shutdown(cancel_futures=True)
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
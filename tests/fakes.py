@@ -0,0 +1,95 @@
+import io
+import json
+import threading
+import time
+from botocore.exceptions import ClientError
+
+def client_error(code):
+    """Build the ClientError botocore raises for an error code"""
+    return ClientError({"Error": {"Code": code, "Message": code}}, "InvokeModel")
+
+def default_reply(prompt):
+    """A question array for question prompts and a summary for every other prompt"""
+    if "exam question generator" in prompt:
+        return json.dumps([{"question": f"Question on {len(prompt)} chars?", "answer": "An answer"}])
+    return json.dumps({"overview": f"summary of {len(prompt)} chars"})
+
+class FakeBedrock:
+    """
+    Local stand-in for the bedrock-runtime client
+
+    Replies are produced by reply(prompt), which may return a generation or
+    raise; every call is counted and the peak number of concurrent calls is
+    recorded.
+    """
+
+    def __init__(self, reply=None, delay=0.0):
+        self.reply = reply or default_reply
+        self.delay = delay
+        self.prompts = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def calls(self):
+        return len(self.prompts)
+
+    def _generate(self, body):
+        prompt = json.loads(body)["prompt"]
+        with self._lock:
+            self.prompts.append(prompt)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.delay:
+                time.sleep(self.delay)
+            return prompt, self.reply(prompt)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def invoke_model(self, modelId, body, **kwargs):
+        prompt, generation = self._generate(body)
+        payload = {
+            "generation": generation,
+            "prompt_token_count": len(prompt) // 4,
+            "generation_token_count": len(generation) // 4
+        }
+        return {"body": io.BytesIO(json.dumps(payload).encode("utf-8"))}
+
+    def invoke_model_with_response_stream(self, modelId, body, **kwargs):
+        _, generation = self._generate(body)
+        pieces = [generation[i:i + 16] for i in range(0, len(generation), 16)]
+        return {"body": ({"chunk": {"bytes": json.dumps({"generation": piece}).encode("utf-8")}} for piece in pieces)}
+
+# Vocabulary for the sentences of test documents
+WORDS = (
+    "cloud water vapour pressure front storm climate ocean current heat layer wind "
+    "rain snow ice mountain valley river delta coast glacier desert forest soil crop"
+).split()
+
+def make_pdf(pages=3, sentences=4, seed=0):
+    """
+    Build a small text-layer PDF whose lines do not repeat across pages
+
+    Args:
+        pages (int): Number of pages
+        sentences (int): Sentences per page
+        seed (int): Seed of the sentence generator, to tell documents apart
+
+    Returns:
+        bytes: PDF file contents
+    """
+    import random
+    import fitz
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        for line in range(sentences):
+            words = " ".join(rng.choice(WORDS) for _ in range(10))
+            page.insert_text((72, 72 + 14 * line), f"The {words}.")
+    data = doc.tobytes()
+    doc.close()
+    return data
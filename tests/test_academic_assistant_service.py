@@ -0,0 +1,92 @@
+import json
+import re
+import time
+import pytest
+from app.services.academic_assistant_service import generate_answers_for_all_questions
+from app.utils.jobs import JobCancelled
+
+QUESTION_LINE = re.compile(r"^(\S+): (.+)$", re.MULTILINE)
+
+def paper(*questions):
+    return {
+        "context": "Physics paper",
+        "questions": [
+            {"question_number": number, "question_text": text, "marks": marks} for number, text, marks in questions
+        ]
+    }
+
+def answer_reply(skip=()):
+    """Batched prompts get one solution per listed question, except those in skip"""
+    def reply(prompt):
+        if "Questions:\n" in prompt:
+            listed = prompt.split("Questions:\n", 1)[1].split("\nContext:", 1)[0]
+            solutions = [
+                {"question_number": number, "question": text, "main_content": f"batched {text}"}
+                for number, text in QUESTION_LINE.findall(listed)
+                if number not in skip
+            ]
+            return json.dumps({"solutions": solutions})
+        question = prompt.split("Question: ", 1)[1].split("Context:", 1)[0]
+        return json.dumps({"question": question, "main_content": f"single {question}"})
+    return reply
+
+def test_low_mark_questions_share_one_call(make_app, fake_bedrock):
+    make_app(ANSWER_BATCH_MAX_MARKS=2, ANSWER_BATCH_SIZE=4)
+    fake_bedrock.reply = answer_reply()
+
+    result = generate_answers_for_all_questions(paper(
+        ("Q.1", "What is mass?", 1), ("Q.2", "What is force?", 2), ("Q.3", "Derive the wave equation.", 10)
+    ))
+
+    assert fake_bedrock.calls == 2
+    solutions = result["solutions"]
+    assert [s["question_number"] for s in solutions] == ["Q.1", "Q.2", "Q.3"]
+    assert [s["marks"] for s in solutions] == [1, 2, 10]
+    assert [s["main_content"] for s in solutions] == [
+        "batched What is mass?", "batched What is force?", "single Derive the wave equation."
+    ]
+
+def test_questions_missing_from_a_batch_are_answered_alone(make_app, fake_bedrock):
+    make_app(ANSWER_BATCH_MAX_MARKS=2)
+    fake_bedrock.reply = answer_reply(skip={"Q.2"})
+
+    result = generate_answers_for_all_questions(paper(("Q.1", "What is mass?", 1), ("Q.2", "What is force?", 1)))
+
+    assert fake_bedrock.calls == 2
+    assert [s["main_content"] for s in result["solutions"]] == ["batched What is mass?", "single What is force?"]
+
+def test_questions_numbered_alike_get_their_own_solutions(make_app, fake_bedrock):
+    make_app(ANSWER_BATCH_MAX_MARKS=2)
+    fake_bedrock.reply = answer_reply()
+
+    result = generate_answers_for_all_questions(paper(
+        ("Q.1", "What is mass?", 1), ("Q1", "What is force?", 2), ("Q.2", "What is work?", 1)
+    ))
+
+    solutions = result["solutions"]
+    assert [s["question_number"] for s in solutions] == ["Q.1", "Q1", "Q.2"]
+    assert [s["marks"] for s in solutions] == [1, 2, 1]
+    assert [s["main_content"] for s in solutions] == [
+        "single What is mass?", "single What is force?", "single What is work?"
+    ]
+    assert solutions[0] is not solutions[1]
+
+def test_cancelling_stops_the_remaining_answer_calls(make_app, fake_bedrock):
+    make_app(ANSWER_MAX_WORKERS=2, LLM_CACHE_ENABLED=False)
+    fake_bedrock.reply = answer_reply()
+    fake_bedrock.delay = 0.02
+    questions = [(f"Q.{index}", f"Explain topic {index}.", 10) for index in range(12)]
+    events = []
+
+    def on_event(event, data):
+        events.append((event, data))
+        if event == "answers":
+            raise JobCancelled("job")
+
+    with pytest.raises(JobCancelled):
+        generate_answers_for_all_questions(paper(*questions), on_event=on_event)
+    time.sleep(0.2)
+
+    assert events[0] == ("questions", {"count": 12, "groups": 12})
+    # Only the answers already being generated went on
+    assert fake_bedrock.calls <= 3
@@ -0,0 +1,149 @@
+import threading
+import time
+import pytest
+from app.services.bedrock_service import format_llama3_prompt, invoke_llama
+from app.utils.admission import AdmissionController, AdmissionRejected, MemoryRateLimiter, admission_identity
+from app.utils.concurrency import map_concurrently, submit_llm_task
+from app.utils.fair_pool import FairThreadPool
+
+NO_CACHES = {"LLM_CACHE_ENABLED": False, "RESULT_CACHE_ENABLED": False, "SUMMARY_MEMO_ENABLED": False}
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert condition()
+
+def test_controller_admits_clients_round_robin():
+    controller = AdmissionController(max_concurrency=1)
+    held = controller.acquire(client="a")
+    order = []
+
+    def call(client, name):
+        with controller.admit(client=client):
+            order.append(name)
+
+    threads = []
+    for name, client in [("a1", "a"), ("a2", "a"), ("a3", "a"), ("b1", "b")]:
+        threads.append(threading.Thread(target=call, args=(client, name)))
+        threads[-1].start()
+        wait_until(lambda: controller.stats()["waiting"] == len(threads))
+    controller.release(held)
+    for thread in threads:
+        thread.join()
+
+    assert order == ["b1", "a1", "a2", "a3"]
+
+def test_controller_serves_higher_priority_first():
+    controller = AdmissionController(max_concurrency=1)
+    held = controller.acquire(client="a")
+    order = []
+
+    def call(client, priority):
+        with controller.admit(client=client, priority=priority):
+            order.append(client)
+
+    threads = []
+    for client, priority in [("jobs", 2), ("assistant", 0)]:
+        threads.append(threading.Thread(target=call, args=(client, priority)))
+        threads[-1].start()
+        wait_until(lambda: controller.stats()["waiting"] == len(threads))
+    controller.release(held)
+    for thread in threads:
+        thread.join()
+
+    assert order == ["assistant", "jobs"]
+
+def test_controller_rejects_calls_waiting_too_long():
+    controller = AdmissionController(max_concurrency=1, max_wait=0.05)
+    held = controller.acquire()
+
+    with pytest.raises(AdmissionRejected):
+        controller.acquire()
+    controller.release(held)
+    assert controller.stats()["rejected"] == 1
+
+def test_controller_waits_for_the_rate_budget():
+    controller = AdmissionController(rate_limiter=MemoryRateLimiter({"requests": 600}))
+    controller.rate_limiter.try_take({"requests": 600})
+
+    started = time.monotonic()
+    controller.release(controller.acquire())
+
+    # One request refills every 0.1 s
+    assert 0.05 < time.monotonic() - started < 1.0
+
+def test_rate_limiter_is_consulted_outside_the_controller_lock():
+    class SlowLimiter:
+        limits = {"requests": 1}
+
+        def try_take(self, amounts):
+            time.sleep(0.3)
+            return 0.0
+
+        def adjust(self, amounts):
+            pass
+
+    controller = AdmissionController(max_concurrency=2, rate_limiter=SlowLimiter())
+    first = controller.acquire()
+    second = threading.Thread(target=lambda: controller.release(controller.acquire()))
+    second.start()
+    time.sleep(0.05)
+
+    started = time.monotonic()
+    controller.release(first)
+    assert time.monotonic() - started < 0.1
+    second.join()
+
+def test_pool_runs_the_next_task_of_the_least_recently_served_client():
+    pool = FairThreadPool(max_workers=1)
+    gate = threading.Event()
+    order = []
+
+    with admission_identity("a"):
+        blocker = pool.submit(gate.wait)
+        wait_until(blocker.running)
+        futures = [pool.submit(order.append, f"a{index}") for index in range(3)]
+    with admission_identity("b"):
+        futures.append(pool.submit(order.append, "b0"))
+    gate.set()
+    for future in futures:
+        future.result()
+    pool.shutdown()
+
+    assert order == ["b0", "a0", "a1", "a2"]
+
+def test_admission_wait_limit_includes_time_queued_in_the_pool():
+    controller = AdmissionController(max_concurrency=1, max_wait=0.2)
+    pool = FairThreadPool(max_workers=1)
+    held = controller.acquire(client="other")
+
+    with admission_identity("a"):
+        pool.submit(time.sleep, 0.15)
+        started = time.monotonic()
+        future = pool.submit(controller.acquire)
+
+    with pytest.raises(AdmissionRejected):
+        future.result()
+    # Rejected 0.2 s after it was queued, not 0.2 s after it reached admission
+    assert time.monotonic() - started < 0.3
+    controller.release(held)
+    pool.shutdown()
+
+def test_a_large_document_does_not_hold_back_another_client(make_app, fake_bedrock):
+    make_app(LLM_MAX_WORKERS=2, BEDROCK_MAX_CONCURRENCY=2, **NO_CACHES)
+    fake_bedrock.delay = 0.02
+
+    def large_document():
+        with admission_identity("a"):
+            map_concurrently(lambda index: invoke_llama(format_llama3_prompt(f"chunk {index}")), range(40))
+
+    document = threading.Thread(target=large_document)
+    document.start()
+    wait_until(lambda: fake_bedrock.calls >= 2)
+    with admission_identity("b"):
+        submit_llm_task(invoke_llama, format_llama3_prompt("single call")).result()
+    document.join()
+
+    position = next(index for index, prompt in enumerate(fake_bedrock.prompts) if "single call" in prompt)
+    assert position < 6
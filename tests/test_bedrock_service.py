@@ -0,0 +1,85 @@
+import json
+import pytest
+from app.services.bedrock_service import (
+    BedrockInvocationError,
+    BedrockThrottledError,
+    EmptyGenerationError,
+    format_llama3_prompt,
+    invoke_llama,
+    stream_llama
+)
+from tests.fakes import client_error
+
+def replies(*outcomes):
+    """Reply hook returning or raising each outcome in turn, repeating the last one"""
+    outcomes = list(outcomes)
+
+    def reply(prompt):
+        outcome = outcomes.pop(0) if len(outcomes) > 1 else outcomes[0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    return reply
+
+def test_invoke_llama_returns_the_generation(app, fake_bedrock):
+    fake_bedrock.reply = replies('  {"overview": "ok"}  ')
+
+    assert invoke_llama(format_llama3_prompt("hello")) == '{"overview": "ok"}'
+    assert fake_bedrock.calls == 1
+
+def test_invoke_llama_serves_repeated_prompts_from_the_cache(app, fake_bedrock):
+    prompt = format_llama3_prompt("hello")
+
+    first = invoke_llama(prompt)
+    second = invoke_llama(prompt)
+
+    assert first == second
+    assert fake_bedrock.calls == 1
+
+def test_invoke_llama_retries_throttling(app, fake_bedrock):
+    fake_bedrock.reply = replies(client_error("ThrottlingException"), "done")
+
+    assert invoke_llama(format_llama3_prompt("hello")) == "done"
+    assert fake_bedrock.calls == 2
+
+def test_invoke_llama_gives_up_on_persistent_throttling(app, fake_bedrock):
+    fake_bedrock.reply = replies(client_error("ThrottlingException"))
+
+    with pytest.raises(BedrockThrottledError):
+        invoke_llama(format_llama3_prompt("hello"))
+    assert fake_bedrock.calls == 3
+
+def test_invoke_llama_does_not_retry_fatal_errors(app, fake_bedrock):
+    fake_bedrock.reply = replies(client_error("ValidationException"))
+
+    with pytest.raises(BedrockInvocationError) as info:
+        invoke_llama(format_llama3_prompt("hello"))
+    assert not isinstance(info.value, BedrockThrottledError)
+    assert fake_bedrock.calls == 1
+
+def test_invoke_llama_retries_unusable_output_without_caching_it(app, fake_bedrock):
+    fake_bedrock.reply = replies("", "not json", '{"overview": "ok"}')
+    prompt = format_llama3_prompt("hello")
+    is_valid = lambda generation: generation.startswith("{")
+
+    assert invoke_llama(prompt, is_valid=is_valid) == '{"overview": "ok"}'
+    assert fake_bedrock.calls == 3
+    assert invoke_llama(prompt, is_valid=is_valid) == '{"overview": "ok"}'
+    assert fake_bedrock.calls == 3
+
+def test_invoke_llama_raises_after_repeated_empty_output(app, fake_bedrock):
+    fake_bedrock.reply = replies("")
+
+    with pytest.raises(EmptyGenerationError):
+        invoke_llama(format_llama3_prompt("hello"))
+    assert fake_bedrock.calls == 3
+
+def test_stream_llama_yields_the_generation_in_pieces(app, fake_bedrock):
+    generation = json.dumps({"overview": "a streamed summary of the whole document"})
+    fake_bedrock.reply = replies(generation)
+
+    pieces = list(stream_llama(format_llama3_prompt("hello")))
+
+    assert len(pieces) > 1
+    assert "".join(pieces) == generation
@@ -0,0 +1,57 @@
+import sqlite3
+from app.utils.cache import TieredCache
+
+def accessed_at(db_path, key):
+    with sqlite3.connect(db_path) as db:
+        return db.execute("SELECT accessed_at FROM cache WHERE key = ?", (key,)).fetchone()[0]
+
+def test_reads_refresh_access_times_in_batches(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    cache = TieredCache("test", db_path=db_path)
+    cache.TOUCH_BATCH = 3
+    cache.TOUCH_INTERVAL = 3600
+    cache.set("a", 1)
+    written = accessed_at(db_path, "a")
+
+    # Memory hits, held back until the batch is full
+    assert cache.get("a") == 1
+    assert cache.get("a") == 1
+    assert accessed_at(db_path, "a") == written
+
+    cache.set("b", 2)
+    assert accessed_at(db_path, "a") > written
+
+def test_memory_hits_keep_entries_from_lru_eviction(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    cache = TieredCache("test", db_path=db_path, max_db_entries=2)
+    cache.PRUNE_INTERVAL = 3
+    cache.set("old", 1)
+    cache.set("newer", 2)
+
+    # "old" is only ever read from the memory tier
+    assert cache.get("old") == 1
+    cache.set("newest", 3)
+
+    with sqlite3.connect(db_path) as db:
+        keys = {row[0] for row in db.execute("SELECT key FROM cache")}
+    assert keys == {"old", "newest"}
+
+def test_disk_hits_do_not_commit_on_every_read(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    writer = TieredCache("test", db_path=db_path)
+    for index in range(4):
+        writer.set(f"key{index}", index)
+    cache = TieredCache("test", max_memory_items=0, db_path=db_path)
+    cache.TOUCH_BATCH = 4
+    cache.TOUCH_INTERVAL = 3600
+    before = cache._db.total_changes
+
+    # Repeated reads of one key are a single pending touch
+    for _ in range(10):
+        assert cache.get("key0") == 0
+    for index in range(1, 3):
+        assert cache.get(f"key{index}") == index
+    assert cache._db.total_changes == before
+
+    assert cache.get("key3") == 3
+    assert cache._db.total_changes == before + 4
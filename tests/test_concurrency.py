@@ -0,0 +1,96 @@
+import threading
+import time
+import pytest
+from app.utils.concurrency import map_concurrently
+from app.utils.jobs import JobCancelled
+
+def test_map_concurrently_keeps_input_order(app):
+    # Later items finish first
+    results = map_concurrently(lambda n: (time.sleep(0.01 * (5 - n)), n * n)[1], range(6))
+
+    assert results == [0, 1, 4, 9, 16, 25]
+
+def test_map_concurrently_reports_every_result(app):
+    seen = {}
+
+    map_concurrently(lambda n: n + 1, [10, 20, 30], on_result=lambda index, result: seen.update({index: result}))
+
+    assert seen == {0: 11, 1: 21, 2: 31}
+
+def test_map_concurrently_runs_items_in_parallel(app):
+    lock = threading.Lock()
+    state = {"running": 0, "peak": 0}
+
+    def work(item):
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+        time.sleep(0.05)
+        with lock:
+            state["running"] -= 1
+        return item
+
+    map_concurrently(work, range(6))
+
+    assert state["peak"] > 1
+
+def test_map_concurrently_bounds_items_in_flight(app):
+    lock = threading.Lock()
+    state = {"running": 0, "peak": 0}
+
+    def work(item):
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+        time.sleep(0.02)
+        with lock:
+            state["running"] -= 1
+        return item
+
+    assert map_concurrently(work, range(8), max_in_flight=2) == list(range(8))
+    assert state["peak"] <= 2
+
+def test_map_concurrently_propagates_errors(app):
+    def work(item):
+        if item == 3:
+            raise ValueError("bad item")
+        return item
+
+    with pytest.raises(ValueError, match="bad item"):
+        map_concurrently(work, range(6))
+
+def test_map_concurrently_cancels_queued_items_on_error(app):
+    started = []
+
+    def work(item):
+        started.append(item)
+        time.sleep(0.02)
+        return item
+
+    def on_result(index, result):
+        raise JobCancelled("job")
+
+    with pytest.raises(JobCancelled):
+        map_concurrently(work, range(40), on_result=on_result)
+    time.sleep(0.2)
+
+    # Only the items already running when the error was raised went on
+    assert len(started) <= app.config["LLM_MAX_WORKERS"] * 2
+    assert len(started) < 40
+
+def test_map_concurrently_bounds_calls_finishing_after_cancellation(app):
+    started = []
+
+    def work(item):
+        started.append(item)
+        time.sleep(0.02)
+        return item
+
+    def on_result(index, result):
+        raise JobCancelled("job")
+
+    with pytest.raises(JobCancelled):
+        map_concurrently(work, range(40), on_result=on_result, max_in_flight=2)
+    time.sleep(0.2)
+
+    assert len(started) <= 2
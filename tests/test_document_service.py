@@ -0,0 +1,28 @@
+import time
+import pytest
+from app.services.document_service import analyze_document
+from app.utils.jobs import JobCancelled
+from tests.fakes import make_pdf
+
+def test_cancelled_analysis_drops_queued_question_calls(make_app, fake_bedrock):
+    make_app(CHUNK_SIZING="words", CHUNKING_STRATEGY="sentences", LLM_MAX_WORKERS=2)
+    fake_bedrock.delay = 0.02
+    pdf = make_pdf(pages=12, sentences=8)
+
+    events = {}
+
+    def on_event(event, data):
+        events[event] = data
+        # Question calls are queued once the map step is done, right before
+        # the first reduce level
+        if event == "reduce_level":
+            raise JobCancelled("job")
+
+    with pytest.raises(JobCancelled):
+        analyze_document(pdf, max_words=60, on_event=on_event)
+    time.sleep(0.3)
+
+    question_calls = sum("exam question generator" in prompt for prompt in fake_bedrock.prompts)
+    assert events["chunks"]["count"] > 8
+    # Only the calls already running on the two pool workers went on
+    assert question_calls <= 2
@@ -0,0 +1,121 @@
+import hashlib
+import io
+import random
+import threading
+import time
+import fitz
+import pytest
+from PIL import Image
+import app.extensions as extensions
+from app.services.image_to_text_service import extract_text_from_pdf_hybrid, normalize_image
+from app.utils.ocr import OCRBackend
+
+class FakeOCRBackend(OCRBackend):
+    """OCR stand-in reading page labels from a table keyed by image hash"""
+
+    name = "fake"
+
+    def __init__(self, labels, delay=0.0):
+        self.labels = labels
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.done = 0
+
+    def detect_lines(self, image_bytes):
+        time.sleep(self.delay)
+        with self.lock:
+            self.done += 1
+        return [self.labels[hashlib.sha256(image_bytes).hexdigest()]]
+
+def scanned_pdf(pages, digital=()):
+    """PDF whose pages carry only a short label, except the digital ones"""
+    doc = fitz.open()
+    for index in range(pages):
+        page = doc.new_page()
+        if index in digital:
+            page.insert_text((72, 72), f"Digital page {index} has a full text layer to read.")
+        else:
+            page.insert_text((72, 72), f"Scan {index}")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+def page_labels(pdf, dpi):
+    doc = fitz.open(stream=pdf, filetype="pdf")
+    labels = {
+        hashlib.sha256(page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY).tobytes("png")).hexdigest(): f"ocr {index}"
+        for index, page in enumerate(doc)
+    }
+    doc.close()
+    return labels
+
+def test_only_pages_without_a_text_layer_are_recognized_in_order(make_app, monkeypatch):
+    make_app(OCR_CACHE_ENABLED=False, OCR_MAX_WORKERS=2, OCR_RENDER_DPI=36)
+    pdf = scanned_pdf(8, digital={2, 5})
+    backend = FakeOCRBackend(page_labels(pdf, 36), delay=0.01)
+    monkeypatch.setattr(extensions, "ocr_backend", backend)
+
+    text = extract_text_from_pdf_hybrid(pdf)
+
+    assert backend.done == 6
+    lines = text.split("\n")
+    assert lines[2].startswith("Digital page 2") and lines[5].startswith("Digital page 5")
+    assert [line for index, line in enumerate(lines) if index not in (2, 5)] == [
+        f"ocr {index}" for index in (0, 1, 3, 4, 6, 7)
+    ]
+
+def test_pages_are_rendered_only_as_ocr_keeps_up(make_app, monkeypatch):
+    make_app(OCR_CACHE_ENABLED=False, OCR_MAX_WORKERS=2, OCR_RENDER_DPI=36)
+    pdf = scanned_pdf(20)
+    backend = FakeOCRBackend(page_labels(pdf, 36), delay=0.02)
+    monkeypatch.setattr(extensions, "ocr_backend", backend)
+    render = fitz.Page.get_pixmap
+    state = {"rendered": 0, "peak": 0}
+
+    def counting_render(page, *args, **kwargs):
+        state["rendered"] += 1
+        state["peak"] = max(state["peak"], state["rendered"] - backend.done)
+        return render(page, *args, **kwargs)
+
+    monkeypatch.setattr(fitz.Page, "get_pixmap", counting_render)
+
+    extract_text_from_pdf_hybrid(pdf)
+
+    assert backend.done == 20
+    # Two rendered pages per OCR worker wait at most
+    assert state["peak"] <= 4
+
+def test_ocr_backends_must_implement_detect_lines():
+    class Incomplete(OCRBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+def noisy_image(mode):
+    """Dark noise whose top half is fully transparent; the noise keeps the PNG
+    large enough for the JPEG to be smaller"""
+    rng = random.Random(0)
+    if mode == "P":
+        # Palette entry 0 is the transparent one, the others are dark grays
+        image = Image.new("P", (200, 200))
+        image.putpalette([value for shade in range(256) for value in (shade // 4,) * 3])
+        image.putdata([0 if index < 200 * 100 else rng.randrange(1, 256) for index in range(200 * 200)])
+        image.info["transparency"] = 0
+    else:
+        image = Image.new("LA", (200, 200))
+        image.putdata([(rng.randrange(64), 0 if index < 200 * 100 else 255) for index in range(200 * 200)])
+        image = image.convert(mode)
+    encoded = io.BytesIO()
+    image.save(encoded, format="PNG", **({"transparency": 0} if mode == "P" else {}))
+    return encoded.getvalue()
+
+@pytest.mark.parametrize("mode", ["RGBA", "LA", "P"])
+def test_transparent_areas_are_normalized_to_white(mode):
+    normalized, stats = normalize_image(noisy_image(mode))
+
+    assert stats["bytes_saved"] > 0
+    result = Image.open(io.BytesIO(normalized))
+    assert result.mode == "L"
+    assert result.getpixel((100, 10)) > 240
+    assert result.getpixel((100, 190)) < 100
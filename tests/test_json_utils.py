@@ -0,0 +1,51 @@
+import pytest
+from app.utils.json_utils import extract_json, extract_json_from_text
+from benchmarks.json_extraction_benchmark import CORPUS
+
+# Output that only looks like JSON; repairing it yields nothing usable
+JUNK = [
+    ("{", dict),
+    ("[", list),
+    ('Sure, here is the summary: {"ti', dict),
+    ('{"title": ', dict),
+    ("```json\n{\n```", dict),
+    ("{}", dict),
+    ("[]", list),
+    ("No JSON here at all.", None),
+    ("", None),
+]
+
+@pytest.mark.parametrize("text, expect, value", CORPUS)
+def test_recovers_malformed_generations(text, expect, value):
+    assert extract_json(text, expect=expect) == value
+
+@pytest.mark.parametrize("text, expect", JUNK)
+def test_rejects_junk(text, expect):
+    assert extract_json(text, expect=expect) is None
+
+def test_error_for_junk_objects():
+    assert "error" in extract_json_from_text('Sure... {"ti')
+    assert "error" in extract_json_from_text("{")
+
+def test_skips_objects_without_expected_keys():
+    text = 'Note {"page": 3} then {"title": "Optics", "overview": "Light"}'
+
+    assert extract_json(text, expect=dict) == {"page": 3}
+    assert extract_json(text, expect=dict, keys=["title", "overview"]) == {"title": "Optics", "overview": "Light"}
+    assert "error" in extract_json_from_text('{"page": 3}', keys=["title"])
+
+def test_skips_arrays_without_expected_objects():
+    text = 'See section [1] and [2]. [{"question": "Define work.", "answer": "Force times distance"}]'
+
+    assert extract_json(text, expect=list) == [1]
+    assert extract_json(text, expect=list, keys=["question"]) == [
+        {"question": "Define work.", "answer": "Force times distance"}
+    ]
+    assert extract_json("see section [1] ... [2]", expect=list, keys=["question"]) is None
+
+def test_scans_long_generations_in_linear_time():
+    text = '{"overview": "' + 'a "quoted" word ' * 20000 + '"}'
+
+    value = extract_json(text, expect=dict)
+
+    assert value["overview"].startswith('a "quoted" word')
@@ -0,0 +1,29 @@
+import os
+from app.services.pdf_service import extract_text_from_pdf, find_pdf_headings, shared_pdf_path
+from tests.fakes import make_pdf
+
+def test_shared_pdf_path_spools_bytes_and_removes_the_file():
+    pdf = make_pdf(pages=2)
+
+    with shared_pdf_path(pdf) as path:
+        with open(path, "rb") as f:
+            assert f.read() == pdf
+    assert not os.path.exists(path)
+
+def test_shared_pdf_path_keeps_spooled_uploads(tmp_path):
+    upload = tmp_path / "upload.pdf"
+    upload.write_bytes(make_pdf(pages=1))
+
+    with shared_pdf_path(str(upload)) as path:
+        assert path == str(upload)
+    assert upload.exists()
+
+def test_parallel_extraction_matches_sequential(make_app):
+    pdf = make_pdf(pages=12, sentences=3)
+    make_app(PDF_EXTRACT_WORKERS=1)
+    sequential = extract_text_from_pdf(pdf)
+    sequential_headings = find_pdf_headings(pdf)
+
+    make_app(PDF_EXTRACT_WORKERS=2, PDF_PARALLEL_MIN_PAGES=4)
+    assert extract_text_from_pdf(pdf) == sequential
+    assert find_pdf_headings(pdf) == sequential_headings
@@ -0,0 +1,24 @@
+import json
+from app.services.question_service import parse_questions, unique_questions
+
+def test_parse_questions_reads_arrays_and_wrapped_arrays():
+    questions = [{"question": "Define entropy.", "answer": "A measure of disorder"}]
+
+    assert parse_questions(json.dumps(questions)) == questions
+    assert parse_questions(json.dumps({"questions": questions})) == questions
+
+def test_parse_questions_rejects_prose_and_empty_arrays():
+    assert parse_questions("see section [1] ... [2]") is None
+    assert parse_questions("[") is None
+    assert parse_questions("[]") is None
+    assert parse_questions('{"questions": []}') is None
+
+def test_parse_questions_drops_items_that_are_not_objects():
+    text = '[{"question": "Q1", "answer": "A1"}, "stray text", 3]'
+
+    assert parse_questions(text) == [{"question": "Q1", "answer": "A1"}]
+
+def test_unique_questions_ignores_case_and_stray_items():
+    questions = [{"question": "What is work?"}, 1, {"question": "what is WORK? "}, {"question": None}, {"question": "Q2"}]
+
+    assert unique_questions(questions) == [{"question": "What is work?"}, {"question": "Q2"}]
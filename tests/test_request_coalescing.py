@@ -0,0 +1,136 @@
+import io
+import threading
+import time
+import pytest
+from app.utils.jobs import JobCancelled
+from app.utils.singleflight import SingleFlight
+from tests.fakes import make_pdf
+
+# Without the caches, sharing the in-flight run is the only way requests
+# can avoid model calls
+NO_CACHES = {"LLM_CACHE_ENABLED": False, "RESULT_CACHE_ENABLED": False, "SUMMARY_MEMO_ENABLED": False}
+
+def post_concurrently(app, path, data, requests):
+    """Post the same upload from several threads at once; returns the responses"""
+    barrier = threading.Barrier(requests)
+    responses = [None] * requests
+
+    def post(index):
+        client = app.test_client()
+        barrier.wait()
+        responses[index] = client.post(path, data={"file": (io.BytesIO(data), "notes.pdf")})
+
+    threads = [threading.Thread(target=post, args=(index,)) for index in range(requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return responses
+
+@pytest.mark.parametrize("path", ["/api/v1/summarize", "/api/v1/generate-questions"])
+def test_identical_concurrent_requests_make_one_set_of_model_calls(make_app, fake_bedrock, path):
+    app = make_app(**NO_CACHES)
+    fake_bedrock.delay = 0.05
+    pdf = make_pdf(pages=4, sentences=6)
+
+    single = app.test_client().post(path, data={"file": (io.BytesIO(pdf), "notes.pdf")})
+    assert single.status_code == 200
+    calls_per_run = fake_bedrock.calls
+    assert calls_per_run > 0
+
+    fake_bedrock.prompts.clear()
+    responses = post_concurrently(app, path, pdf, requests=8)
+
+    assert [response.status_code for response in responses] == [200] * 8
+    assert fake_bedrock.calls == calls_per_run
+    assert sum(response.headers.get("X-Coalesced") == "true" for response in responses) == 7
+    assert all(response.get_json() == responses[0].get_json() for response in responses)
+
+def test_requests_run_separately_without_coalescing(make_app, fake_bedrock):
+    app = make_app(COALESCE_REQUESTS=False, **NO_CACHES)
+    fake_bedrock.delay = 0.05
+    pdf = make_pdf(pages=2, sentences=4)
+
+    app.test_client().post("/api/v1/summarize", data={"file": (io.BytesIO(pdf), "notes.pdf")})
+    calls_per_run = fake_bedrock.calls
+    fake_bedrock.prompts.clear()
+    post_concurrently(app, "/api/v1/summarize", pdf, requests=3)
+
+    assert fake_bedrock.calls == 3 * calls_per_run
+
+def test_followers_share_the_leaders_failure_and_the_key_is_released():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    errors = []
+
+    def failing():
+        started.set()
+        release.wait()
+        raise RuntimeError("pipeline failed")
+
+    def call():
+        try:
+            flight.do("doc", failing)
+        except RuntimeError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=call) for _ in range(3)]
+    for follower in followers:
+        follower.start()
+    # Let the followers attach to the leader's call before it fails
+    time.sleep(0.1)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join()
+
+    assert len(errors) == 4
+    assert flight.stats()["computations"] == 1
+    assert flight.stats()["in_flight"] == 0
+    assert flight.do("doc", lambda: "recomputed") == ("recomputed", False)
+
+def test_a_follower_stops_waiting_when_it_is_cancelled():
+    flight = SingleFlight()
+    flight.WAIT_POLL_SECONDS = 0.01
+    started = threading.Event()
+    release = threading.Event()
+    cancelled = threading.Event()
+
+    def slow():
+        started.set()
+        release.wait()
+        return "summary"
+
+    def check_cancelled():
+        if cancelled.is_set():
+            raise JobCancelled("follower")
+
+    leader_result = []
+    leader = threading.Thread(target=lambda: leader_result.append(flight.do("doc", slow)))
+    leader.start()
+    started.wait()
+
+    outcome = []
+
+    def follow():
+        try:
+            flight.do("doc", slow, on_wait=check_cancelled)
+        except JobCancelled as e:
+            outcome.append(e)
+
+    follower = threading.Thread(target=follow, daemon=True)
+    follower.start()
+    cancelled.set()
+    follower.join(timeout=1.0)
+    try:
+        # The follower left while the leader is still running
+        assert not follower.is_alive()
+        assert len(outcome) == 1
+        assert leader.is_alive()
+    finally:
+        release.set()
+        leader.join()
+    assert leader_result == [("summary", False)]
@@ -0,0 +1,36 @@
+import io
+from app.services.result_cache import chunk_size_params, document_cache_key
+from tests.fakes import make_pdf
+
+def test_max_words_is_keyed_only_when_chunks_are_sized_by_words(make_app):
+    make_app(CHUNK_SIZING="tokens")
+    assert document_cache_key("summarize", "abc", **chunk_size_params(200)) == document_cache_key(
+        "summarize", "abc", **chunk_size_params(400)
+    )
+
+    make_app(CHUNK_SIZING="words")
+    assert document_cache_key("summarize", "abc", **chunk_size_params(200)) != document_cache_key(
+        "summarize", "abc", **chunk_size_params(400)
+    )
+
+def test_summaries_differing_only_in_max_words_share_a_result(make_app, fake_bedrock):
+    app = make_app(CHUNK_SIZING="tokens")
+    pdf = make_pdf(pages=2)
+    client = app.test_client()
+
+    first = client.post("/api/v1/summarize?max_words=200", data={"file": (io.BytesIO(pdf), "notes.pdf")})
+    second = client.post("/api/v1/summarize?max_words=400", data={"file": (io.BytesIO(pdf), "notes.pdf")})
+
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.get_json() == first.get_json()
+
+def test_question_results_stay_keyed_by_max_words(make_app):
+    app = make_app(CHUNK_SIZING="tokens")
+    pdf = make_pdf(pages=2)
+    client = app.test_client()
+
+    client.post("/api/v1/generate-questions?max_words=200", data={"file": (io.BytesIO(pdf), "notes.pdf")})
+    second = client.post("/api/v1/generate-questions?max_words=400", data={"file": (io.BytesIO(pdf), "notes.pdf")})
+
+    assert second.headers["X-Cache"] == "MISS"
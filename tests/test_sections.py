@@ -0,0 +1,102 @@
+import math
+import random
+import fitz
+from app.services.pdf_service import find_pdf_headings
+from app.services.summarization_service import section_chunk_text, split_sections
+from tests.fakes import WORDS
+
+def paragraph(words, seed):
+    rng = random.Random(seed)
+    sentences = []
+    while sum(len(sentence.split()) for sentence in sentences) < words:
+        sentences.append("The " + " ".join(rng.choice(WORDS) for _ in range(9)) + ".")
+    return " ".join(sentences)
+
+def structured_pdf(chapters=2, sections=2, words=113, toc=False):
+    """PDF with 20pt chapter headings, 15pt section headings and 11pt body text"""
+    doc = fitz.open()
+    outline = []
+    for chapter in range(1, chapters + 1):
+        page = doc.new_page()
+        title = f"Chapter {chapter} Clouds"
+        page.insert_text((72, 72), title, fontsize=20)
+        outline.append([1, title, doc.page_count])
+        y = 110
+        for section in range(1, sections + 1):
+            heading = f"{chapter}.{section} Formation"
+            page.insert_text((72, y), heading, fontsize=15)
+            outline.append([2, heading, doc.page_count])
+            text = paragraph(words, seed=chapter * 10 + section)
+            box = fitz.Rect(72, y + 8, 520, y + 300)
+            page.insert_textbox(box, text, fontsize=11)
+            y += 320
+    if toc:
+        doc.set_toc(outline)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+def page_texts(pdf):
+    doc = fitz.open(stream=pdf, filetype="pdf")
+    texts = [page.get_text() for page in doc]
+    doc.close()
+    return texts
+
+def test_headings_come_from_the_outline_when_there_is_one(app):
+    headings, origin = find_pdf_headings(structured_pdf(toc=True))
+
+    assert origin == "toc"
+    assert headings == [
+        (0, 1, "Chapter 1 Clouds"), (0, 2, "1.1 Formation"), (0, 2, "1.2 Formation"),
+        (1, 1, "Chapter 2 Clouds"), (1, 2, "2.1 Formation"), (1, 2, "2.2 Formation")
+    ]
+
+def test_headings_are_inferred_from_font_sizes(app):
+    headings, origin = find_pdf_headings(structured_pdf())
+
+    assert origin == "fonts"
+    assert headings == [
+        (0, 1, "Chapter 1 Clouds"), (0, 2, "1.1 Formation"), (0, 2, "1.2 Formation"),
+        (1, 1, "Chapter 2 Clouds"), (1, 2, "2.1 Formation"), (1, 2, "2.2 Formation")
+    ]
+
+def test_split_sections_cuts_pages_at_their_headings():
+    pages = ["Preface line\nIntro\nBody one\nMore body", "Part Two\nBody two"]
+    headings = [(0, 1, "Intro"), (1, 1, "Part Two"), (1, 2, "Not on the page")]
+
+    sections = split_sections(pages, headings)
+
+    assert sections == [
+        {"level": math.inf, "title": None, "text": "Preface line"},
+        {"level": 1, "title": "Intro", "text": "Intro\nBody one\nMore body"},
+        {"level": 1, "title": "Part Two", "text": "Part Two\nBody two"}
+    ]
+
+def test_chapters_that_fit_stay_in_one_chunk(app):
+    sections = [
+        {"level": 1, "title": "One", "text": "One\n" + paragraph(20, 1)},
+        {"level": 2, "title": "One.a", "text": "One.a\n" + paragraph(20, 2)},
+        {"level": 1, "title": "Two", "text": "Two\n" + paragraph(20, 3)},
+        {"level": 2, "title": "Two.a", "text": "Two.a\n" + paragraph(20, 4)}
+    ]
+
+    chunks = section_chunk_text(sections, max_words=60)
+
+    assert [chunk.split("\n")[0] for chunk in chunks] == ["One", "Two"]
+    assert all(len(chunk.split()) <= 60 for chunk in chunks)
+
+def test_a_heading_is_never_a_chunk_of_its_own(app):
+    pdf = structured_pdf(chapters=3, sections=2, words=113)
+    headings, _ = find_pdf_headings(pdf)
+    sections = split_sections(page_texts(pdf), headings)
+
+    chunks = section_chunk_text(sections, max_words=60)
+
+    assert all(len(chunk.split()) <= 60 for chunk in chunks)
+    assert all(len(chunk.split()) > 10 for chunk in chunks)
+    # Each chapter heading opens the chunk of its first section
+    for chapter in range(1, 4):
+        assert any(chunk.startswith(f"Chapter {chapter} Clouds") for chunk in chunks)
+    # Nothing is lost or repeated
+    words = " ".join(section["text"] for section in sections).split()
+    assert " ".join(chunks).split() == words
@@ -0,0 +1,96 @@
+import io
+import threading
+import time
+import app.services.streaming_service as streaming_service
+from app.extensions import get_upload_metrics
+from app.services.streaming_service import stream_summarization
+from app.services.upload_service import Upload
+from tests.fakes import make_pdf
+
+def wait_for_uploads_released(timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while get_upload_metrics().stats()["in_flight"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return get_upload_metrics().stats()
+
+def post_stream(app, pdf):
+    return app.test_client().post(
+        "/api/v1/summarize/stream", data={"file": (io.BytesIO(pdf), "notes.pdf")}, buffered=False
+    )
+
+def test_stream_sends_progress_and_the_result(app):
+    response = post_stream(app, make_pdf(pages=2))
+    body = response.get_data(as_text=True)
+
+    assert response.status_code == 200
+    assert body.startswith("event: started\n")
+    assert "event: result\n" in body
+    assert wait_for_uploads_released()["in_flight"] == 0
+
+def test_upload_is_cleaned_up_when_the_stream_is_never_read(make_app, tmp_path):
+    make_app()
+    spooled = tmp_path / "notes.pdf"
+    spooled.write_bytes(make_pdf(pages=2))
+    upload = Upload("notes.pdf", "sha", spooled.stat().st_size, path=str(spooled))
+
+    # The client goes away before the first byte of the stream is read
+    stream_summarization(upload, cache_key=None).close()
+
+    deadline = time.monotonic() + 5.0
+    while spooled.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not spooled.exists()
+    assert upload.path is None
+
+def test_cleanup_runs_once(app):
+    upload = Upload("notes.pdf", "sha", 10, data=b"0123456789")
+    get_upload_metrics().admitted(10, True)
+
+    upload.cleanup()
+    upload.cleanup()
+
+    assert get_upload_metrics().stats()["in_flight"] == 0
+
+def test_pipeline_stops_when_the_client_disconnects(make_app, fake_bedrock):
+    make_app(CHUNK_SIZING="words", LLM_MAX_WORKERS=2, LLM_CACHE_ENABLED=False, SUMMARY_MEMO_ENABLED=False)
+    fake_bedrock.delay = 0.05
+    upload = Upload("notes.pdf", "sha", 0, data=make_pdf(pages=8, sentences=6))
+    finished = threading.Event()
+    cleanup = upload.cleanup
+    upload.cleanup = lambda: (cleanup(), finished.set())
+
+    stream = stream_summarization(upload, max_words=40)
+    for event in stream:
+        if event.startswith("event: chunk_summary"):
+            break
+    stream.close()
+
+    # The pipeline ends (and releases the upload) without finishing the document
+    assert finished.wait(5.0)
+    calls = fake_bedrock.calls
+    time.sleep(0.3)
+
+    # Only calls already running when the client left went on
+    assert fake_bedrock.calls <= calls + 2
+    assert fake_bedrock.calls < 12
+
+def test_streams_share_a_bounded_pipeline_pool(make_app, monkeypatch):
+    make_app(STREAM_WORKERS=1)
+    lock = threading.Lock()
+    state = {"running": 0, "peak": 0}
+
+    def pipeline(source, **kwargs):
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+        time.sleep(0.05)
+        with lock:
+            state["running"] -= 1
+        return {"summary": {"overview": "ok"}}
+
+    monkeypatch.setattr(streaming_service, "summarize_document", pipeline)
+    streams = [stream_summarization(Upload("notes.pdf", "sha", 1, data=b"x")) for _ in range(3)]
+    bodies = ["".join(stream) for stream in streams]
+
+    assert all("event: result" in body for body in bodies)
+    assert state["peak"] == 1
@@ -0,0 +1,154 @@
+import json
+import re
+from app.services.summarization_service import (
+    batch_summaries,
+    is_usable_summary,
+    plan_reduce_tree,
+    recursive_summarize,
+    summarize_text
+)
+from app.services.token_budget import count_tokens
+from tests.fakes import client_error
+
+# Map prompts quote their section; the reply names the first sentence in it
+SECTION = re.compile(r"Here is the section:\n```\n(Sentence \d+)")
+
+def document(sentences=40):
+    return " ".join(f"Sentence {index} explains how clouds form over the sea." for index in range(sentences))
+
+def map_reply(prompt):
+    section = SECTION.search(prompt)
+    if section:
+        return json.dumps({"overview": f"about {section.group(1)}"})
+    return json.dumps({"overview": "whole document"})
+
+def summarize(text, **kwargs):
+    events = []
+    summary = recursive_summarize(text, on_event=lambda name, data: events.append((name, data)), **kwargs)
+    return summary, events
+
+def test_map_step_runs_chunks_concurrently(make_app, fake_bedrock):
+    make_app(CHUNK_SIZING="words")
+    fake_bedrock.reply = map_reply
+    fake_bedrock.delay = 0.05
+
+    summary, events = summarize(document(), max_words=40, fan_in=16)
+
+    chunks = dict(events)["chunks"]["count"]
+    assert chunks > 4
+    assert summary == {"overview": "whole document"}
+    # Context call, one call per chunk and the final synthesis
+    assert fake_bedrock.calls == chunks + 2
+    assert fake_bedrock.max_in_flight > 1
+
+def test_map_step_keeps_chunk_order(make_app, fake_bedrock):
+    make_app(CHUNK_SIZING="words")
+    fake_bedrock.reply = map_reply
+
+    _, events = summarize(document(), max_words=40, fan_in=16)
+
+    chunk_summaries = [data for name, data in events if name == "chunk_summary" and data["level"] == 0]
+    ordered = sorted(chunk_summaries, key=lambda data: data["index"])
+    firsts = [int(data["summary"]["overview"].split()[-1]) for data in ordered]
+    assert firsts == sorted(firsts)
+    assert firsts[0] == 0
+    # The final prompt lists the chunk summaries in document order
+    final_prompt = fake_bedrock.prompts[-1]
+    positions = [final_prompt.index(f'"about Sentence {first}"') for first in firsts]
+    assert positions == sorted(positions)
+
+def test_map_step_reports_failed_chunks_in_place(make_app, fake_bedrock):
+    make_app(CHUNK_SIZING="words")
+
+    def reply(prompt):
+        if "Here is the section:\n```\nSentence 0 " in prompt:
+            raise client_error("ValidationException")
+        return map_reply(prompt)
+
+    fake_bedrock.reply = reply
+
+    summary, events = summarize(document(), max_words=40, fan_in=16)
+
+    chunk_summaries = {data["index"]: data["summary"] for name, data in events if name == "chunk_summary"}
+    assert "error" in chunk_summaries[0]
+    assert all("error" not in chunk_summaries[index] for index in chunk_summaries if index)
+    assert summary == {"overview": "whole document"}
+
+def test_truncated_junk_is_not_a_usable_summary():
+    assert not is_usable_summary("{")
+    assert not is_usable_summary('Sure, here is the summary: {"ti')
+    assert not is_usable_summary('{"page": 3}')
+    assert is_usable_summary('{"title": "Optics", "overview": "Light')
+
+def test_junk_summaries_are_retried_and_not_cached(app, fake_bedrock):
+    outputs = ["{", '{"overview": "ok"}']
+    fake_bedrock.reply = lambda prompt: outputs.pop(0)
+
+    assert summarize_text("Some text.") == {"overview": "ok"}
+    assert fake_bedrock.calls == 2
+    # The usable generation is what the cache kept
+    assert summarize_text("Some text.") == {"overview": "ok"}
+    assert fake_bedrock.calls == 2
+
+def test_nodes_built_on_a_failed_chunk_are_recomputed(make_app, fake_bedrock):
+    make_app(CHUNK_SIZING="words")
+    failing = {"chunk": True}
+
+    def reply(prompt):
+        section = SECTION.search(prompt)
+        # The chunk starting at sentence 8 fails; the context call quotes sentence 0
+        if failing["chunk"] and section and section.group(1) == "Sentence 8":
+            raise client_error("ValidationException")
+        if "Failed to generate summary" in prompt or "built on an error" in prompt:
+            return json.dumps({"overview": "built on an error"})
+        return map_reply(prompt)
+
+    fake_bedrock.reply = reply
+    first, events = summarize(document(), max_words=40, fan_in=4)
+    failed = [data for name, data in events if name == "chunk_summary" and "error" in data["summary"]]
+    assert len(failed) == 1
+    assert first == {"overview": "built on an error"}
+
+    failing["chunk"] = False
+    second, events = summarize(document(), max_words=40, fan_in=4)
+
+    assert second == {"overview": "whole document"}
+    # Only the failed chunk and the reduce and final nodes above it are computed again
+    reduce_levels = len(dict(events)["plan"]["levels"]) - 1
+    assert dict(events)["memoization"]["recomputed"] == 1 + reduce_levels + 1
+
+def test_plan_merges_only_as_many_summaries_as_fit_the_budget():
+    plan = plan_reduce_tree(20, fan_in=8, summary_tokens=1024, max_tokens=4900)
+
+    assert plan["planned_fan_in"] == 4
+    assert [level["calls"] for level in plan["levels"]] == [20, 5, 2]
+    assert plan_reduce_tree(20, fan_in=8)["levels"][1:] == [{"level": 1, "stage": "reduce", "calls": 3}]
+
+def test_batches_close_at_fan_in_and_at_the_token_budget(app):
+    short = [{"overview": f"summary {index}"} for index in range(10)]
+    long = [{"overview": "word " * 800} for _ in range(8)]
+
+    assert [len(batch) for batch in batch_summaries(short, 8)] == [5, 5]
+    batches = batch_summaries(long, 8, max_tokens=4000)
+    assert len(batches) > 1
+    assert [summary for batch in batches for summary in batch] == long
+    assert all(count_tokens("\n\n".join(json.dumps(s) for s in batch)) <= 4000 for batch in batches)
+
+def test_long_summaries_are_reduced_to_fit_the_window(make_app, fake_bedrock):
+    make_app(CHUNK_SIZING="words")
+
+    def reply(prompt):
+        if SECTION.search(prompt):
+            return json.dumps({"overview": "a long chunk summary " * 150})
+        return json.dumps({"overview": "whole document"})
+
+    fake_bedrock.reply = reply
+
+    summary, events = summarize(document(32), max_words=40, fan_in=8)
+
+    assert summary == {"overview": "whole document"}
+    assert dict(events)["chunks"]["count"] <= 8
+    assert any(name == "reduce_level" for name, _ in events)
+    window = 8192 * 0.75
+    for prompt in fake_bedrock.prompts:
+        assert count_tokens(prompt) + 1024 <= window